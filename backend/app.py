@@ -1,26 +1,36 @@
 import os
-import ssl
-from flask import Flask, request, jsonify
+import functools
+from flask import Blueprint, Flask, current_app, g, request, jsonify, Response, stream_with_context, url_for
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
-import PyPDF2
-import nltk
-from nltk.tokenize import sent_tokenize, word_tokenize
-from nltk.corpus import stopwords
-from nltk.probability import FreqDist
+from werkzeug.exceptions import RequestEntityTooLarge
 import json
 import re
 import random
-import pdfplumber
 from dotenv import load_dotenv
-import openai
 import logging
 import socket
 import platform
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
-import speech_recognition as sr
-from pydub import AudioSegment
 import base64
+import hashlib
+import time
+from audio import AudioDecodeError, FFMPEG_INSTALL_HINT, decode_audio, ffmpeg_path
+from cache import AnalysisCache, make_cache_key
+from chunking import split_text_into_chunks, map_concurrently
+from documents import create_document_store, is_document_id
+import metrics
+import nltk_resources
+from jobs import FAILED, FINISHED_STATES, JobManager, QUEUED, QueueFullError, RUNNING, SQLiteJobStore, SUCCEEDED
+from llm_client import LLMGateway
+from pdf_cache import PDFTextCache, is_sha256
+from pdf_extraction import extract_pdf_pages
+from singleflight import SingleFlight
+from speech import SpeechNotUnderstood, SpeechServiceError, create_recognizer, transcribe_audio
+from spooling import SpoolingRequest, remove_source
+from streaming import IncrementalJSONParser
+from text_processing import get_processed_document
+from token_budget import TokenBudgeter, count_tokens
+from transcripts import TranscriptCache, TranscriptUnavailable, create_transcript_provider
 
 # Configure logging
 logging.basicConfig(
@@ -38,55 +48,279 @@ logger.info("Environment variables loaded")
 openai_api_key = os.getenv("OPENAI_API_KEY")
 logger.info(f"OpenAI API key {'found' if openai_api_key else 'not found'}")
 
+# All model calls go through one gateway with pooled connections, timeouts, retries and rate limits
+llm = LLMGateway.from_env(openai_api_key)
+
 if openai_api_key:
-    # Initialize the OpenAI client with the API key
-    # Use the Client class directly for OpenAI API v1.x
-    try:
-        from openai import OpenAI
-        client = OpenAI(api_key=openai_api_key)
-        # Store the client in the openai module for backwards compatibility
-        openai.client = client
-        logger.info("OpenAI client initialized successfully with OpenAI v1.x API")
-    except (ImportError, Exception) as e:
-        # Fallback to legacy approach
-        openai.api_key = openai_api_key
-        logger.info(f"Using legacy OpenAI initialization: {e}")
-    
-    logger.info("OpenAI API key loaded successfully")
+    logger.info(f"OpenAI API key loaded successfully (models: {llm.stats()['models']})")
 else:
     logger.warning("OpenAI API key not found! Using fallback local processing.")
 
-# Download necessary NLTK data
-try:
-    # Fix for SSL certificate issues on macOS
-    try:
-        _create_unverified_https_context = ssl._create_unverified_context
-    except AttributeError:
-        pass
-    else:
-        ssl._create_default_https_context = _create_unverified_https_context
-    
-    # Now download NLTK data
-    nltk.download('punkt')
-    nltk.download('stopwords')
-    nltk.download('wordnet')
-    nltk.download('averaged_perceptron_tagger')
-    logger.info("NLTK data downloaded successfully")
-except Exception as e:
-    logger.warning(f"Failed to download NLTK data: {e}")
+# Prompt text and response length are sized in tokens per task and model
+token_budgeter = TokenBudgeter.from_env(llm.model_for)
+
+# NLTK data is provisioned ahead of time (python nltk_resources.py); startup only checks it is there.
+# NLTK_DATA_CHECK=strict refuses to start without it, "off" skips the check.
+NLTK_DATA_CHECK = os.getenv("NLTK_DATA_CHECK", "warn").lower()
+nltk_resources.check(NLTK_DATA_CHECK)
 
-app = Flask(__name__)
-CORS(app)
-logger.info("Flask app created with CORS enabled")
+# Every route lives on this blueprint; create_app() mounts it on a configured Flask app
+api = Blueprint('api', __name__)
 
 # Configure upload folder
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+    # Worker processes may race to create it
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     logger.info(f"Created upload folder: {UPLOAD_FOLDER}")
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-@app.route('/')
+# Analysis settings; bump the prompt version whenever the analysis prompt changes
+ANALYSIS_PROMPT_VERSION = "analysis-v2"
+TRANSCRIPT_PROMPT_VERSION = "transcript-v1"
+LOCAL_ANALYSIS_VERSION = "local-v1"
+
+# Local analysis engine: "textrank" (vectorized extractive summarizer) or "basic" (first sentences)
+LOCAL_ANALYSIS_ENGINE = os.getenv("LOCAL_ANALYSIS_ENGINE", "textrank").lower()
+
+
+@functools.lru_cache(maxsize=None)
+def get_textrank_engine():
+    """The TextRank module, imported with numpy and scipy on first local analysis; None when unavailable"""
+    try:
+        import extractive
+        return extractive
+    except ImportError as e:
+        logger.warning(f"TextRank engine unavailable ({e}); using basic local analysis")
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_quiz_engine():
+    """The distractor ranking module, imported with numpy and scipy on first local quiz; None when unavailable"""
+    try:
+        import quiz_engine
+        return quiz_engine
+    except ImportError as e:
+        logger.warning(f"Quiz engine unavailable ({e}); using random distractors")
+        return None
+
+# System prompts shared by the regular and streaming endpoints
+ANALYSIS_SYSTEM_PROMPT = "You are a precise academic analyzer that produces factually accurate, concise summaries and extracts key information. You focus only on what's truly important and relevant, removing any useless or tangential information."
+QUIZ_SYSTEM_PROMPT = "You are a master educator who creates cognitively demanding, pedagogically sound assessments that focus only on truly important information. You ignore irrelevant details and test only what matters most."
+STUDY_PACK_SYSTEM_PROMPT = "You are a master educator who turns study material into precise summaries, demanding quizzes and high-value flashcards in one pass. You focus only on truly important information and ignore irrelevant details."
+REDUCE_SYSTEM_PROMPT = "You are a precise academic analyzer that merges partial analyses of a document into one factually accurate, concise analysis."
+TRANSCRIPT_SYSTEM_PROMPT = "You are a transcript editor who transforms raw transcripts into clear, coherent text. You ruthlessly eliminate useless information and focus only on what's truly important and educational."
+FLASHCARDS_SYSTEM_PROMPT = "You are a flashcard creation expert who focuses only on the most important information. You ruthlessly eliminate flashcards about trivial details and ensure each card delivers maximum educational value."
+VOICE_SYSTEM_PROMPT = "You are a precise voice transcription analyst that ensures all information is factually derived from the recording. You never add information that wasn't explicitly stated and you prioritize accuracy over completeness."
+
+# Artifacts the study pack endpoint can produce
+STUDY_PACK_ARTIFACTS = ("analysis", "quiz", "flashcards")
+
+# Long documents are split into chunks of this many tokens and analyzed concurrently
+ANALYSIS_CHUNK_TOKENS = int(os.getenv("ANALYSIS_CHUNK_TOKENS", 3500))
+ANALYSIS_MAX_PARALLEL_CHUNKS = int(os.getenv("ANALYSIS_MAX_PARALLEL_CHUNKS", 4))
+
+# Cache analysis results so repeat submissions of the same text skip the LLM call
+analysis_cache = AnalysisCache(
+    max_size=int(os.getenv("ANALYSIS_CACHE_SIZE", 256)),
+    ttl=int(os.getenv("ANALYSIS_CACHE_TTL", 24 * 60 * 60)),
+    disk_path=(os.getenv("ANALYSIS_CACHE_DB") or os.path.join(UPLOAD_FOLDER, 'cache', 'analysis.sqlite3'))
+    if os.getenv("ANALYSIS_CACHE_DISK", "false").lower() in ("1", "true", "yes") else None
+)
+logger.info(f"Analysis cache configured (disk tier: {analysis_cache.disk is not None})")
+
+# Request coalescing for analyses, refinements and PDF extractions (see singleflight.py)
+analysis_flight = SingleFlight("analysis")
+refinement_flight = SingleFlight("refinement")
+pdf_flight = SingleFlight("pdf_extraction")
+
+# Extracted PDF text is kept on disk by file hash, so re-uploads of the same PDF skip extraction
+pdf_text_cache = PDFTextCache(
+    os.getenv("PDF_CACHE_DIR") or os.path.join(UPLOAD_FOLDER, 'cache', 'pdf_text'),
+    max_bytes=int(float(os.getenv("PDF_CACHE_MAX_MB", 256)) * 1024 * 1024)
+)
+
+# Analyzed texts are kept server-side so quiz and flashcard requests can send a document_id instead of the text
+DOCUMENT_STORE_BACKEND = os.getenv("DOCUMENT_STORE_BACKEND", "memory").lower()
+document_store = create_document_store(
+    DOCUMENT_STORE_BACKEND,
+    path=os.getenv("DOCUMENT_STORE_PATH") or os.path.join(
+        UPLOAD_FOLDER, 'cache', 'documents.sqlite3' if DOCUMENT_STORE_BACKEND == 'sqlite' else 'documents'),
+    max_entries=int(os.getenv("DOCUMENT_STORE_SIZE", 256)),
+    ttl=int(os.getenv("DOCUMENT_TTL", 24 * 60 * 60))
+)
+logger.info(f"Document store configured (backend: {DOCUMENT_STORE_BACKEND})")
+# Whether analysis responses embed full_text unless the request says otherwise
+RETURN_FULL_TEXT = os.getenv("RETURN_FULL_TEXT", "true").lower() in ("1", "true", "yes")
+
+# YouTube transcripts and their refinements are cached per video_id, so popular videos are fetched and refined once
+transcript_cache = TranscriptCache(
+    create_transcript_provider(
+        os.getenv("TRANSCRIPT_PROVIDER", "youtube").lower(),
+        os.getenv("LOCAL_TRANSCRIPT_DIR") or os.path.join(UPLOAD_FOLDER, 'transcripts')
+    ),
+    AnalysisCache(
+        max_size=int(os.getenv("TRANSCRIPT_CACHE_SIZE", 512)),
+        ttl=int(os.getenv("TRANSCRIPT_CACHE_TTL", 7 * 24 * 60 * 60)),
+        disk_path=(os.getenv("TRANSCRIPT_CACHE_DB") or os.path.join(UPLOAD_FOLDER, 'cache', 'transcripts.sqlite3'))
+        if os.getenv("TRANSCRIPT_CACHE_DISK", "false").lower() in ("1", "true", "yes") else None
+    )
+)
+
+# Speech recognition engine for voice notes: "google", "vosk" (offline) or a custom "module:Class"
+SPEECH_RECOGNIZER = os.getenv("SPEECH_RECOGNIZER", "google")
+try:
+    speech_recognizer = create_recognizer(SPEECH_RECOGNIZER, language=os.getenv("SPEECH_LANGUAGE"),
+                                          model_path=os.getenv("VOSK_MODEL_PATH"))
+except Exception as e:
+    logger.error(f"Failed to load speech recognizer '{SPEECH_RECOGNIZER}' ({e}); using Google")
+    speech_recognizer = create_recognizer("google", language=os.getenv("SPEECH_LANGUAGE"))
+
+# Background workers for long-running PDF, YouTube and voice processing. Job status lives in this
+# process by default; the "sqlite" store lets any worker process answer for a job another one runs.
+JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", "memory").lower()
+job_store = None
+if JOB_STORE_BACKEND == "sqlite":
+    JOB_STORE_PATH = os.getenv("JOB_STORE_PATH") or os.path.join(UPLOAD_FOLDER, 'cache', 'jobs.sqlite3')
+    os.makedirs(os.path.dirname(JOB_STORE_PATH), exist_ok=True)
+    job_store = SQLiteJobStore(JOB_STORE_PATH)
+job_manager = JobManager(
+    max_workers=int(os.getenv("JOB_WORKERS", 4)),
+    max_queue=int(os.getenv("JOB_QUEUE_LIMIT", 16)),
+    result_ttl=int(os.getenv("JOB_RESULT_TTL", 60 * 60)),
+    store=job_store
+)
+# Seconds between store reads when following a job run by another worker process
+JOB_POLL_INTERVAL = 0.5
+
+class ProcessingError(Exception):
+    """Error raised by a processing pipeline, carrying the HTTP status code and response body"""
+    
+    def __init__(self, message, status_code=500, details=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.payload = {'error': message, **(details or {})}
+
+def _ignore_progress(stage, fraction=None):
+    """Progress callback used when a pipeline runs inside a request"""
+    pass
+
+def format_sse(data, event=None):
+    """Format a payload as a server-sent event"""
+    message = f"data: {json.dumps(data)}\n\n"
+    if event:
+        message = f"event: {event}\n" + message
+    return message
+
+def _sse_response(events):
+    """Wrap an event generator in a streaming response that proxies will not buffer"""
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def publish_document(result, text, **metadata):
+    """Store the analyzed text and tag the result with its document_id"""
+    result['document_id'] = document_store.put(text, **metadata)
+    return result
+
+def _is_truthy(value):
+    """Interpret a flag sent as JSON or as a form/query string"""
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    return bool(value)
+
+def _wants_full_text(data=None, args=None):
+    """Whether the client asked for full_text in the response (include_full_text in the query string or body)"""
+    value = (request.args if args is None else args).get('include_full_text')
+    if value is None and data:
+        value = data.get('include_full_text')
+    if value is None:
+        return RETURN_FULL_TEXT
+    return _is_truthy(value)
+
+def _finish_result(result, include_full_text):
+    """Drop full_text from a result the client can refer to by document_id"""
+    if not include_full_text and 'document_id' in result:
+        result.pop('full_text', None)
+    return result
+
+def _transcript_version():
+    """Version of refined transcripts: changes with the transcript prompt, model or budget"""
+    return f"{token_budgeter.fingerprint('transcript')}:{TRANSCRIPT_PROMPT_VERSION};chunk={ANALYSIS_CHUNK_TOKENS}"
+
+def resolve_request_text(data):
+    """Resolve the text of a generation request, returning (text, source, None) or (None, None, (payload, status))
+    
+    Stored documents and cached video refinements are already refined, so they report the source "document".
+    A malformed document_id is a client error (400); only a well-formed one that is unknown or expired gets
+    the 404 that asks the client to submit the content again.
+    """
+    if data and data.get('document_id'):
+        if not is_document_id(data['document_id']):
+            return None, None, ({"error": "Invalid document_id: expected the 32-character hex id "
+                                          "returned with an analysis"}, 400)
+        document = document_store.get(data['document_id'])
+        if document is None:
+            return None, None, ({"error": "Document not found or expired. Please submit the content again.",
+                                 "document_expired": True}, 404)
+        return document['text'], 'document', None
+    if data and data.get('source') == 'youtube' and data.get('video_id'):
+        refined_text = transcript_cache.peek_refined(data['video_id'], _transcript_version())
+        if refined_text:
+            return refined_text, 'document', None
+    if not data or 'text' not in data:
+        return None, None, ({"error": "No text provided"}, 400)
+    return data['text'], data.get('source', 'text'), None
+
+def _load_request_text(data):
+    """resolve_request_text() with the error as a Flask response"""
+    text, source, error = resolve_request_text(data)
+    if error:
+        payload, status = error
+        return None, None, (jsonify(payload), status)
+    return text, source, None
+
+def _refine_for_source(text, source):
+    """Refine raw YouTube transcripts before generating study material from them"""
+    if source == 'youtube' and openai_api_key:
+        processed_text = refine_youtube_transcript_with_openai(text)
+        if processed_text:
+            return processed_text
+    return text
+
+@api.before_app_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    g.timing_token = metrics.start_request()
+
+@api.after_app_request
+def add_server_timing(response):
+    """Report the request's stage timings in a Server-Timing header and record its latency"""
+    if 'timing_token' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    timings = metrics.finish_request(g.pop('timing_token'))
+    response.headers['Server-Timing'] = metrics.server_timing_header(timings, elapsed)
+    # Label by route pattern rather than path so job ids and unknown URLs do not create new series
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, endpoint=endpoint,
+                                         status=response.status_code)
+    return response
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider with response serialization timed as a stage"""
+
+    def dumps(self, obj, **kwargs):
+        with metrics.span("json_serialization"):
+            return super().dumps(obj, **kwargs)
+
+@api.app_errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    """Return a JSON error for uploads over the size limit"""
+    limit_mb = current_app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    logger.error(f"Rejected request larger than {limit_mb} MB")
+    return jsonify({"error": f"File too large. The maximum upload size is {limit_mb} MB."}), 413
+
+@api.route('/')
 def index():
     """Root endpoint that returns API info and AI status"""
     logger.info("Root endpoint accessed")
@@ -100,16 +334,27 @@ def index():
         "endpoints": [
             {"path": "/api/process-text", "method": "POST", "description": "Process text to generate summary and analysis"},
             {"path": "/api/upload-pdf", "method": "POST", "description": "Upload and process PDF file"},
+            {"path": "/api/pdf-cache/<sha256>", "method": "GET", "description": "Check whether a PDF can be processed by its hash instead of uploading it"},
             {"path": "/api/generate-quiz", "method": "POST", "description": "Generate quiz questions from text"},
             {"path": "/api/generate-flashcards", "method": "POST", "description": "Generate flashcards from text"},
+            {"path": "/api/study-pack", "method": "POST", "description": "Generate the summary, quiz and flashcards in one request"},
             {"path": "/api/process-youtube", "method": "POST", "description": "Process YouTube video transcript"},
-            {"path": "/api/process-voice", "method": "POST", "description": "Process voice recordings, perform speech-to-text, and analyze the content"}
+            {"path": "/api/process-voice", "method": "POST", "description": "Process voice recordings, perform speech-to-text, and analyze the content"},
+            {"path": "/api/jobs/upload-pdf", "method": "POST", "description": "Queue a PDF upload for background processing"},
+            {"path": "/api/jobs/process-youtube", "method": "POST", "description": "Queue a YouTube video for background processing"},
+            {"path": "/api/jobs/process-voice", "method": "POST", "description": "Queue a voice recording for background processing"},
+            {"path": "/api/jobs/<job_id>", "method": "GET", "description": "Get the status and result of a background job"},
+            {"path": "/api/jobs/<job_id>/events", "method": "GET", "description": "Stream job progress as server-sent events"},
+            {"path": "/api/metrics", "method": "GET", "description": "Latency histograms and counters in Prometheus text format"},
+            {"path": "/api/process-text/stream", "method": "POST", "description": "Stream a text analysis as server-sent events"},
+            {"path": "/api/generate-quiz/stream", "method": "POST", "description": "Stream quiz questions as server-sent events"},
+            {"path": "/api/generate-flashcards/stream", "method": "POST", "description": "Stream flashcards as server-sent events"}
         ]
     }
     logger.info(f"Returning response with AI powered: {is_ai_powered}")
     return jsonify(response)
 
-@app.route('/api/process-text', methods=['POST'])
+@api.route('/api/process-text', methods=['POST'])
 def process_text():
     """Process plain text input"""
     logger.info("process-text endpoint called")
@@ -122,81 +367,121 @@ def process_text():
     logger.info(f"Received text of length: {len(text)}")
     
     # Use OpenAI if available, otherwise fall back to local processing
-    if openai_api_key:
-        logger.info("Using OpenAI for text analysis")
-        try:
-            result = analyze_text_with_openai(text)
-            logger.info("OpenAI analysis completed successfully")
-        except Exception as e:
-            logger.error(f"OpenAI analysis failed: {e}")
-            logger.info("Falling back to local processing")
-            result = analyze_text_local(text)
-    else:
-        logger.info("Using local processing for text analysis")
-        result = analyze_text_local(text)
+    result = publish_document(analyze_text(text), text, source='text')
         
-    return jsonify(result)
+    return jsonify(_finish_result(result, _wants_full_text(data)))
 
-@app.route('/api/upload-pdf', methods=['POST'])
+@api.route('/api/upload-pdf', methods=['POST'])
 def upload_pdf():
-    """Process PDF file upload"""
+    """Process PDF file upload, or a JSON {"sha256": ...} naming a PDF whose text is already cached"""
     logger.info("upload-pdf endpoint called")
+    data = request.get_json(silent=True) if request.is_json else None
+    if data and 'sha256' in data:
+        return process_cached_pdf(data)
+    
+    file, error = _get_uploaded_pdf()
+    if error:
+        return error
+    
+    # Extract straight from the upload spool, which is removed as soon as we are done with it
+    spool = file.stream
+    logger.info(f"PDF received: {spool.size} bytes ({'in memory' if spool.in_memory else 'spooled to disk'})")
+    try:
+        return jsonify(_finish_result(run_pdf_pipeline(spool.source(), digest=spool.sha256()), _wants_full_text()))
+    finally:
+        file.close()
+
+def process_cached_pdf(data):
+    """Analyze a previously uploaded PDF from its cached text, without the file"""
+    digest = str(data['sha256']).lower()
+    if not is_sha256(digest):
+        return jsonify({"error": "sha256 must be a hex SHA-256 digest"}), 400
+    
+    pages = pdf_text_cache.get(digest)
+    if pages is None:
+        logger.info(f"PDF {digest} not cached; the client has to upload it")
+        return jsonify({"error": "PDF not cached, upload the file", "cached": False}), 404
+    
+    text = "\n".join(pages)
+    result = publish_document(analyze_text(text), text, source='pdf')
+    return jsonify(_finish_result(result, _wants_full_text(data)))
+
+@api.route('/api/pdf-cache/<digest>', methods=['GET'])
+def check_pdf_cache(digest):
+    """Tell the client whether a PDF's text is cached, so it can send the hash instead of the file"""
+    digest = digest.lower()
+    if not is_sha256(digest):
+        return jsonify({"error": "Expected a hex SHA-256 digest"}), 400
+    cached = pdf_text_cache.contains(digest)
+    return jsonify({"sha256": digest, "cached": cached}), 200 if cached else 404
+
+def _get_uploaded_pdf():
+    """Validate the uploaded PDF, returning (file, None) or (None, error response)"""
     if 'file' not in request.files:
         logger.error("No file part in request")
-        return jsonify({"error": "No file part"}), 400
+        return None, (jsonify({"error": "No file part"}), 400)
     
     file = request.files['file']
     if file.filename == '':
         logger.error("No file selected")
-        return jsonify({"error": "No file selected"}), 400
+        return None, (jsonify({"error": "No file selected"}), 400)
     
-    if file and file.filename.endswith('.pdf'):
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        logger.info(f"PDF saved to {file_path}")
-        
-        # Extract text from PDF
-        text = extract_text_from_pdf(file_path)
-        logger.info(f"Extracted {len(text)} characters from PDF")
-        
-        # Process the extracted text
-        if openai_api_key:
-            logger.info("Using OpenAI for PDF analysis")
-            try:
-                result = analyze_text_with_openai(text)
-                logger.info("OpenAI analysis completed successfully")
-            except Exception as e:
-                logger.error(f"OpenAI analysis failed: {e}")
-                logger.info("Falling back to local processing")
-                result = analyze_text_local(text)
-        else:
-            logger.info("Using local processing for PDF analysis")
-            result = analyze_text_local(text)
-        
-        return jsonify(result)
+    if not file.filename.endswith('.pdf'):
+        logger.error("Invalid file format")
+        return None, (jsonify({"error": "Invalid file format. Please upload a PDF file."}), 400)
     
-    logger.error("Invalid file format")
-    return jsonify({"error": "Invalid file format. Please upload a PDF file."}), 400
+    return file, None
+
+def _pdf_digest(source):
+    """SHA-256 of a PDF given as a file path or as bytes"""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
-@app.route('/api/generate-quiz', methods=['POST'])
+def load_pdf_text(digest, source):
+    """Text of a PDF from the extraction cache, extracting and caching it on a miss"""
+    pages = pdf_text_cache.get(digest)
+    if pages is None:
+        pages = extract_pdf_pages(source)
+        # Unreadable PDFs come back empty and are not cached, so a fixed extractor gets another go
+        if pages:
+            pdf_text_cache.set(digest, pages)
+    else:
+        logger.info(f"Using cached text of PDF {digest}")
+    return "\n".join(pages)
+
+def run_pdf_pipeline(source, progress=None, digest=None):
+    """Extract and analyze a PDF given as a file path or as bytes; digest is its SHA-256 when already known"""
+    progress = progress or _ignore_progress
+    digest = digest or _pdf_digest(source)
+    
+    # Extract text from PDF
+    progress('extracting', 0.1)
+    text = pdf_flight.do(digest, lambda: load_pdf_text(digest, source))
+    logger.info(f"Extracted {len(text)} characters from PDF")
+    
+    # Process the extracted text
+    progress('analyzing', 0.5)
+    return publish_document(analyze_text(text), text, source='pdf')
+
+@api.route('/api/generate-quiz', methods=['POST'])
 def generate_quiz():
     """Generate quiz questions from provided text"""
     data = request.get_json()
     
-    if not data or 'text' not in data:
-        return jsonify({"error": "No text provided"}), 400
+    text, source, error = _load_request_text(data)
+    if error:
+        return error
     
-    text = data['text']
     quiz_type = data.get('quiz_type', 'all')
     num_questions = data.get('num_questions', 5)
-    source = data.get('source', 'text')  # New parameter to identify source
     
     # If the source is YouTube and the text is a raw transcript, process it first
-    if source == 'youtube' and openai_api_key:
-        processed_text = refine_youtube_transcript_with_openai(text)
-        if processed_text:
-            text = processed_text
+    text = _refine_for_source(text, source)
         
     if openai_api_key:
         quiz = create_quiz_with_openai(text, quiz_type, num_questions)
@@ -205,23 +490,19 @@ def generate_quiz():
     
     return jsonify(quiz)
 
-@app.route('/api/generate-flashcards', methods=['POST'])
+@api.route('/api/generate-flashcards', methods=['POST'])
 def generate_flashcards():
     """Generate flashcards from provided text"""
     data = request.get_json()
     
-    if not data or 'text' not in data:
-        return jsonify({"error": "No text provided"}), 400
+    text, source, error = _load_request_text(data)
+    if error:
+        return error
     
-    text = data['text']
     num_cards = data.get('num_cards', 10)
-    source = data.get('source', 'text')  # New parameter to identify source
     
     # If the source is YouTube and the text is a raw transcript, process it first
-    if source == 'youtube' and openai_api_key:
-        processed_text = refine_youtube_transcript_with_openai(text)
-        if processed_text:
-            text = processed_text
+    text = _refine_for_source(text, source)
     
     if openai_api_key:
         flashcards = create_flashcards_with_openai(text, num_cards)
@@ -230,7 +511,41 @@ def generate_flashcards():
     
     return jsonify(flashcards)
 
-@app.route('/api/process-youtube', methods=['POST'])
+@api.route('/api/study-pack', methods=['POST'])
+def study_pack():
+    """Generate the summary, quiz and flashcards for a text in one request"""
+    data = request.get_json()
+    
+    text, source, error = _load_request_text(data)
+    if error:
+        return error
+    
+    artifacts = data.get('artifacts') or list(STUDY_PACK_ARTIFACTS)
+    unknown = [name for name in artifacts if name not in STUDY_PACK_ARTIFACTS]
+    if unknown:
+        return jsonify({"error": f"Unknown artifacts: {', '.join(unknown)}"}), 400
+    
+    # Refined once (and cached), then shared by every artifact
+    text = _refine_for_source(text, source)
+    
+    pack = build_study_pack(
+        text,
+        data.get('quiz_type', 'all'),
+        data.get('num_questions', 5),
+        data.get('num_cards', 10),
+        artifacts
+    )
+    if 'analysis' in pack:
+        pack['analysis'].pop('full_text', None)
+    pack['full_text'] = text
+    if source == 'document':
+        pack['document_id'] = data['document_id']
+    else:
+        publish_document(pack, text, source=source)
+    
+    return jsonify(_finish_result(pack, _wants_full_text(data)))
+
+@api.route('/api/process-youtube', methods=['POST'])
 def process_youtube():
     """Process YouTube video transcript"""
     try:
@@ -241,68 +556,76 @@ def process_youtube():
             return jsonify({'error': 'No YouTube URL provided'}), 400
         
         # Extract video ID from URL
-        if 'v=' in video_url:
-            video_id = video_url.split('v=')[-1].split('&')[0]
-        elif 'youtu.be/' in video_url:
-            video_id = video_url.split('youtu.be/')[-1].split('?')[0]
-        else:
+        video_id = extract_video_id(video_url)
+        if not video_id:
             return jsonify({'error': 'Invalid YouTube URL format'}), 400
         
-        try:
-            # Get transcript
-            transcript = YouTubeTranscriptApi.get_transcript(video_id)
-            
-            # Process the transcript to create a more readable and structured text
-            processed_text = process_transcript_text(transcript)
-            
-            # Log the size of the transcript
-            logger.info(f"YouTube transcript size: {len(processed_text)} characters")
-            
-            # Truncate for analysis if necessary
-            analysis_text = processed_text
-            if len(processed_text) > 14000:
-                analysis_text = processed_text[:14000] + "..."
-                logger.info(f"Truncated YouTube transcript to {len(analysis_text)} characters for analysis")
-            
-            # Process the text with your existing functions
-            if openai_api_key:
-                # First run analysis to get the summary, key points, etc.
-                result = analyze_text_with_openai(analysis_text)
-                
-                # Create a refined, condensed version of the transcript via OpenAI
-                refined_text = refine_youtube_transcript_with_openai(analysis_text)
-                
-                # Use the refined text for the preview, not the raw transcript
-                if refined_text:
-                    # Include only the first 500 characters as a preview
-                    result['text_preview'] = refined_text[:500] + ('...' if len(refined_text) > 500 else '')
-                else:
-                    # Fallback if refinement fails
-                    result['text_preview'] = processed_text[:500] + ('...' if len(processed_text) > 500 else '')
-            else:
-                result = analyze_text_local(analysis_text)
-                # Include only first 500 characters of the text as a preview
-                result['text_preview'] = processed_text[:500] + ('...' if len(processed_text) > 500 else '')
-            
-            # Add metadata but don't include full text in response
-            result['source'] = 'youtube'
-            result['video_id'] = video_id
-            result['transcript_size'] = len(processed_text)
-            
-            return jsonify(result)
-            
-        except TranscriptsDisabled:
-            return jsonify({'error': 'Transcripts are disabled for this video'}), 400
-        except NoTranscriptFound:
-            return jsonify({'error': 'No transcript found for this video'}), 400
-        except Exception as e:
-            app.logger.error(f"Error processing YouTube transcript: {e}")
-            return jsonify({'error': f'Failed to process YouTube transcript: {str(e)}'}), 500
-            
+        return jsonify(_finish_result(run_youtube_pipeline(video_id), _wants_full_text(data)))
+    
+    except ProcessingError as e:
+        return jsonify(e.payload), e.status_code
     except Exception as e:
-        app.logger.error(f"Error in process_youtube: {e}")
+        logger.error(f"Error in process_youtube: {e}")
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+def extract_video_id(video_url):
+    """Extract the video ID from a YouTube URL, or None if the format is not recognized"""
+    if 'v=' in video_url:
+        return video_url.split('v=')[-1].split('&')[0]
+    if 'youtu.be/' in video_url:
+        return video_url.split('youtu.be/')[-1].split('?')[0]
+    return None
+
+def run_youtube_pipeline(video_id, progress=None):
+    """Fetch, analyze and refine the transcript of a YouTube video"""
+    progress = progress or _ignore_progress
+    try:
+        # Get transcript
+        progress('fetching_transcript', 0.1)
+        # Fetched and processed into more readable, structured text once per video
+        transcript, processed_text = transcript_cache.get_transcript(video_id, process_transcript_text)
+        
+        # Log the size of the transcript
+        logger.info(f"YouTube transcript size: {len(processed_text)} characters")
+        
+        # Long transcripts are chunked by the analysis functions, so nothing is truncated here
+        analysis_text = processed_text
+        
+        # Process the text with your existing functions
+        if openai_api_key:
+            # First run analysis to get the summary, key points, etc.
+            progress('analyzing', 0.3)
+            result = analyze_text(analysis_text)
+            
+            # Create a refined, condensed version of the transcript via OpenAI
+            progress('refining', 0.7)
+            refined_text = transcript_cache.get_refined(
+                video_id, lambda: refine_youtube_transcript_with_openai(analysis_text), _transcript_version())
+        else:
+            progress('analyzing', 0.3)
+            result = analyze_text(analysis_text)
+            refined_text = None
+        
+        return finish_youtube_result(result, video_id, processed_text, refined_text)
+        
+    except TranscriptUnavailable as e:
+        raise ProcessingError(str(e), 400)
+    except Exception as e:
+        logger.error(f"Error processing YouTube transcript: {e}")
+        raise ProcessingError(f'Failed to process YouTube transcript: {str(e)}', 500)
+
+def finish_youtube_result(result, video_id, processed_text, refined_text=None):
+    """Publish a video's document and add the preview and metadata to its analysis"""
+    # Quizzes and flashcards for this document are generated from the refined text when there is one
+    text = refined_text or processed_text
+    publish_document(result, text, source='youtube', video_id=video_id)
+    # Include only the first 500 characters as a preview, not the full transcript
+    result['text_preview'] = text[:500] + ('...' if len(text) > 500 else '')
+    result['source'] = 'youtube'
+    result['video_id'] = video_id
+    result['transcript_size'] = len(processed_text)
+    return result
+
 def process_transcript_text(transcript):
     """Process YouTube transcript to create better structured text for analysis"""
     # Extract text entries and timestamps
@@ -337,14 +660,14 @@ def process_transcript_text(transcript):
     
     return processed_text
 
-@app.route('/api/test', methods=['GET', 'POST'])
+@api.route('/api/test', methods=['GET', 'POST'])
 def test_endpoint():
     return jsonify({
         "status": "success",
         "message": "Test endpoint working"
     })
 
-@app.route('/api/status', methods=['GET'])
+@api.route('/api/status', methods=['GET'])
 def server_status():
     # Get network interfaces for troubleshooting
     # Get hostname
@@ -373,404 +696,671 @@ def server_status():
         "platform": platform.platform(),
         "python_version": platform.python_version(),
         "flask_port": int(os.environ.get("PORT", 8000)),
-        "cors_enabled": True
+        "cors_enabled": True,
+        "ffmpeg_available": ffmpeg_path() is not None,
+        "nltk_data_missing": nltk_resources.missing_resources(),
+        "analysis_cache": analysis_cache.stats(),
+        "documents": document_store.stats(),
+        "pdf_cache": pdf_text_cache.stats(),
+        "transcripts": transcript_cache.stats(),
+        "coalescing": {flight.name: flight.stats() for flight in (analysis_flight, refinement_flight, pdf_flight)},
+        "llm": llm.stats(),
+        "token_budget": token_budgeter.stats(),
+        "jobs": job_manager.stats()
     })
 
-def extract_text_from_pdf(file_path):
-    """Extract text from a PDF file"""
-    text = ""
-    try:
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() or ""
-    except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
-    
-    return text
+def collect_service_metrics():
+    """Cache, coalescing, LLM gateway and job counters for /api/metrics"""
+    caches = {"analysis": analysis_cache.stats(), "transcripts": transcript_cache.stats(),
+              "documents": document_store.stats(), "pdf_text": pdf_text_cache.stats()}
+    flights = [analysis_flight, refinement_flight, pdf_flight, transcript_cache.flight]
+    llm_stats = llm.stats()
+    jobs = job_manager.stats()
+    return [
+        ("cache_hits_total", "counter", "Cache lookups answered from the cache",
+         [({"cache": name}, stats["hits"]) for name, stats in caches.items()]),
+        ("cache_misses_total", "counter", "Cache lookups that found nothing",
+         [({"cache": name}, stats["misses"]) for name, stats in caches.items()]),
+        ("coalesced_requests_total", "counter", "Requests that joined an identical run already in flight",
+         [({"kind": flight.name}, flight.stats()["coalesced"]) for flight in flights]),
+        ("llm_requests_total", "counter", "Model API requests sent, retries included",
+         [({}, llm_stats["requests"])]),
+        ("llm_retries_total", "counter", "Model API requests retried after a transient error",
+         [({}, llm_stats["retries"])]),
+        ("llm_failures_total", "counter", "Model calls that failed after all retries",
+         [({}, llm_stats["failures"])]),
+        ("llm_throttled_total", "counter", "Model calls that got no request slot in time",
+         [({}, llm_stats["throttled"])]),
+        ("llm_in_flight", "gauge", "Model API requests currently in flight",
+         [({}, llm_stats["in_flight"])]),
+        ("jobs", "gauge", "Background jobs by state",
+         [({"state": state}, jobs[state]) for state in (QUEUED, RUNNING, SUCCEEDED, FAILED)])
+    ]
+
+metrics.register_collector(collect_service_metrics)
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Per-stage latency histograms, token counts and cache counters in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 # OpenAI-powered functions
 
-def analyze_text_with_openai(text):
-    """Analyze text using OpenAI API"""
-    try:
-        # Truncate text if needed
-        max_length = 14000  # Leaving room for prompt and response
-        if len(text) > max_length:
-            text = text[:max_length] + "..."
-        
-        prompt = f"""
-        You are a precise, meticulous academic analyst. Your task is to perform a comprehensive analysis of the provided text, focusing ONLY on the most important and relevant information.
-
-        IMPORTANT: 
-        - Remove any useless, redundant, or tangential information
-        - Focus only on the core concepts and essential points
-        - Filter out any examples or details that don't add significant value
-        - Be highly selective - include only what's truly important
-        
-        Provide the following WITHOUT additional commentary:
-        
-        1. A concise yet comprehensive summary (3-5 sentences) that captures ONLY the most critical information
-        2. Exactly 5 key points (use precise, factual statements - focus on the most important concepts only)
-        3. 10 specific key concepts or terms (choose only the most significant ones)
-        4. Exact word count and sentence count (calculate these accurately)
-        
-        Requirements:
-        - The summary must be factually precise, covering ONLY the main thesis and core arguments
-        - Key points must represent the most important content only
-        - Key concepts must be the most essential technical/domain-specific terms mentioned
-        - All calculations must be accurate and based only on the provided text
-        
-        Format your response as a JSON object with the following structure:
-        {{
-            "summary": "string",
-            "key_points": ["string", "string", ...],
-            "key_concepts": ["string", "string", ...],
-            "word_count": number,
-            "sentence_count": number
-        }}
-        
-        Text to analyze:
-        {text}
-        """
-        
-        logger.info("Sending request to OpenAI API")
-        
-        # Use the client object if available
-        if hasattr(openai, 'client') and openai.client:
-            response = openai.client.chat.completions.create(
-                model="gpt-3.5-turbo-0125",
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": "You are a precise academic analyzer that produces factually accurate, concise summaries and extracts key information. You focus only on what's truly important and relevant, removing any useless or tangential information."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-        else:
-            # Fallback to the old approach
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo-0125",
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": "You are a precise academic analyzer that produces factually accurate, concise summaries and extracts key information. You focus only on what's truly important and relevant, removing any useless or tangential information."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-        
-        logger.info("Received response from OpenAI API")
-        
-        # Parse the JSON response
-        result = json.loads(response.choices[0].message.content)
-        
-        # Add the full text to the result
-        result["full_text"] = text
+def analyze_text(text):
+    """Analyze text with OpenAI when configured (local otherwise), reusing cached results"""
+    if openai_api_key:
+        cache_key = analysis_cache_key(text)
+        cached = analysis_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Returning cached OpenAI analysis")
+            return cached
+        
+        def run():
+            logger.info("Using OpenAI for text analysis")
+            result = _analyze_text_with_openai(text)
+            analysis_cache.set(cache_key, result)
+            logger.info("OpenAI analysis completed successfully")
+            return result
         
+        try:
+            return analysis_flight.do(cache_key, run)
+        except Exception as e:
+            logger.error(f"OpenAI analysis failed: {e}")
+            logger.info("Falling back to local processing")
+    
+    return analyze_text_local_cached(text)
+
+def analyze_text_local_cached(text):
+    """Analyze text locally, reusing cached results"""
+    cache_key = make_cache_key(text, f"local-{LOCAL_ANALYSIS_ENGINE}", LOCAL_ANALYSIS_VERSION)
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Returning cached local analysis")
+        return cached
+    
+    def run():
+        logger.info("Using local processing for text analysis")
+        result = analyze_text_local(text)
+        analysis_cache.set(cache_key, result)
         return result
     
+    return analysis_flight.do(cache_key, run)
+
+def analyze_text_with_openai(text):
+    """Analyze text using OpenAI API"""
+    try:
+        return _analyze_text_with_openai(text)
     except Exception as e:
         logger.error(f"Error using OpenAI API for text analysis: {e}")
         # Fall back to local processing if OpenAI fails
         return analyze_text_local(text)
 
+def _analyze_text_with_openai(text):
+    """Analyze text using OpenAI API, raising on failure
+    
+    Text longer than one chunk is analyzed map-reduce style: every chunk is
+    analyzed concurrently and the partial results are merged, in rounds when
+    they are too many for one prompt.
+    """
+    chunks = analysis_chunks(text)
+    if len(chunks) == 1:
+        return _analyze_chunk_with_openai(text)
+    
+    logger.info(f"Analyzing {len(chunks)} chunks concurrently")
+    partials = map_concurrently(_analyze_chunk_with_openai, chunks, ANALYSIS_MAX_PARALLEL_CHUNKS)
+    
+    try:
+        result = _reduce_analyses_with_openai(partials)
+    except Exception as e:
+        logger.warning(f"OpenAI reduce pass failed, merging chunk results locally: {e}")
+        result = merge_chunk_analyses(partials)
+    return finish_chunked_analysis(result, text, partials)
+
+# The pieces below are shared with async_api: what to send and how to combine the answers
+# is decided here once, and each side only differs in how it waits for the model.
+
+def analysis_cache_key(text):
+    # Results depend on how the text was chunked and budgeted as well as on the prompt
+    return make_cache_key(text, token_budgeter.fingerprint("analysis"),
+                          f"{ANALYSIS_PROMPT_VERSION};chunk={ANALYSIS_CHUNK_TOKENS}")
+
+def refinement_cache_key(text):
+    return make_cache_key(text, token_budgeter.fingerprint("transcript"),
+                          f"{TRANSCRIPT_PROMPT_VERSION};chunk={ANALYSIS_CHUNK_TOKENS}")
+
+def analysis_chunks(text):
+    """The pieces of text analyzed by separate model calls; one piece when it fits a single call"""
+    return split_text_into_chunks(text, ANALYSIS_CHUNK_TOKENS)
+
+def _llm_call(task, system, build_prompt, text, **options):
+    """Keyword arguments for llm.chat_json() and friends, with text fitted into build_prompt(text) for the task"""
+    budget = token_budgeter.plan(task, system, build_prompt, text, **options)
+    return dict(task=task, system=system, prompt=budget.prompt, **budget.params)
+
+def analysis_chunk_call(text):
+    return _llm_call("analysis", ANALYSIS_SYSTEM_PROMPT, build_analysis_prompt, text, ceiling=False)
+
+def reduce_batch_call(partials):
+    return _llm_call("analysis", REDUCE_SYSTEM_PROMPT, lambda text: text, build_reduce_prompt(partials),
+                     ceiling=False)
+
+def quiz_call(text, quiz_type="all", num_questions=5):
+    return _llm_call("quiz", QUIZ_SYSTEM_PROMPT, lambda text: build_quiz_prompt(text, quiz_type, num_questions),
+                     text, num_questions=num_questions)
+
+def flashcards_call(text, num_cards=10):
+    return _llm_call("flashcards", FLASHCARDS_SYSTEM_PROMPT, lambda text: build_flashcards_prompt(text, num_cards),
+                     text, num_cards=num_cards)
+
+def transcript_chunk_call(text):
+    return _llm_call("transcript", TRANSCRIPT_SYSTEM_PROMPT, build_transcript_refinement_prompt, text, ceiling=False)
+
+def finish_chunk_analysis(result, text):
+    result["full_text"] = text
+    return result
+
+def finish_chunked_analysis(result, text, partials):
+    """Complete a reduced (or locally merged) analysis of a chunked text"""
+    # Counts are exact when computed over the whole text rather than estimated per chunk
+    result["word_count"] = len(text.split())
+    result["sentence_count"] = sum(p.get("sentence_count") or 0 for p in partials)
+    result["full_text"] = text
+    return result
+
+def join_refined_chunks(refined_chunks):
+    return "\n\n".join(chunk.strip() for chunk in refined_chunks if chunk)
+
+def merge_chunk_analyses(partials, max_points=5, max_concepts=10):
+    """Merge per-chunk analyses into the single-analysis schema without another model call"""
+    summary = " ".join(p.get("summary", "") for p in partials if p.get("summary"))
+    
+    # Take key points round-robin so every part of the document is represented
+    key_points = []
+    point_lists = [p.get("key_points") or [] for p in partials]
+    for i in range(max(len(points) for points in point_lists)):
+        for points in point_lists:
+            if i < len(points) and points[i] not in key_points:
+                key_points.append(points[i])
+    
+    # Rank concepts by how many chunks mention them
+    concept_counts = {}
+    for p in partials:
+        for concept in p.get("key_concepts") or []:
+            key = concept.lower()
+            count, first = concept_counts.get(key, (0, concept))
+            concept_counts[key] = (count + 1, first)
+    key_concepts = [first for count, first in sorted(concept_counts.values(), key=lambda c: -c[0])]
+    
+    return {
+        "summary": summary,
+        "key_points": key_points[:max_points],
+        "key_concepts": key_concepts[:max_concepts],
+        "word_count": sum(p.get("word_count") or 0 for p in partials),
+        "sentence_count": sum(p.get("sentence_count") or 0 for p in partials)
+    }
+
+def _reduce_section(number, partial):
+    return json.dumps({
+        "part": number,
+        "summary": partial.get("summary", ""),
+        "key_points": partial.get("key_points", []),
+        "key_concepts": partial.get("key_concepts", [])
+    })
+
+def build_reduce_prompt(partials):
+    """Build the prompt that merges per-chunk analyses into one"""
+    sections = [_reduce_section(i, p) for i, p in enumerate(partials, 1)]
+    
+    return f"""
+    You are given analyses of consecutive parts of one document, in order. Combine them into a single analysis of the whole document.
+    
+    Requirements:
+    - Write a concise yet comprehensive summary (3-5 sentences) covering the document as a whole
+    - Select exactly 5 key points that best represent the entire document
+    - Select the 10 most significant key concepts across all parts
+    - Use only information present in the partial analyses
+    
+    Format your response as a JSON object with the following structure:
+    {{
+        "summary": "string",
+        "key_points": ["string", "string", ...],
+        "key_concepts": ["string", "string", ...]
+    }}
+    
+    Partial analyses:
+    {chr(10).join(sections)}
+    """
+
+def plan_reduce_batches(partials):
+    """Group consecutive partial analyses into batches whose reduce prompt fits the model
+    
+    Every batch but a lone last one holds at least two partials, so each round of
+    reduction at least halves their number and nothing has to be trimmed away.
+    """
+    room = token_budgeter.prompt_room("analysis", REDUCE_SYSTEM_PROMPT) - count_tokens(build_reduce_prompt([]))
+    batches = [[]]
+    size = 0
+    for partial in partials:
+        # Part numbers restart in every batch; four digits is plenty of allowance for them
+        tokens = count_tokens(_reduce_section(9999, partial)) + 1
+        if len(batches[-1]) >= 2 and size + tokens > room:
+            batches.append([])
+            size = 0
+        batches[-1].append(partial)
+        size += tokens
+    return batches
+
+def _reduce_analyses_with_openai(partials):
+    """Merge per-chunk analyses into one summary, key point and key concept list using OpenAI"""
+    batches = plan_reduce_batches(partials)
+    while len(batches) > 1:
+        # Too many for one prompt: reduce consecutive batches first, then reduce their results
+        logger.info(f"Reducing {len(partials)} chunk analyses in {len(batches)} batches")
+        partials = map_concurrently(_reduce_batch_with_openai, batches, ANALYSIS_MAX_PARALLEL_CHUNKS)
+        batches = plan_reduce_batches(partials)
+    return _reduce_batch_with_openai(partials)
+
+def _reduce_batch_with_openai(partials):
+    """One reduce request for partial analyses that fit a single prompt"""
+    logger.info(f"Sending reduce request for {len(partials)} chunk analyses to OpenAI API")
+    return llm.chat_json(**reduce_batch_call(partials))
+
+def build_analysis_prompt(text):
+    """Build the analysis prompt for a single chunk of text"""
+    return f"""
+    You are a precise, meticulous academic analyst. Your task is to perform a comprehensive analysis of the provided text, focusing ONLY on the most important and relevant information.
+
+    IMPORTANT: 
+    - Remove any useless, redundant, or tangential information
+    - Focus only on the core concepts and essential points
+    - Filter out any examples or details that don't add significant value
+    - Be highly selective - include only what's truly important
+    
+    Provide the following WITHOUT additional commentary:
+    
+    1. A concise yet comprehensive summary (3-5 sentences) that captures ONLY the most critical information
+    2. Exactly 5 key points (use precise, factual statements - focus on the most important concepts only)
+    3. 10 specific key concepts or terms (choose only the most significant ones)
+    4. Exact word count and sentence count (calculate these accurately)
+    
+    Requirements:
+    - The summary must be factually precise, covering ONLY the main thesis and core arguments
+    - Key points must represent the most important content only
+    - Key concepts must be the most essential technical/domain-specific terms mentioned
+    - All calculations must be accurate and based only on the provided text
+    
+    Format your response as a JSON object with the following structure:
+    {{
+        "summary": "string",
+        "key_points": ["string", "string", ...],
+        "key_concepts": ["string", "string", ...],
+        "word_count": number,
+        "sentence_count": number
+    }}
+    
+    Text to analyze:
+    {text}
+    """
+
+def _analyze_chunk_with_openai(text):
+    """Analyze a single chunk of text using OpenAI API, raising on failure"""
+    call = analysis_chunk_call(text)
+    
+    logger.info("Sending request to OpenAI API")
+    
+    result = llm.chat_json(**call)
+    
+    logger.info("Received response from OpenAI API")
+    
+    return finish_chunk_analysis(result, text)
+
+def build_quiz_prompt(text, quiz_type="all", num_questions=5):
+    """Build the quiz generation prompt"""
+    return f"""
+    As an expert educator, create a pedagogically sound, challenging quiz with precisely {num_questions} questions based on the provided text.
+    
+    Quiz type: {quiz_type} (multiple-choice, true-false, open-ended, or all types mixed)
+    
+    IMPORTANT FOCUS INSTRUCTIONS:
+    1. Focus ONLY on the most important and relevant information in the text
+    2. Ignore tangential details, useless examples, or non-essential information
+    3. Concentrate on testing understanding of core concepts and key ideas
+    4. Create questions that evaluate comprehension of the most crucial content
+    
+    REQUIREMENTS:
+    1. Questions must test deep conceptual understanding, not mere recall
+    2. Include questions across all cognitive levels (knowledge, comprehension, application, analysis)
+    3. For multiple-choice:
+       - Provide exactly 4 options with only 1 correct answer
+       - All distractors must be plausible and related to the content
+       - Avoid "all/none of the above" options
+    4. For true-false:
+       - Create complete, contextually rich sentences
+       - Avoid simplistic or obvious statements
+       - Include subtle distinctions that require careful reading
+    5. For open-ended:
+       - Questions must require analytical thinking
+       - Provide rich context to frame the question
+       - Include a model answer that demonstrates depth of understanding
+    
+    Format the response as a JSON object with this EXACT structure:
+    {{
+        "questions": [
+            {{
+                "type": "multiple-choice",
+                "question": "string",
+                "options": ["string", "string", "string", "string"],
+                "answer": "exact text of correct option",
+                "explanation": "string explaining why this answer is correct"
+            }},
+            {{
+                "type": "true-false",
+                "question": "string (a complete sentence statement)",
+                "answer": boolean,
+                "explanation": "string explaining why the statement is true/false"
+            }},
+            {{
+                "type": "open-ended",
+                "question": "string",
+                "context": "string providing background for the question",
+                "suggested_answer": "string - a comprehensive model answer",
+                "key_points": ["point 1", "point 2", "point 3"]
+            }}
+        ]
+    }}
+    
+    Text to create quiz from:
+    {text}
+    """
+
 def create_quiz_with_openai(text, quiz_type="all", num_questions=5):
     """Create quiz questions from text using OpenAI"""
     try:
-        # Truncate text if needed
-        max_length = 14000  # Leaving room for prompt and response
-        if len(text) > max_length:
-            text = text[:max_length] + "..."
-        
-        prompt = f"""
-        As an expert educator, create a pedagogically sound, challenging quiz with precisely {num_questions} questions based on the provided text.
-        
-        Quiz type: {quiz_type} (multiple-choice, true-false, open-ended, or all types mixed)
-        
-        IMPORTANT FOCUS INSTRUCTIONS:
-        1. Focus ONLY on the most important and relevant information in the text
-        2. Ignore tangential details, useless examples, or non-essential information
-        3. Concentrate on testing understanding of core concepts and key ideas
-        4. Create questions that evaluate comprehension of the most crucial content
-        
-        REQUIREMENTS:
-        1. Questions must test deep conceptual understanding, not mere recall
-        2. Include questions across all cognitive levels (knowledge, comprehension, application, analysis)
-        3. For multiple-choice:
-           - Provide exactly 4 options with only 1 correct answer
-           - All distractors must be plausible and related to the content
-           - Avoid "all/none of the above" options
-        4. For true-false:
-           - Create complete, contextually rich sentences
-           - Avoid simplistic or obvious statements
-           - Include subtle distinctions that require careful reading
-        5. For open-ended:
-           - Questions must require analytical thinking
-           - Provide rich context to frame the question
-           - Include a model answer that demonstrates depth of understanding
-        
-        Format the response as a JSON object with this EXACT structure:
-        {{
-            "questions": [
-                {{
-                    "type": "multiple-choice",
-                    "question": "string",
-                    "options": ["string", "string", "string", "string"],
-                    "answer": "exact text of correct option",
-                    "explanation": "string explaining why this answer is correct"
-                }},
-                {{
-                    "type": "true-false",
-                    "question": "string (a complete sentence statement)",
-                    "answer": boolean,
-                    "explanation": "string explaining why the statement is true/false"
-                }},
-                {{
-                    "type": "open-ended",
-                    "question": "string",
-                    "context": "string providing background for the question",
-                    "suggested_answer": "string - a comprehensive model answer",
-                    "key_points": ["point 1", "point 2", "point 3"]
-                }}
-            ]
-        }}
-        
-        Text to create quiz from:
-        {text}
-        """
-        
-        # Use the client object if available
-        if hasattr(openai, 'client') and openai.client:
-            response = openai.client.chat.completions.create(
-                model="gpt-3.5-turbo-0125",
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": "You are a master educator who creates cognitively demanding, pedagogically sound assessments that focus only on truly important information. You ignore irrelevant details and test only what matters most."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-        else:
-            # Fallback to the old approach
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo-0125",
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": "You are a master educator who creates cognitively demanding, pedagogically sound assessments that focus only on truly important information. You ignore irrelevant details and test only what matters most."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-        
-        # Parse the JSON response
-        return json.loads(response.choices[0].message.content)
+        return llm.chat_json(**quiz_call(text, quiz_type, num_questions))
     
     except Exception as e:
-        print(f"Error using OpenAI API for quiz generation: {e}")
+        logger.warning(f"Error using OpenAI API for quiz generation: {e}", exc_info=True)
         # Fall back to local processing if OpenAI fails
         return create_quiz_local(text, quiz_type, num_questions)
 
+def build_flashcards_prompt(text, num_cards=10):
+    """Build the flashcard generation prompt"""
+    return f"""
+    As a cognitive science expert specializing in effective learning methods, create exactly {num_cards} high-quality flashcards based on the provided text.
+    
+    FOCUS REQUIREMENTS:
+    1. Focus ONLY on the most significant concepts and ideas from the text
+    2. Eliminate any flashcards about trivial, tangential, or non-essential information
+    3. Concentrate exclusively on the content that will maximize learning value
+    4. Filter out any examples or details that don't add significant educational value
+    
+    REQUIREMENTS FOR PERFECT FLASHCARDS:
+    1. Identify the most important concepts, terms, principles, and relationships in the text
+    2. Front side:
+       - Precise, clear phrasing framed as a direct question or concept prompt
+       - Focused on a single, discrete concept
+       - Provide cued recall rather than simple recognition
+    3. Back side:
+       - Concise yet complete explanation (2-3 sentences max)
+       - Use precise language and technical terminology correctly
+       - Include a concrete example or application where applicable
+    4. Each flashcard must:
+       - Follow cognitive science principles for optimal learning
+       - Be self-contained but interconnected with other concepts
+       - Include specific page/timestamp reference if available
+       - Use exact terminology from the source material
+    
+    Format the response as a JSON object with this EXACT structure:
+    {{
+        "flashcards": [
+            {{
+                "front": "specific concept question or prompt",
+                "back": "precise, concise explanation",
+                "key_term": "the central term or concept",
+                "context": "specific context where this concept appears",
+                "example": "concrete application or example of the concept",
+                "related_concepts": ["related term 1", "related term 2"]
+            }},
+            ...
+        ]
+    }}
+    
+    Text to create flashcards from:
+    {text}
+    """
+
 def create_flashcards_with_openai(text, num_cards=10):
     """Generate flashcards from text using OpenAI"""
     try:
-        # Truncate text if needed
-        max_length = 14000  # Leaving room for prompt and response
-        if len(text) > max_length:
-            text = text[:max_length] + "..."
-        
-        prompt = f"""
-        As a cognitive science expert specializing in effective learning methods, create exactly {num_cards} high-quality flashcards based on the provided text.
-        
-        FOCUS REQUIREMENTS:
-        1. Focus ONLY on the most significant concepts and ideas from the text
-        2. Eliminate any flashcards about trivial, tangential, or non-essential information
-        3. Concentrate exclusively on the content that will maximize learning value
-        4. Filter out any examples or details that don't add significant educational value
-        
-        REQUIREMENTS FOR PERFECT FLASHCARDS:
-        1. Identify the most important concepts, terms, principles, and relationships in the text
-        2. Front side:
-           - Precise, clear phrasing framed as a direct question or concept prompt
-           - Focused on a single, discrete concept
-           - Provide cued recall rather than simple recognition
-        3. Back side:
-           - Concise yet complete explanation (2-3 sentences max)
-           - Use precise language and technical terminology correctly
-           - Include a concrete example or application where applicable
-        4. Each flashcard must:
-           - Follow cognitive science principles for optimal learning
-           - Be self-contained but interconnected with other concepts
-           - Include specific page/timestamp reference if available
-           - Use exact terminology from the source material
-        
-        Format the response as a JSON object with this EXACT structure:
-        {{
-            "flashcards": [
-                {{
-                    "front": "specific concept question or prompt",
-                    "back": "precise, concise explanation",
-                    "key_term": "the central term or concept",
-                    "context": "specific context where this concept appears",
-                    "example": "concrete application or example of the concept",
-                    "related_concepts": ["related term 1", "related term 2"]
-                }},
-                ...
-            ]
-        }}
-        
-        Text to create flashcards from:
-        {text}
-        """
-        
-        # Use the client object if available
-        if hasattr(openai, 'client') and openai.client:
-            response = openai.client.chat.completions.create(
-                model="gpt-3.5-turbo-0125",
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": "You are a flashcard creation expert who focuses only on the most important information. You ruthlessly eliminate flashcards about trivial details and ensure each card delivers maximum educational value."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-        else:
-            # Fallback to the old approach
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo-0125",
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": "You are a flashcard creation expert who focuses only on the most important information. You ruthlessly eliminate flashcards about trivial details and ensure each card delivers maximum educational value."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-        
-        # Parse the JSON response
-        return json.loads(response.choices[0].message.content)
+        return llm.chat_json(**flashcards_call(text, num_cards))
     
     except Exception as e:
-        print(f"Error using OpenAI API for flashcard generation: {e}")
+        logger.warning(f"Error using OpenAI API for flashcard generation: {e}", exc_info=True)
         # Fall back to local processing if OpenAI fails
         return create_flashcards_local(text, num_cards)
 
+def build_study_pack_prompt(text, quiz_type="all", num_questions=5, num_cards=10):
+    """Build the combined analysis, quiz and flashcard prompt"""
+    return f"""
+    As an expert educator, turn the provided text into a complete study pack in a single pass, focusing ONLY on the most important and relevant information.
+    
+    IMPORTANT FOCUS INSTRUCTIONS:
+    1. Ignore tangential details, useless examples, or non-essential information
+    2. Concentrate on the core concepts, key ideas and essential terminology
+    3. Keep the summary, quiz and flashcards consistent with each other and with the text
+    
+    Provide ALL of the following:
+    1. A concise yet comprehensive summary (3-5 sentences) covering ONLY the main thesis and core arguments
+    2. Exactly 5 key points (precise, factual statements) and 10 key concepts or terms
+    3. Exact word count and sentence count of the text
+    4. Exactly {num_questions} quiz questions of type {quiz_type} (multiple-choice, true-false, open-ended, or all types mixed):
+       - Questions must test deep conceptual understanding, not mere recall
+       - Multiple-choice questions have exactly 4 plausible options with only 1 correct answer
+       - True-false statements are complete, contextually rich sentences
+       - Open-ended questions include context and a model answer
+    5. Exactly {num_cards} flashcards:
+       - Each focused on a single, significant concept, phrased as a direct question or prompt
+       - Backs are concise yet complete (2-3 sentences max) and use the source's exact terminology
+    
+    Format your response as a JSON object with this EXACT structure:
+    {{
+        "summary": "string",
+        "key_points": ["string", "string", ...],
+        "key_concepts": ["string", "string", ...],
+        "word_count": number,
+        "sentence_count": number,
+        "questions": [
+            {{
+                "type": "multiple-choice",
+                "question": "string",
+                "options": ["string", "string", "string", "string"],
+                "answer": "exact text of correct option",
+                "explanation": "string explaining why this answer is correct"
+            }},
+            {{
+                "type": "true-false",
+                "question": "string (a complete sentence statement)",
+                "answer": boolean,
+                "explanation": "string explaining why the statement is true/false"
+            }},
+            {{
+                "type": "open-ended",
+                "question": "string",
+                "context": "string providing background for the question",
+                "suggested_answer": "string - a comprehensive model answer",
+                "key_points": ["point 1", "point 2", "point 3"]
+            }}
+        ],
+        "flashcards": [
+            {{
+                "front": "specific concept question or prompt",
+                "back": "precise, concise explanation",
+                "key_term": "the central term or concept",
+                "context": "specific context where this concept appears",
+                "example": "concrete application or example of the concept",
+                "related_concepts": ["related term 1", "related term 2"]
+            }}
+        ]
+    }}
+    
+    Text to turn into a study pack:
+    {text}
+    """
+
+def create_study_pack_with_openai(text, quiz_type="all", num_questions=5, num_cards=10):
+    """Generate the analysis, quiz and flashcards for a text in one OpenAI call, raising on failure"""
+    logger.info("Sending combined study pack request to OpenAI API")
+    budget = token_budgeter.plan("study_pack", STUDY_PACK_SYSTEM_PROMPT,
+                                 lambda text: build_study_pack_prompt(text, quiz_type, num_questions, num_cards),
+                                 text, num_questions=num_questions, num_cards=num_cards)
+    pack = llm.chat_json("study_pack", STUDY_PACK_SYSTEM_PROMPT, budget.prompt, **budget.params)
+    
+    questions = pack.pop("questions", None)
+    flashcards = pack.pop("flashcards", None)
+    if not pack.get("summary") or not isinstance(questions, list) or not isinstance(flashcards, list):
+        raise ValueError("Combined study pack response is missing required fields")
+    
+    return {
+        "analysis": pack,
+        "quiz": {"questions": questions},
+        "flashcards": {"flashcards": flashcards}
+    }
+
+def build_study_pack(text, quiz_type="all", num_questions=5, num_cards=10, artifacts=STUDY_PACK_ARTIFACTS):
+    """Produce the requested study artifacts for a text with as few model round-trips as possible
+    
+    A full pack for a text that fits in one chunk comes from a single combined
+    call. Longer texts, partial packs and failed combined calls run the
+    individual generators concurrently over the same text instead.
+    """
+    if (openai_api_key and set(artifacts) == set(STUDY_PACK_ARTIFACTS)
+            and len(analysis_chunks(text)) == 1):
+        try:
+            pack = create_study_pack_with_openai(text, quiz_type, num_questions, num_cards)
+            pack['generation'] = 'combined'
+            return pack
+        except Exception as e:
+            logger.warning(f"Combined study pack failed, generating artifacts separately: {e}")
+    
+    if openai_api_key:
+        generators = {
+            'analysis': lambda: analyze_text(text),
+            'quiz': lambda: create_quiz_with_openai(text, quiz_type, num_questions),
+            'flashcards': lambda: create_flashcards_with_openai(text, num_cards)
+        }
+    else:
+        generators = {
+            'analysis': lambda: analyze_text_local_cached(text),
+            'quiz': lambda: create_quiz_local(text, quiz_type, num_questions),
+            'flashcards': lambda: create_flashcards_local(text, num_cards)
+        }
+    results = map_concurrently(lambda name: generators[name](), artifacts, len(artifacts))
+    pack = dict(zip(artifacts, results))
+    pack['generation'] = 'parallel' if openai_api_key else 'local'
+    return pack
+
 def refine_youtube_transcript_with_openai(text):
-    """Use OpenAI to create a refined, condensed version of the transcript"""
-    try:
-        # Truncate text if needed to accommodate token limits
-        max_length = 14000  # Leaving room for prompt and response
-        if len(text) > max_length:
-            text = text[:max_length] + "..."
-        
-        prompt = f"""
-        You are a transcript editor and summarizer. Your task is to take a raw YouTube video transcript and transform it into a well-structured, 
-        coherent summary that captures ONLY the key information.
-        
-        CRITICAL INSTRUCTIONS:
-        1. REMOVE all useless information, filler content, and tangential remarks
-        2. FOCUS exclusively on the most important and relevant content
-        3. ELIMINATE speech artifacts, repetitions, filler words, and other issues common in spoken language
-        4. FILTER OUT any examples or details that don't add significant educational value
-        5. KEEP ONLY the core concepts, crucial explanations, and essential points
-        6. ORGANIZE the remaining content into a coherent, readable format with proper flow
-        7. CREATE a concise yet comprehensive representation of ONLY the valuable content
-        
-        Raw YouTube transcript:
-        {text}
-        """
-        
-        logger.info("Sending request to OpenAI API for transcript refinement")
-        
-        # Use the client object if available
-        if hasattr(openai, 'client') and openai.client:
-            response = openai.client.chat.completions.create(
-                model="gpt-3.5-turbo-0125",
-                messages=[
-                    {"role": "system", "content": "You are a transcript editor who transforms raw transcripts into clear, coherent text. You ruthlessly eliminate useless information and focus only on what's truly important and educational."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-        else:
-            # Fallback to the old approach
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo-0125",
-                messages=[
-                    {"role": "system", "content": "You are a transcript editor who transforms raw transcripts into clear, coherent text. You ruthlessly eliminate useless information and focus only on what's truly important and educational."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-        
-        logger.info("Received response from OpenAI API for transcript refinement")
-        
-        # Extract the refined text
-        refined_text = response.choices[0].message.content
+    """Use OpenAI to create a refined, condensed version of the transcript, reusing cached refinements"""
+    cache_key = refinement_cache_key(text)
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Returning cached transcript refinement")
+        return cached
+    
+    def run():
+        # Refine long transcripts chunk by chunk, concurrently, and stitch the parts back in order
+        chunks = analysis_chunks(text)
+        refined_chunks = map_concurrently(_refine_transcript_chunk_with_openai, chunks, ANALYSIS_MAX_PARALLEL_CHUNKS)
+        refined_text = join_refined_chunks(refined_chunks)
+        analysis_cache.set(cache_key, refined_text)
         return refined_text
     
+    try:
+        return refinement_flight.do(cache_key, run)
     except Exception as e:
         logger.error(f"Error using OpenAI API for transcript refinement: {e}")
         return None
 
+def build_transcript_refinement_prompt(text):
+    """Build the prompt that refines one chunk of a raw transcript"""
+    return f"""
+    You are a transcript editor and summarizer. Your task is to take a raw YouTube video transcript and transform it into a well-structured, 
+    coherent summary that captures ONLY the key information.
+    
+    CRITICAL INSTRUCTIONS:
+    1. REMOVE all useless information, filler content, and tangential remarks
+    2. FOCUS exclusively on the most important and relevant content
+    3. ELIMINATE speech artifacts, repetitions, filler words, and other issues common in spoken language
+    4. FILTER OUT any examples or details that don't add significant educational value
+    5. KEEP ONLY the core concepts, crucial explanations, and essential points
+    6. ORGANIZE the remaining content into a coherent, readable format with proper flow
+    7. CREATE a concise yet comprehensive representation of ONLY the valuable content
+    
+    Raw YouTube transcript:
+    {text}
+    """
+
+def _refine_transcript_chunk_with_openai(text):
+    """Refine a single chunk of a transcript using OpenAI, raising on failure"""
+    logger.info("Sending request to OpenAI API for transcript refinement")
+    refined_text = llm.chat_text(**transcript_chunk_call(text))
+    
+    logger.info("Received response from OpenAI API for transcript refinement")
+    
+    return refined_text
+
+def build_voice_prompt(text):
+    """Build the voice note analysis prompt"""
+    return f"""
+    You are a highly accurate voice note processor. Your task is to analyze the voice transcription and produce content that STRICTLY represents what was actually said, ensuring no fabricated information is added.
+
+    CRITICAL INSTRUCTIONS:
+    1. NEVER add information that was not explicitly stated in the voice recording
+    2. ONLY work with information that is clearly present in the transcription
+    3. MAINTAIN the integrity of the original content - do not embellish or extrapolate
+    4. CLARIFY any ambiguities if possible, but DO NOT invent explanations
+    5. PRESERVE the exact meaning of what the user said, not what you think they might have meant
+    6. EXCLUDE anything that sounds like filler words or speech artifacts
+    
+    Provide the following in your analysis:
+    
+    1. A factually accurate summary that represents ONLY what was actually said (3-4 sentences)
+    2. 3-5 key points that were EXPLICITLY stated in the recording (not inferred)
+    3. 5-8 specific key concepts or terms that were ACTUALLY mentioned
+    4. Brief statistics about the content (word count, general subject matter)
+    
+    Format your response as a JSON object with the following structure:
+    {{
+        "summary": "string - factually accurate based ONLY on what was said",
+        "key_points": ["string - point explicitly stated", ...],
+        "key_concepts": ["string - concept actually mentioned", ...],
+        "word_count": number,
+        "subject": "brief description of the actual subject discussed"
+    }}
+    
+    Voice transcription to analyze:
+    {text}
+    """
+
 def process_voice_transcription_with_openai(text):
     """Process voice note transcriptions to ensure accurate information extraction and analysis"""
     try:
-        # Truncate text if needed
-        max_length = 14000  # Leaving room for prompt and response
-        if len(text) > max_length:
-            text = text[:max_length] + "..."
-        
-        prompt = f"""
-        You are a highly accurate voice note processor. Your task is to analyze the voice transcription and produce content that STRICTLY represents what was actually said, ensuring no fabricated information is added.
-
-        CRITICAL INSTRUCTIONS:
-        1. NEVER add information that was not explicitly stated in the voice recording
-        2. ONLY work with information that is clearly present in the transcription
-        3. MAINTAIN the integrity of the original content - do not embellish or extrapolate
-        4. CLARIFY any ambiguities if possible, but DO NOT invent explanations
-        5. PRESERVE the exact meaning of what the user said, not what you think they might have meant
-        6. EXCLUDE anything that sounds like filler words or speech artifacts
-        
-        Provide the following in your analysis:
-        
-        1. A factually accurate summary that represents ONLY what was actually said (3-4 sentences)
-        2. 3-5 key points that were EXPLICITLY stated in the recording (not inferred)
-        3. 5-8 specific key concepts or terms that were ACTUALLY mentioned
-        4. Brief statistics about the content (word count, general subject matter)
-        
-        Format your response as a JSON object with the following structure:
-        {{
-            "summary": "string - factually accurate based ONLY on what was said",
-            "key_points": ["string - point explicitly stated", ...],
-            "key_concepts": ["string - concept actually mentioned", ...],
-            "word_count": number,
-            "subject": "brief description of the actual subject discussed"
-        }}
-        
-        Voice transcription to analyze:
-        {text}
-        """
+        budget = token_budgeter.plan("voice", VOICE_SYSTEM_PROMPT, build_voice_prompt, text)
         
         logger.info("Sending request to OpenAI API for voice note processing")
         
-        # Use the client object if available
-        if hasattr(openai, 'client') and openai.client:
-            response = openai.client.chat.completions.create(
-                model="gpt-3.5-turbo-0125",
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": "You are a precise voice transcription analyst that ensures all information is factually derived from the recording. You never add information that wasn't explicitly stated and you prioritize accuracy over completeness."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-        else:
-            # Fallback to the old approach
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo-0125",
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": "You are a precise voice transcription analyst that ensures all information is factually derived from the recording. You never add information that wasn't explicitly stated and you prioritize accuracy over completeness."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
+        result = llm.chat_json(
+            "voice",
+            VOICE_SYSTEM_PROMPT,
+            budget.prompt,
+            **budget.params
+        )
         
         logger.info("Received response from OpenAI API for voice note processing")
         
-        # Parse the JSON response
-        result = json.loads(response.choices[0].message.content)
         
-        # Add the full text to the result
-        result["full_text"] = text
+        # Add the text the analysis was made from to the result
+        result["full_text"] = budget.text
         
         return result
     
@@ -783,15 +1373,17 @@ def process_voice_transcription_with_openai(text):
 
 def analyze_text_local(text):
     """Analyze text to create a summary and key points (local fallback)"""
-    # Basic text preprocessing
-    sentences = sent_tokenize(text)
-    words = word_tokenize(text.lower())
-    stop_words = set(stopwords.words('english'))
-    filtered_words = [word for word in words if word.isalnum() and word not in stop_words]
+    # Basic text preprocessing, shared with the quiz and flashcard generators
+    doc = get_processed_document(text)
+    
+    engine = get_textrank_engine() if LOCAL_ANALYSIS_ENGINE == "textrank" else None
+    if engine is not None:
+        return engine.analyze_document(doc)
+    
+    sentences = doc.sentences
     
     # Get most common words for key concepts
-    fdist = FreqDist(filtered_words)
-    key_words = [word for word, _ in fdist.most_common(10)]
+    key_words = [word for word, _ in doc.frequencies.most_common(10)]
     
     # Create a simple summary (first 3 sentences or less)
     summary = " ".join(sentences[:min(3, len(sentences))])
@@ -803,14 +1395,13 @@ def analyze_text_local(text):
             if word in sentence.lower():
                 key_sentences.append(sentence)
                 break
-    
-    # Limit to top 5 key sentences
-    key_sentences = key_sentences[:min(5, len(key_sentences))]
+        if len(key_sentences) == 5:
+            break
     
     return {
         "summary": summary,
         "key_points": key_sentences,
-        "word_count": len(words),
+        "word_count": doc.word_count,
         "sentence_count": len(sentences),
         "key_concepts": key_words,
         "full_text": text
@@ -818,57 +1409,70 @@ def analyze_text_local(text):
 
 def create_quiz_local(text, quiz_type="all", num_questions=5):
     """Create quiz questions from text (local fallback)"""
-    sentences = sent_tokenize(text)
+    doc = get_processed_document(text)
+    sentences = doc.sentences
     
     if len(sentences) < 3:
         return {"error": "Text is too short to generate meaningful quiz questions"}
     
+    # Distractors come from a per-document term table ranked by similarity to the answer
+    engine = get_quiz_engine()
+    term_table = engine.get_term_table(doc) if engine is not None else None
+    
     # Select random sentences to base questions on
-    selected_sentences = random.sample(sentences, min(num_questions * 2, len(sentences)))
+    selected_ids = random.sample(range(len(sentences)), min(num_questions * 2, len(sentences)))
     
     quiz_questions = []
     
     if quiz_type in ["multiple-choice", "all"]:
-        # Generate multiple choice questions
-        for i in range(min(num_questions // 2, len(selected_sentences))):
-            sentence = selected_sentences[i]
-            words = word_tokenize(sentence)
+        # Pick every blanked-out term first so their distractors are ranked in one pass
+        blanks = []
+        for i in range(min(num_questions // 2, len(selected_ids))):
+            sentence_id = selected_ids[i]
             
             # Find nouns or important words to ask about
-            filtered_words = [word for word in words if len(word) > 4 and word.isalpha()]
+            filtered_words = doc.sentence_terms[sentence_id]
+            if term_table is not None:
+                filtered_words = [w for w in filtered_words if w in term_table] or filtered_words
             
             if filtered_words:
-                key_word = random.choice(filtered_words)
-                question = sentence.replace(key_word, "____")
-                
-                # Generate options (including the correct answer)
-                options = [key_word]
-                
-                # Add 3 random different words as distractors
-                other_words = [w for w in filtered_words if w != key_word]
-                if len(other_words) >= 3:
+                blanks.append((sentence_id, random.choice(filtered_words)))
+        
+        if term_table is not None:
+            ranked = term_table.distractors([key_word for _, key_word in blanks], 3)
+        else:
+            ranked = [[] for _ in blanks]
+        
+        for (sentence_id, key_word), distractors in zip(blanks, ranked):
+            question = sentences[sentence_id].replace(key_word, "____")
+            
+            # Generate options (including the correct answer)
+            options = [key_word] + distractors
+            
+            if len(options) < 4:
+                # Without ranked distractors, use other words of the same sentence, then the whole text
+                other_words = [w for w in doc.sentence_terms[sentence_id] if w not in options]
+                if not distractors and len(other_words) >= 3:
                     options.extend(random.sample(other_words, 3))
                 else:
-                    # If not enough words in the same sentence, get some from the whole text
-                    all_words = [w for w in word_tokenize(text) 
-                                if len(w) > 4 and w.isalpha() and w != key_word]
-                    options.extend(random.sample(all_words, min(3, len(all_words))))
-                
-                random.shuffle(options)
-                
-                quiz_questions.append({
-                    "type": "multiple-choice",
-                    "question": question,
-                    "options": options,
-                    "answer": key_word
-                })
+                    options.extend(doc.sample_terms(4 - len(options), exclude=options))
+            
+            random.shuffle(options)
+            
+            quiz_questions.append({
+                "type": "multiple-choice",
+                "question": question,
+                "options": options,
+                "answer": key_word
+            })
     
     if quiz_type in ["true-false", "all"]:
         # Generate true/false questions
-        for i in range(min(num_questions // 2, len(selected_sentences))):
+        for i in range(min(num_questions // 2, len(selected_ids))):
             index = i + num_questions // 2
-            if index < len(selected_sentences):
-                sentence = selected_sentences[index]
+            if index < len(selected_ids):
+                sentence_id = selected_ids[index]
+                sentence = sentences[sentence_id]
                 
                 # 50% chance to create a false statement by altering the sentence
                 is_true = random.choice([True, False])
@@ -876,14 +1480,16 @@ def create_quiz_local(text, quiz_type="all", num_questions=5):
                 if is_true:
                     question = sentence
                 else:
-                    words = word_tokenize(sentence)
+                    words = list(doc.sentence_tokens[sentence_id])
                     if len(words) > 5:
-                        # Replace a random word to make it false
-                        replace_idx = random.randint(2, len(words) - 2)
-                        all_words = [w for w in word_tokenize(text) 
-                                    if len(w) > 4 and w.isalpha() and w != words[replace_idx]]
-                        if all_words:
-                            words[replace_idx] = random.choice(all_words)
+                        # Swap a term for a similar one to make it false, or failing that a random word
+                        positions = [j for j in range(2, len(words) - 1) if term_table is not None and words[j] in term_table]
+                        replace_idx = random.choice(positions) if positions else random.randint(2, len(words) - 2)
+                        replacements = term_table.distractors([words[replace_idx]], 1)[0] if positions else []
+                        if not replacements:
+                            replacements = doc.sample_terms(1, exclude=[words[replace_idx]])
+                        if replacements:
+                            words[replace_idx] = replacements[0]
                         
                         question = " ".join(words)
                     else:
@@ -898,16 +1504,16 @@ def create_quiz_local(text, quiz_type="all", num_questions=5):
     
     if quiz_type in ["open-ended", "all"]:
         # Generate open-ended questions
-        for i in range(min(num_questions // 3, len(selected_sentences))):
+        for i in range(min(num_questions // 3, len(selected_ids))):
             index = i + 2 * (num_questions // 3)
-            if index < len(selected_sentences):
-                sentence = selected_sentences[index]
+            if index < len(selected_ids):
+                sentence_id = selected_ids[index]
+                sentence = sentences[sentence_id]
                 
                 # Create a simple question by turning a statement into a question
-                words = word_tokenize(sentence)
-                if len(words) > 5:
+                if len(doc.sentence_tokens[sentence_id]) > 5:
                     # Find important words to ask about
-                    key_words = [word for word in words if len(word) > 4 and word.isalpha()]
+                    key_words = doc.sentence_terms[sentence_id]
                     
                     if key_words:
                         key_word = random.choice(key_words)
@@ -925,21 +1531,22 @@ def create_quiz_local(text, quiz_type="all", num_questions=5):
 
 def create_flashcards_local(text, num_cards=10):
     """Generate flashcards from text (local fallback)"""
-    sentences = sent_tokenize(text)
+    doc = get_processed_document(text)
+    sentences = doc.sentences
     
     if len(sentences) < 3:
         return {"error": "Text is too short to generate meaningful flashcards"}
     
     # Select random sentences to base flashcards on
-    selected_sentences = random.sample(sentences, min(num_cards, len(sentences)))
+    selected_ids = random.sample(range(len(sentences)), min(num_cards, len(sentences)))
     
     flashcards = []
     
-    for sentence in selected_sentences:
-        words = word_tokenize(sentence)
+    for sentence_id in selected_ids:
+        sentence = sentences[sentence_id]
         
         # Find nouns or important words to create flashcards
-        filtered_words = [word for word in words if len(word) > 4 and word.isalpha()]
+        filtered_words = doc.sentence_terms[sentence_id]
         
         if filtered_words:
             key_word = random.choice(filtered_words)
@@ -948,33 +1555,28 @@ def create_flashcards_local(text, num_cards=10):
             front = f"Define or explain: {key_word}"
             back = sentence
             
+            # Other sentences mentioning the key word, straight from the term index
+            mentions = (sentences[i] for i in doc.term_index.get(key_word.lower(), ()) if sentences[i] != sentence)
+            
             # Find some context from another sentence if possible
-            context = ""
-            for other_sentence in sentences:
-                if other_sentence != sentence and key_word.lower() in other_sentence.lower():
-                    context = other_sentence
-                    break
+            context = next(mentions, "")
             
-            if not context and len(sentences) > 1:
-                # If no specific context found, use another sentence as general context
-                other_sentences = [s for s in sentences if s != sentence]
-                context = random.choice(other_sentences)
+            if not context:
+                # If no specific context found, use a neighbouring sentence that does not repeat the back
+                neighbours = (sentences[i] for i in (sentence_id + 1, sentence_id - 1) if 0 <= i < len(sentences))
+                context = next((s for s in neighbours if s != sentence), "")
             
             # Find related terms based on word proximity
             related_terms = []
             for word in filtered_words:
-                if word != key_word and len(word) > 4:
+                if word != key_word and word not in related_terms:
                     related_terms.append(word)
+                    # Limit to 3 related terms
+                    if len(related_terms) == 3:
+                        break
             
-            # Limit to 3 related terms
-            related_terms = related_terms[:3]
-            
-            # Create a simple example by finding a sentence with the key word
-            example = ""
-            for ex_sentence in sentences:
-                if ex_sentence != sentence and ex_sentence != context and key_word.lower() in ex_sentence.lower():
-                    example = ex_sentence
-                    break
+            # Create a simple example by finding another sentence with the key word
+            example = next((m for m in mentions if m != context), "")
             
             flashcards.append({
                 "front": front,
@@ -987,215 +1589,493 @@ def create_flashcards_local(text, num_cards=10):
     
     return {"flashcards": flashcards[:num_cards]}
 
-@app.route('/api/process-voice', methods=['POST'])
+@api.route('/api/process-voice', methods=['POST'])
 def process_voice():
-    """Process voice recordings, perform speech-to-text, and analyze the content"""
+    """Process voice recordings, perform speech-to-text, and analyze the content
+    
+    Audio can be sent as a multipart "audio" file, as a raw audio/* body, or as base64 "audio_data" in JSON.
+    """
     try:
-        data = request.get_json()
-        audio_data = data.get('audio_data')
-        preview_only = data.get('preview_only', False)
-        
-        if not audio_data:
-            return jsonify({'error': 'No audio data provided'}), 400
-        
-        # Debug information for ffmpeg
-        logger.info("Checking ffmpeg availability...")
-        
-        # Check for ffmpeg in common paths
-        ffmpeg_locations = [
-            '/usr/local/bin/ffmpeg',
-            '/usr/bin/ffmpeg',
-            '/bin/ffmpeg',
-            '/opt/homebrew/bin/ffmpeg'  # Common for macOS with Homebrew
-        ]
-        
-        # Log ffmpeg search results
-        for loc in ffmpeg_locations:
-            if os.path.exists(loc):
-                logger.info(f"Found ffmpeg at: {loc}")
-            else:
-                logger.info(f"ffmpeg not found at: {loc}")
+        upload, error = _read_voice_upload()
+        if error:
+            return error
         
-        # Try to find ffmpeg in PATH
         try:
-            import subprocess
-            result = subprocess.run(['which', 'ffmpeg'], capture_output=True, text=True)
-            if result.returncode == 0:
-                ffmpeg_in_path = result.stdout.strip()
-                logger.info(f"ffmpeg found in PATH at: {ffmpeg_in_path}")
-                # Add this to our locations if not already there
-                if ffmpeg_in_path not in ffmpeg_locations:
-                    ffmpeg_locations.append(ffmpeg_in_path)
-            else:
-                logger.info("ffmpeg not found in PATH")
-        except Exception as e:
-            logger.warning(f"Error checking for ffmpeg in PATH: {e}")
+            result = run_voice_pipeline(upload['source'], upload['preview_only'])
+        finally:
+            upload['close']()
+        return jsonify(_finish_result(result, upload['include_full_text']))
+    
+    except RequestEntityTooLarge:
+        raise
+    except ProcessingError as e:
+        return jsonify(e.payload), e.status_code
+    except Exception as e:
+        logger.error(f"Error in process_voice: {e}")
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+def _read_voice_upload(detach=False):
+    """Read the audio of a voice request, returning (upload, None) or (None, error response)
+    
+    The upload holds the audio source (a spooled file path or bytes), the
+    request options and a close() that releases the spool. With detach=True the
+    caller takes ownership of any spooled file and must remove_source() it.
+    """
+    if request.mimetype == 'multipart/form-data':
+        file = request.files.get('audio')
+        if file is None or file.filename == '':
+            return None, (jsonify({'error': 'No audio file provided'}), 400)
+        spool, options = file.stream, request.form
+    elif request.mimetype.startswith('audio/') or request.mimetype == 'application/octet-stream':
+        # Raw audio body, with the options in the query string
+        spool, options = request.spool_body(), request.args
+    else:
+        data = request.get_json(silent=True) or {}
+        if not data.get('audio_data'):
+            return None, (jsonify({'error': 'No audio data provided'}), 400)
+        audio_bytes, error = _decode_audio_data(data['audio_data'])
+        if error:
+            return None, error
+        return {
+            'source': audio_bytes,
+            'preview_only': _is_truthy(data.get('preview_only', False)),
+            'include_full_text': _wants_full_text(data),
+            'close': lambda: None
+        }, None
+    
+    if spool.size == 0:
+        spool.close()
+        return None, (jsonify({'error': 'No audio data provided'}), 400)
+    logger.info(f"Audio received: {spool.size} bytes ({'in memory' if spool.in_memory else 'spooled to disk'})")
+    return {
+        'source': spool.detach() if detach else spool.source(),
+        'preview_only': _is_truthy(options.get('preview_only', False)),
+        'include_full_text': _wants_full_text(options),
+        'close': spool.close
+    }, None
+
+def _decode_audio_data(audio_data):
+    """Decode base64 audio data, returning (bytes, None) or (None, error response)"""
+    try:
+        # Remove data URL prefix if present
+        if ',' in audio_data:
+            audio_data = audio_data.split(',')[1]
             
-        # Decode base64 audio data
-        try:
-            # Remove data URL prefix if present
-            if ',' in audio_data:
-                audio_data = audio_data.split(',')[1]
-                
-            audio_bytes = base64.b64decode(audio_data)
-        except Exception as e:
-            logger.error(f"Error decoding audio data: {e}")
-            return jsonify({'error': 'Invalid audio data format'}), 400
-        
-        # Save audio to a temporary file
-        temp_audio_path = os.path.join(UPLOAD_FOLDER, 'temp_audio.webm')
-        with open(temp_audio_path, 'wb') as f:
-            f.write(audio_bytes)
-        
-        # Flag to track if conversion worked
+        return base64.b64decode(audio_data), None
+    except Exception as e:
+        logger.error(f"Error decoding audio data: {e}")
+        return None, (jsonify({'error': 'Invalid audio data format'}), 400)
+
+def run_voice_pipeline(audio_source, preview_only=False, progress=None):
+    """Convert, transcribe and analyze a voice recording given as bytes or a file path"""
+    progress = progress or _ignore_progress
+    
+    # Decode straight to 16 kHz mono PCM: in memory for WAV, otherwise a single ffmpeg process
+    progress('converting', 0.1)
+    try:
+        audio = decode_audio(audio_source)
+        conversion_successful = True
+    except AudioDecodeError as e:
+        logger.warning(f"Unable to decode audio: {e}")
+        audio = None
         conversion_successful = False
-        wav_path = os.path.join(UPLOAD_FOLDER, 'temp_audio.wav')
-        
-        # Try to find a working ffmpeg
-        found_ffmpeg_path = None
-        for loc in ffmpeg_locations:
-            if os.path.exists(loc):
-                found_ffmpeg_path = loc
-                logger.info(f"Will try ffmpeg at: {found_ffmpeg_path}")
-                break
-        
-        # Try direct ffmpeg conversion if we found a path
-        if found_ffmpeg_path:
-            try:
-                # Use subprocess to call ffmpeg directly with absolute path
-                cmd = [found_ffmpeg_path, '-i', temp_audio_path, wav_path]
-                logger.info(f"Running ffmpeg command: {' '.join(cmd)}")
-                result = subprocess.run(cmd, check=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-                logger.info(f"ffmpeg stdout: {result.stdout}")
-                logger.info(f"ffmpeg stderr: {result.stderr}")
-                if os.path.exists(wav_path):
-                    conversion_successful = True
-                    logger.info("Successfully converted audio to WAV using direct ffmpeg call")
-                else:
-                    logger.warning("ffmpeg ran but did not produce the expected output file")
-            except Exception as e:
-                logger.warning(f"Error using direct ffmpeg call: {e}")
-                # Continue with pydub attempt
-        
-        # If direct ffmpeg call didn't work, try using pydub
-        if not conversion_successful:
-            try:
-                # Try to set ffmpeg path for pydub if we found it
-                import pydub.utils
-                if found_ffmpeg_path:
-                    # Set the ffmpeg path for pydub
-                    pydub.utils.set_ffmpeg(found_ffmpeg_path)
-                    logger.info(f"Set pydub ffmpeg path to: {found_ffmpeg_path}")
-                    
-                # Try the conversion with pydub
-                audio = AudioSegment.from_file(temp_audio_path)
-                audio.export(wav_path, format="wav")
-                conversion_successful = True
-                logger.info("Successfully converted audio to WAV format using pydub")
-            except Exception as e:
-                logger.warning(f"Error converting audio to WAV using pydub: {e}")
-                logger.info("Will try direct speech recognition instead")
-                # Continue without conversion - we'll try to use the raw file directly
-        
-        # Perform speech recognition
-        recognizer = sr.Recognizer()
-        try:
-            if conversion_successful:
-                # Use the converted WAV file
-                with sr.AudioFile(wav_path) as source:
-                    audio_data = recognizer.record(source)
-                    text = recognizer.recognize_google(audio_data)
-            else:
-                # Get the platform-specific install instructions
-                platform_instructions = ""
-                if platform.system() == "Darwin":  # macOS
-                    platform_instructions = "Run 'brew install ffmpeg' in Terminal to install."
-                elif platform.system() == "Linux":
-                    platform_instructions = "Run 'sudo apt-get install ffmpeg' on Ubuntu/Debian or 'sudo yum install ffmpeg' on CentOS/RHEL."
-                elif platform.system() == "Windows":
-                    platform_instructions = "Download and install from https://ffmpeg.org/download.html#build-windows or use a package manager like Chocolatey ('choco install ffmpeg')."
-                
-                # Since direct recognition from binary data isn't straightforward with the library,
-                # we'll provide a helpful error message
-                text = f"Audio conversion is required to process voice notes. Please install ffmpeg on your system or make sure it's available in the PATH. {platform_instructions}"
-                logger.warning("Unable to process audio without ffmpeg")
-            
-            logger.info(f"Transcribed text length: {len(text)} characters")
+    
+    # Perform speech recognition
+    try:
+        platform_instructions = ""
+        segments = []
+        if conversion_successful:
+            # Long recordings are split at pauses and the segments transcribed concurrently
+            progress('transcribing', 0.3)
+            text, segments = transcribe_audio(
+                audio, speech_recognizer,
+                lambda done, total: progress('transcribing', 0.3 + 0.4 * done / total)
+            )
+            if not text:
+                raise SpeechNotUnderstood()
+        else:
+            platform_instructions = FFMPEG_INSTALL_HINT
             
-            # Clean up temporary files
-            if os.path.exists(temp_audio_path):
-                os.remove(temp_audio_path)
-            if os.path.exists(wav_path) and conversion_successful:
-                os.remove(wav_path)
+            # Since direct recognition from binary data isn't straightforward with the library,
+            # we'll provide a helpful error message
+            text = f"Audio conversion is required to process voice notes. Please install ffmpeg on your system or make sure it's available in the PATH. {platform_instructions}"
+            logger.warning("Unable to process audio without ffmpeg")
+        
+        logger.info(f"Transcribed text length: {len(text)} characters")
+        
+        # If preview_only is True, return just the transcription without OpenAI analysis
+        if preview_only:
+            logger.info("Returning transcription preview only")
+            return {
+                'source': 'voice_note_preview',
+                'full_text': text,
+                'transcript_size': len(text),
+                'transcript_segments': segments,
+                'conversion_successful': conversion_successful,
+                'ffmpeg_missing': not conversion_successful,
+                'ffmpeg_message': f"For full voice note functionality, please install ffmpeg on your system and ensure it's in the PATH. {platform_instructions if not conversion_successful else ''}"
+            }
+        
+        # Process the transcribed text with existing analysis functions
+        progress('analyzing', 0.7)
+        if openai_api_key:
+            # First run analysis to get the summary, key points, etc. using the voice-specific function
+            result = process_voice_transcription_with_openai(text)
             
-            # If preview_only is True, return just the transcription without OpenAI analysis
-            if preview_only:
-                logger.info("Returning transcription preview only")
-                return jsonify({
-                    'source': 'voice_note_preview',
-                    'full_text': text,
-                    'transcript_size': len(text),
-                    'conversion_successful': conversion_successful,
-                    'ffmpeg_missing': not conversion_successful,
-                    'ffmpeg_message': f"For full voice note functionality, please install ffmpeg on your system and ensure it's in the PATH. {platform_instructions if not conversion_successful else ''}"
-                })
+            # Include the transcribed text
+            result['source'] = 'voice_note'
+            result['full_text'] = text
+            result['transcript_size'] = len(text)
+            result['transcript_segments'] = segments
+            # Add a preview of the text
+            result['text_preview'] = text[:500] + ('...' if len(text) > 500 else '')
             
-            # Process the transcribed text with existing analysis functions
-            if openai_api_key:
-                # First run analysis to get the summary, key points, etc. using the voice-specific function
-                result = process_voice_transcription_with_openai(text)
-                
-                # Include the transcribed text
-                result['source'] = 'voice_note'
-                result['full_text'] = text
-                result['transcript_size'] = len(text)
-                # Add a preview of the text
-                result['text_preview'] = text[:500] + ('...' if len(text) > 500 else '')
-                
-                # Add information about ffmpeg status
-                result['conversion_successful'] = conversion_successful
-                if not conversion_successful:
-                    result['ffmpeg_missing'] = True
-                    result['ffmpeg_message'] = f"For full voice note functionality, please install ffmpeg on your system and ensure it's in the PATH. {platform_instructions}"
-            else:
-                result = analyze_text_local(text)
-                result['source'] = 'voice_note'
-                result['full_text'] = text
-                result['transcript_size'] = len(text)
-                result['text_preview'] = text[:500] + ('...' if len(text) > 500 else '')
-                result['conversion_successful'] = conversion_successful
-                if not conversion_successful:
-                    result['ffmpeg_missing'] = True
-                    result['ffmpeg_message'] = f"For full voice note functionality, please install ffmpeg on your system and ensure it's in the PATH. {platform_instructions}"
+            # Add information about ffmpeg status
+            result['conversion_successful'] = conversion_successful
+            if not conversion_successful:
+                result['ffmpeg_missing'] = True
+                result['ffmpeg_message'] = f"For full voice note functionality, please install ffmpeg on your system and ensure it's in the PATH. {platform_instructions}"
+        else:
+            result = analyze_text_local(text)
+            result['source'] = 'voice_note'
+            result['full_text'] = text
+            result['transcript_size'] = len(text)
+            result['transcript_segments'] = segments
+            result['text_preview'] = text[:500] + ('...' if len(text) > 500 else '')
+            result['conversion_successful'] = conversion_successful
+            if not conversion_successful:
+                result['ffmpeg_missing'] = True
+                result['ffmpeg_message'] = f"For full voice note functionality, please install ffmpeg on your system and ensure it's in the PATH. {platform_instructions}"
+        
+        return publish_document(result, text, source='voice_note')
             
-            return jsonify(result)
-                
-        except sr.UnknownValueError:
-            logger.error("Speech recognition could not understand audio")
-            return jsonify({
-                'error': 'Could not understand the audio. Please speak clearly.',
-                'ffmpeg_status': 'missing' if not conversion_successful else 'available',
-                'conversion_successful': conversion_successful
-            }), 400
-        except sr.RequestError as e:
-            logger.error(f"Could not request results from Speech Recognition service: {e}")
-            return jsonify({
-                'error': 'Speech recognition service unavailable. Please try again later.',
-                'ffmpeg_status': 'missing' if not conversion_successful else 'available',
-                'conversion_successful': conversion_successful
-            }), 500
-        except Exception as e:
-            logger.error(f"Error in speech recognition: {e}")
-            return jsonify({
-                'error': f'Failed to process speech: {str(e)}',
-                'ffmpeg_status': 'missing' if not conversion_successful else 'available',
-                'conversion_successful': conversion_successful
-            }), 500
+    except SpeechNotUnderstood:
+        logger.error("Speech recognition could not understand audio")
+        raise ProcessingError('Could not understand the audio. Please speak clearly.', 400, {
+            'ffmpeg_status': 'missing' if not conversion_successful else 'available',
+            'conversion_successful': conversion_successful
+        })
+    except SpeechServiceError as e:
+        logger.error(f"Could not request results from Speech Recognition service: {e}")
+        raise ProcessingError('Speech recognition service unavailable. Please try again later.', 500, {
+            'ffmpeg_status': 'missing' if not conversion_successful else 'available',
+            'conversion_successful': conversion_successful
+        })
+    except Exception as e:
+        logger.error(f"Error in speech recognition: {e}")
+        raise ProcessingError(f'Failed to process speech: {str(e)}', 500, {
+            'ffmpeg_status': 'missing' if not conversion_successful else 'available',
+            'conversion_successful': conversion_successful
+        })
+
+@api.route('/api/jobs/upload-pdf', methods=['POST'])
+def submit_pdf_job():
+    """Queue a PDF upload for background processing"""
+    logger.info("jobs/upload-pdf endpoint called")
+    file, error = _get_uploaded_pdf()
+    if error:
+        return error
+    
+    # The job takes ownership of the spooled upload so it outlives the request
+    digest = file.stream.sha256()
+    source = file.stream.detach()
+    include_full_text = _wants_full_text()
+    
+    def work(progress):
+        try:
+            return _finish_result(run_pdf_pipeline(source, progress, digest), include_full_text)
+        finally:
+            remove_source(source)
     
+    return _submit_job('pdf', work, on_reject=lambda: remove_source(source))
+
+@api.route('/api/jobs/process-youtube', methods=['POST'])
+def submit_youtube_job():
+    """Queue a YouTube video for background processing"""
+    data = request.get_json(silent=True) or {}
+    video_url = data.get('video_url')
+    
+    if not video_url:
+        return jsonify({'error': 'No YouTube URL provided'}), 400
+    
+    video_id = extract_video_id(video_url)
+    if not video_id:
+        return jsonify({'error': 'Invalid YouTube URL format'}), 400
+    
+    include_full_text = _wants_full_text(data)
+    return _submit_job('youtube', lambda progress: _finish_result(run_youtube_pipeline(video_id, progress), include_full_text))
+
+@api.route('/api/jobs/process-voice', methods=['POST'])
+def submit_voice_job():
+    """Queue a voice recording for background processing"""
+    upload, error = _read_voice_upload(detach=True)
+    if error:
+        return error
+    
+    # The job owns any spooled file from here on
+    source = upload['source']
+    
+    def work(progress):
+        try:
+            return _finish_result(run_voice_pipeline(source, upload['preview_only'], progress),
+                                  upload['include_full_text'])
+        finally:
+            remove_source(source)
+    
+    return _submit_job('voice', work, on_reject=lambda: remove_source(source))
+
+def _submit_job(kind, func, on_reject=None):
+    """Submit a job and build the 202 response, or a 429 when the queue is full"""
+    try:
+        job = job_manager.submit(kind, func)
+    except QueueFullError as e:
+        logger.warning(f"Rejecting {kind} job: {e}")
+        if on_reject:
+            on_reject()
+        return jsonify({'error': 'Too many jobs in progress. Please try again shortly.'}), 429, {'Retry-After': '5'}
+    
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('api.get_job', job_id=job.id),
+        'events_url': url_for('api.stream_job_events', job_id=job.id)
+    }), 202
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Return the status, progress and (when finished) the result of a job"""
+    snapshot = job_manager.snapshot(job_id)
+    if not snapshot:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(snapshot)
+
+@api.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """Stream job progress as server-sent events until the job finishes"""
+    job = job_manager.get(job_id)
+    if not job:
+        if job_manager.snapshot(job_id) is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return _sse_response(_poll_job_events(job_id))
+    
+    def events():
+        version = None
+        while True:
+            current = job.wait_for_change(version, timeout=15)
+            if current == version and not job.finished:
+                # Keep idle connections open through proxies
+                yield ": keep-alive\n\n"
+                continue
+            version = current
+            if job.finished:
+                yield format_sse(job.to_dict(), 'result' if job.status == SUCCEEDED else 'error')
+                return
+            yield format_sse(job.to_dict(), 'progress')
+    
+    return _sse_response(events())
+
+def _poll_job_events(job_id):
+    """Follow a job run by another worker process through the shared job store"""
+    last = None
+    idle = 0.0
+    while True:
+        snapshot = job_manager.snapshot(job_id)
+        if snapshot is None:
+            yield format_sse({'error': 'Job not found'}, 'error')
+            return
+        if snapshot != last:
+            last = snapshot
+            idle = 0.0
+            if snapshot['status'] in FINISHED_STATES:
+                yield format_sse(snapshot, 'result' if snapshot['status'] == SUCCEEDED else 'error')
+                return
+            yield format_sse(snapshot, 'progress')
+        elif idle >= 15:
+            yield ": keep-alive\n\n"
+            idle = 0.0
+        time.sleep(JOB_POLL_INTERVAL)
+        idle += JOB_POLL_INTERVAL
+
+# Streaming variants of the analysis, quiz and flashcard endpoints. Items are
+# sent as server-sent events as soon as the model finishes writing them, and a
+# final "done" event carries the same result the JSON endpoint would return.
+
+# Result field -> event name used for each streamed item
+STREAM_EVENTS = {
+    'summary': 'summary',
+    'key_points': 'key_point',
+    'key_concepts': 'key_concept',
+    'questions': 'question',
+    'flashcards': 'flashcard'
+}
+
+def _result_events(result):
+    """Replay a finished result as the events a live stream would have sent"""
+    for key, event in STREAM_EVENTS.items():
+        value = result.get(key)
+        if isinstance(value, list):
+            for item in value:
+                yield format_sse(item, event)
+        elif value is not None:
+            yield format_sse(value, event)
+    yield format_sse(result, 'done')
+
+def _stream_llm_json(call, fallback, finish=None):
+    """Stream a JSON-mode completion, given as llm.chat_json() keyword arguments, as events
+    
+    If the model fails before any item was sent, the fallback result is
+    replayed instead so the client sees the same events either way.
+    """
+    task = call["task"]
+    parser = IncrementalJSONParser()
+    sent = False
+    try:
+        for delta in llm.stream(json_response=True, **call):
+            for key, value, _ in parser.feed(delta):
+                if key in STREAM_EVENTS:
+                    sent = True
+                    yield format_sse(value, STREAM_EVENTS[key])
+        result = parser.result()
     except Exception as e:
-        logger.error(f"Error in process_voice: {e}")
-        return jsonify({'error': f'Server error: {str(e)}'}), 500
+        logger.error(f"Streaming {task} failed: {e}")
+        if sent:
+            yield format_sse({'error': f'{task.capitalize()} generation failed part-way through'}, 'error')
+            return
+        yield from _result_events(fallback())
+        return
+    
+    if finish:
+        result = finish(result)
+    yield format_sse(result, 'done')
+
+def stream_analysis_events(text, include_full_text=True):
+    """Analysis events for a text, streamed live when it fits in one model call"""
+    def finish(result):
+        return _finish_result(publish_document(result, text, source='text'), include_full_text)
+    
+    if not openai_api_key:
+        yield from _result_events(finish(analyze_text_local_cached(text)))
+        return
+    
+    cache_key = analysis_cache_key(text)
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Returning cached OpenAI analysis")
+        yield from _result_events(finish(cached))
+        return
+    
+    # Map-reduce results only exist once every chunk is merged, so long texts are sent whole
+    if len(analysis_chunks(text)) > 1:
+        yield from _result_events(finish(analyze_text(text)))
+        return
+    
+    def finish_live(result):
+        result = finish_chunk_analysis(result, text)
+        analysis_cache.set(cache_key, result)
+        return finish(result)
+    
+    yield from _stream_llm_json(analysis_chunk_call(text), lambda: finish(analyze_text_local_cached(text)),
+                                finish_live)
+
+def stream_quiz_events(text, quiz_type="all", num_questions=5):
+    """Quiz events, one per question as the model writes them"""
+    if not openai_api_key:
+        yield from _result_events(create_quiz_local(text, quiz_type, num_questions))
+        return
+    yield from _stream_llm_json(quiz_call(text, quiz_type, num_questions),
+                                lambda: create_quiz_local(text, quiz_type, num_questions))
+
+def stream_flashcard_events(text, num_cards=10):
+    """Flashcard events, one per card as the model writes them"""
+    if not openai_api_key:
+        yield from _result_events(create_flashcards_local(text, num_cards))
+        return
+    yield from _stream_llm_json(flashcards_call(text, num_cards), lambda: create_flashcards_local(text, num_cards))
+
+@api.route('/api/process-text/stream', methods=['POST'])
+def process_text_stream():
+    """Stream the analysis of plain text as server-sent events"""
+    data = request.get_json()
+    if not data or 'text' not in data:
+        return jsonify({"error": "No text provided"}), 400
+    logger.info(f"Streaming analysis for text of length: {len(data['text'])}")
+    return _sse_response(stream_analysis_events(data['text'], _wants_full_text(data)))
+
+@api.route('/api/generate-quiz/stream', methods=['POST'])
+def generate_quiz_stream():
+    """Stream quiz questions as server-sent events"""
+    data = request.get_json()
+    text, source, error = _load_request_text(data)
+    if error:
+        return error
+    
+    def events():
+        refined_text = _refine_for_source(text, source)
+        yield from stream_quiz_events(refined_text, data.get('quiz_type', 'all'), data.get('num_questions', 5))
+    
+    return _sse_response(events())
+
+@api.route('/api/generate-flashcards/stream', methods=['POST'])
+def generate_flashcards_stream():
+    """Stream flashcards as server-sent events"""
+    data = request.get_json()
+    text, source, error = _load_request_text(data)
+    if error:
+        return error
+    
+    def events():
+        refined_text = _refine_for_source(text, source)
+        yield from stream_flashcard_events(refined_text, data.get('num_cards', 10))
+    
+    return _sse_response(events())
+
+# Settings the shared services are built from at import; create_app(config) cannot change them
+PROCESS_SETTINGS = (
+    'UPLOAD_FOLDER', 'ANALYSIS_CACHE_DB', 'PDF_CACHE_DIR', 'DOCUMENT_STORE_BACKEND', 'DOCUMENT_STORE_PATH',
+    'TRANSCRIPT_PROVIDER', 'TRANSCRIPT_CACHE_DB', 'JOB_STORE_BACKEND', 'JOB_STORE_PATH', 'SPEECH_RECOGNIZER'
+)
+
+
+def default_config():
+    """Flask settings read from the environment"""
+    return {
+        'UPLOAD_FOLDER': UPLOAD_FOLDER,
+        # Uploads are rejected as soon as they stream past this size; smaller ones stay in memory entirely
+        'MAX_CONTENT_LENGTH': int(os.getenv("MAX_UPLOAD_MB", 50)) * 1024 * 1024,
+        'UPLOAD_SPOOL_MEMORY_LIMIT': int(os.getenv("UPLOAD_SPOOL_MEMORY_MB", 5)) * 1024 * 1024
+    }
+
+def create_app(config=None):
+    """Build the Flask app from the environment settings, overridden by config, with every route mounted
+
+    The services behind the routes (LLM gateway, caches, document store, job
+    manager) are created once per process when this module is imported and are
+    shared by every app built here. Anything that holds threads, connections or
+    child processes starts on first use, so each worker forked from a preloaded
+    server gets its own. Their settings come from the environment only, so a
+    config naming one of PROCESS_SETTINGS raises ValueError instead of being
+    silently ignored.
+    """
+    fixed = sorted(set(config or {}) & set(PROCESS_SETTINGS))
+    if fixed:
+        raise ValueError(f"Cannot set {', '.join(fixed)} per app; "
+                         f"the services are built from the environment when app is imported")
+    app = Flask(__name__)
+    # Stream uploads into per-request spools instead of werkzeug's default temp files
+    app.request_class = SpoolingRequest
+    app.json = TimedJSONProvider(app)
+    app.config.update(default_config())
+    app.config.update(config or {})
+    CORS(app)
+    app.register_blueprint(api)
+    # Resolve ffmpeg now, once logging is configured, rather than on the first voice note
+    ffmpeg_path()
+    logger.info("Flask app created with CORS enabled")
+    return app
 
 if __name__ == '__main__':
-    logger.info("Starting Flask server on port 8000...")
-    app.run(debug=True, host='0.0.0.0', port=8000) 
\ No newline at end of file
+    # Development server only; production runs wsgi:app under gunicorn (see gunicorn.conf.py)
+    port = int(os.getenv("PORT", 8000))
+    logger.info(f"Starting Flask development server on port {port}...")
+    create_app().run(debug=_is_truthy(os.getenv("FLASK_DEBUG", "false")), host=os.getenv("HOST", '0.0.0.0'),
+                     port=port, threaded=True)
@@ -0,0 +1,8 @@
+"""ASGI entry point: the async LLM endpoints, with the Flask app serving everything else.
+
+    uvicorn --workers 4 --host 0.0.0.0 --port 8000 asgi:app
+"""
+from app import create_app
+from async_api import create_asgi_app
+
+app = create_asgi_app(create_app())
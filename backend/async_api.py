@@ -0,0 +1,306 @@
+"""Async variants of the LLM-bound endpoints, served from an ASGI app.
+
+Under an ASGI server (`uvicorn asgi:app`) text analysis, quiz, flashcard and
+YouTube requests run as coroutines on the async OpenAI client, so a request
+waiting on the model holds no thread and a few workers can keep thousands of
+model calls in flight. Local fallbacks, transcript downloads and other blocking
+work go to a thread; every other path is handed to the Flask app.
+"""
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import parse_qsl
+
+import app as backend
+import metrics
+from chunking import gather_concurrently
+from transcripts import TranscriptUnavailable
+
+logger = logging.getLogger(__name__)
+
+llm = backend.llm
+
+
+async def analyze_text(text):
+    """backend.analyze_text() with concurrent, non-blocking model calls"""
+    if backend.openai_api_key:
+        cache_key = backend.analysis_cache_key(text)
+        cached = await asyncio.to_thread(backend.analysis_cache.get, cache_key)
+        if cached is not None:
+            logger.info("Returning cached OpenAI analysis")
+            return cached
+
+        async def run():
+            result = await _analyze_text_with_openai(text)
+            await asyncio.to_thread(backend.analysis_cache.set, cache_key, result)
+            return result
+
+        try:
+            return await backend.analysis_flight.do_async(cache_key, run)
+        except Exception as e:
+            logger.error(f"OpenAI analysis failed: {e}")
+            logger.info("Falling back to local processing")
+
+    return await asyncio.to_thread(backend.analyze_text_local_cached, text)
+
+
+# Chunking and budgeting tokenize the whole text, so they run in a thread rather than stall the event loop
+
+async def _analyze_chunk_with_openai(text):
+    call = await asyncio.to_thread(backend.analysis_chunk_call, text)
+    return backend.finish_chunk_analysis(await llm.achat_json(**call), text)
+
+
+async def _analyze_text_with_openai(text):
+    """backend._analyze_text_with_openai() with the chunks gathered on the event loop"""
+    chunks = await asyncio.to_thread(backend.analysis_chunks, text)
+    if len(chunks) == 1:
+        return await _analyze_chunk_with_openai(text)
+
+    logger.info(f"Analyzing {len(chunks)} chunks concurrently")
+    partials = await gather_concurrently([_analyze_chunk_with_openai(chunk) for chunk in chunks],
+                                         backend.ANALYSIS_MAX_PARALLEL_CHUNKS)
+    try:
+        result = await _reduce_analyses_with_openai(partials)
+    except Exception as e:
+        logger.warning(f"OpenAI reduce pass failed, merging chunk results locally: {e}")
+        result = backend.merge_chunk_analyses(partials)
+    return backend.finish_chunked_analysis(result, text, partials)
+
+
+async def _reduce_batch_with_openai(partials):
+    call = await asyncio.to_thread(backend.reduce_batch_call, partials)
+    return await llm.achat_json(**call)
+
+
+async def _reduce_analyses_with_openai(partials):
+    """backend._reduce_analyses_with_openai() with each round's batches reduced concurrently"""
+    batches = await asyncio.to_thread(backend.plan_reduce_batches, partials)
+    while len(batches) > 1:
+        logger.info(f"Reducing {len(partials)} chunk analyses in {len(batches)} batches")
+        partials = await gather_concurrently([_reduce_batch_with_openai(batch) for batch in batches],
+                                             backend.ANALYSIS_MAX_PARALLEL_CHUNKS)
+        batches = await asyncio.to_thread(backend.plan_reduce_batches, partials)
+    return await _reduce_batch_with_openai(partials)
+
+
+async def create_quiz(text, quiz_type="all", num_questions=5):
+    if backend.openai_api_key:
+        try:
+            call = await asyncio.to_thread(backend.quiz_call, text, quiz_type, num_questions)
+            return await llm.achat_json(**call)
+        except Exception as e:
+            logger.error(f"Error using OpenAI API for quiz generation: {e}")
+    return await asyncio.to_thread(backend.create_quiz_local, text, quiz_type, num_questions)
+
+
+async def create_flashcards(text, num_cards=10):
+    if backend.openai_api_key:
+        try:
+            call = await asyncio.to_thread(backend.flashcards_call, text, num_cards)
+            return await llm.achat_json(**call)
+        except Exception as e:
+            logger.error(f"Error using OpenAI API for flashcard generation: {e}")
+    return await asyncio.to_thread(backend.create_flashcards_local, text, num_cards)
+
+
+async def refine_transcript(text):
+    """backend.refine_youtube_transcript_with_openai() with the chunks refined concurrently on the event loop"""
+    cache_key = backend.refinement_cache_key(text)
+    cached = await asyncio.to_thread(backend.analysis_cache.get, cache_key)
+    if cached is not None:
+        logger.info("Returning cached transcript refinement")
+        return cached
+
+    async def refine_chunk(chunk):
+        call = await asyncio.to_thread(backend.transcript_chunk_call, chunk)
+        return await llm.achat_text(**call)
+
+    async def run():
+        chunks = await asyncio.to_thread(backend.analysis_chunks, text)
+        refined_chunks = await gather_concurrently([refine_chunk(chunk) for chunk in chunks],
+                                                   backend.ANALYSIS_MAX_PARALLEL_CHUNKS)
+        refined_text = backend.join_refined_chunks(refined_chunks)
+        await asyncio.to_thread(backend.analysis_cache.set, cache_key, refined_text)
+        return refined_text
+
+    try:
+        return await backend.refinement_flight.do_async(cache_key, run)
+    except Exception as e:
+        logger.error(f"Error using OpenAI API for transcript refinement: {e}")
+        return None
+
+
+async def _refine_for_source(text, source):
+    if source == 'youtube' and backend.openai_api_key:
+        refined_text = await refine_transcript(text)
+        if refined_text:
+            return refined_text
+    return text
+
+
+async def _refined_video_transcript(video_id, processed_text):
+    return await backend.transcript_cache.get_refined_async(
+        video_id, lambda: refine_transcript(processed_text), backend._transcript_version())
+
+
+async def run_youtube_pipeline(video_id):
+    """Fetch a video's transcript, then analyze and refine it concurrently"""
+    try:
+        # The transcript download is blocking I/O; it runs once per video and is cached
+        _, processed_text = await asyncio.to_thread(
+            backend.transcript_cache.get_transcript, video_id, backend.process_transcript_text)
+        logger.info(f"YouTube transcript size: {len(processed_text)} characters")
+
+        if backend.openai_api_key:
+            # Both only need the transcript, so neither waits for the other
+            result, refined_text = await asyncio.gather(
+                analyze_text(processed_text), _refined_video_transcript(video_id, processed_text))
+        else:
+            result, refined_text = await analyze_text(processed_text), None
+
+        return await asyncio.to_thread(backend.finish_youtube_result, result, video_id, processed_text, refined_text)
+
+    except TranscriptUnavailable as e:
+        raise backend.ProcessingError(str(e), 400)
+    except Exception as e:
+        logger.error(f"Error processing YouTube transcript: {e}")
+        raise backend.ProcessingError(f'Failed to process YouTube transcript: {str(e)}', 500)
+
+
+# Handlers take the parsed JSON body and query parameters and return (payload, status)
+
+async def process_text(data, args):
+    if not data or 'text' not in data:
+        return {"error": "No text provided"}, 400
+    text = data['text']
+    result = await analyze_text(text)
+    result = await asyncio.to_thread(backend.publish_document, result, text, source='text')
+    return backend._finish_result(result, backend._wants_full_text(data, args)), 200
+
+
+async def generate_quiz(data, args):
+    text, source, error = await asyncio.to_thread(backend.resolve_request_text, data)
+    if error:
+        return error
+    text = await _refine_for_source(text, source)
+    return await create_quiz(text, data.get('quiz_type', 'all'), data.get('num_questions', 5)), 200
+
+
+async def generate_flashcards(data, args):
+    text, source, error = await asyncio.to_thread(backend.resolve_request_text, data)
+    if error:
+        return error
+    text = await _refine_for_source(text, source)
+    return await create_flashcards(text, data.get('num_cards', 10)), 200
+
+
+async def process_youtube(data, args):
+    video_url = data.get('video_url') if data else None
+    if not video_url:
+        return {'error': 'No YouTube URL provided'}, 400
+    video_id = backend.extract_video_id(video_url)
+    if not video_id:
+        return {'error': 'Invalid YouTube URL format'}, 400
+    try:
+        result = await run_youtube_pipeline(video_id)
+    except backend.ProcessingError as e:
+        return e.payload, e.status_code
+    return backend._finish_result(result, backend._wants_full_text(data, args)), 200
+
+
+# POST paths served here; everything else goes to the Flask app
+ROUTES = {
+    '/api/process-text': process_text,
+    '/api/generate-quiz': generate_quiz,
+    '/api/generate-flashcards': generate_flashcards,
+    '/api/process-youtube': process_youtube
+}
+
+
+async def _read_body(receive, max_size):
+    """Read the request body, or return None once it grows past max_size"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if max_size and size > max_size:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def _send_json(send, body, status, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            # Matches the Flask app's CORS(app) defaults
+            (b'access-control-allow-origin', b'*'),
+            *headers
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def create_asgi_app(flask_app):
+    """Serve ROUTES as coroutines and hand every other request to flask_app"""
+    from asgiref.wsgi import WsgiToAsgi
+
+    wsgi_app = WsgiToAsgi(flask_app)
+    max_size = flask_app.config.get('MAX_CONTENT_LENGTH')
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await _lifespan(receive, send)
+        handler = ROUTES.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'POST' else None
+        if handler is None:
+            return await wsgi_app(scope, receive, send)
+
+        started = time.perf_counter()
+        timing_token = metrics.start_request()
+        payload, status = await _handle(handler, scope, receive)
+        with metrics.span("json_serialization"):
+            body = json.dumps(payload).encode('utf-8')
+        elapsed = time.perf_counter() - started
+        server_timing = metrics.server_timing_header(metrics.finish_request(timing_token), elapsed)
+        metrics.HTTP_REQUEST_SECONDS.observe(elapsed, method='POST', endpoint=scope['path'], status=status)
+        await _send_json(send, body, status, [(b'server-timing', server_timing.encode('latin-1'))])
+
+    async def _handle(handler, scope, receive):
+        body = await _read_body(receive, max_size)
+        if body is None:
+            limit_mb = max_size // (1024 * 1024)
+            return {"error": f"File too large. The maximum upload size is {limit_mb} MB."}, 413
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            return {"error": "Request body must be JSON"}, 400
+        args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+
+        try:
+            return await handler(data, args)
+        except Exception as e:
+            logger.error(f"Error in {scope['path']}: {e}")
+            return {'error': f'Server error: {str(e)}'}, 500
+
+    return application
@@ -0,0 +1,135 @@
+import functools
+import io
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Voice notes are decoded straight to the format the recognizers want
+SAMPLE_RATE = 16000
+# Seconds a single ffmpeg decode may take
+FFMPEG_TIMEOUT = int(os.getenv("FFMPEG_TIMEOUT", 120))
+
+# Checked after FFMPEG_PATH and the PATH lookup
+COMMON_FFMPEG_LOCATIONS = [
+    '/usr/local/bin/ffmpeg',
+    '/usr/bin/ffmpeg',
+    '/bin/ffmpeg',
+    '/opt/homebrew/bin/ffmpeg'  # Common for macOS with Homebrew
+]
+
+
+class AudioDecodeError(Exception):
+    """Raised when audio cannot be decoded"""
+
+
+def find_ffmpeg():
+    """Locate ffmpeg: FFMPEG_PATH, then PATH, then the usual install locations"""
+    candidates = [os.getenv("FFMPEG_PATH"), shutil.which("ffmpeg")] + COMMON_FFMPEG_LOCATIONS
+    for path in candidates:
+        if path and os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def install_hint():
+    """Platform-specific instructions for installing ffmpeg"""
+    system = platform.system()
+    if system == "Darwin":  # macOS
+        return "Run 'brew install ffmpeg' in Terminal to install."
+    if system == "Linux":
+        return "Run 'sudo apt-get install ffmpeg' on Ubuntu/Debian or 'sudo yum install ffmpeg' on CentOS/RHEL."
+    if system == "Windows":
+        return "Download and install from https://ffmpeg.org/download.html#build-windows or use a package manager like Chocolatey ('choco install ffmpeg')."
+    return ""
+
+
+FFMPEG_INSTALL_HINT = install_hint()
+
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_path():
+    """The ffmpeg binary, resolved and reported once per process on first use, or None"""
+    path = find_ffmpeg()
+    if path:
+        logger.info(f"Using ffmpeg at {path}")
+    else:
+        logger.warning(f"ffmpeg not found; only WAV voice notes can be decoded. {FFMPEG_INSTALL_HINT}")
+    return path
+
+
+def _audio_segment():
+    """pydub's AudioSegment, imported on first decode and pointed at the resolved ffmpeg"""
+    from pydub import AudioSegment
+    if ffmpeg_path():
+        AudioSegment.converter = ffmpeg_path()
+    return AudioSegment
+
+
+def _is_wav(data):
+    return data[:4] == b'RIFF' and data[8:12] == b'WAVE'
+
+
+def _needs_seekable_input(data):
+    """MP4/M4A recordings usually keep their index at the end, which ffmpeg cannot reach through a pipe"""
+    return data[4:8] == b'ftyp'
+
+
+def _run_ffmpeg(input_args, stdin_data=None):
+    """Run ffmpeg and return its output as raw 16 kHz mono 16-bit PCM"""
+    cmd = [ffmpeg_path(), '-hide_banner', '-loglevel', 'error', *input_args,
+           '-vn', '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(SAMPLE_RATE), 'pipe:1']
+    try:
+        result = subprocess.run(cmd, input=stdin_data, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                timeout=FFMPEG_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        raise AudioDecodeError(f"ffmpeg timed out after {FFMPEG_TIMEOUT}s")
+    if result.returncode != 0 or not result.stdout:
+        message = result.stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise AudioDecodeError(f"ffmpeg could not decode the audio: {message[-1] if message else 'no output'}")
+    return result.stdout
+
+
+@metrics.span("audio_decode")
+def decode_audio(source):
+    """Decode recorded audio, given as bytes or a file path, into a 16 kHz mono 16-bit AudioSegment
+
+    WAV is parsed in memory. Anything else costs one ffmpeg process: reading the
+    file directly, streaming bytes through stdin/stdout, or going through a
+    private temporary file for in-memory MP4/M4A, which cannot be decoded from a pipe.
+    """
+    AudioSegment = _audio_segment()
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            header = f.read(12)
+    else:
+        header = source[:12]
+
+    if _is_wav(header):
+        try:
+            audio = AudioSegment.from_file(source if isinstance(source, str) else io.BytesIO(source), format="wav")
+            return audio.set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
+        except Exception as e:
+            logger.warning(f"In-memory WAV decoding failed, trying ffmpeg: {e}")
+
+    if not ffmpeg_path():
+        raise AudioDecodeError("ffmpeg is not installed")
+
+    if isinstance(source, str):
+        pcm = _run_ffmpeg(['-i', source])
+    elif _needs_seekable_input(header):
+        # Unique per request and removed when the block exits, even on failure
+        with tempfile.NamedTemporaryFile(prefix="voice_", suffix=".m4a") as f:
+            f.write(source)
+            f.flush()
+            pcm = _run_ffmpeg(['-i', f.name])
+    else:
+        pcm = _run_ffmpeg(['-i', 'pipe:0'], source)
+
+    return AudioSegment(data=pcm, sample_width=2, frame_rate=SAMPLE_RATE, channels=1)
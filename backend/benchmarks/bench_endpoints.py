@@ -0,0 +1,432 @@
+"""Benchmark every API route end to end against a stubbed model and transcript provider.
+
+Each route is driven two ways: in-process through the Flask test client, one
+request at a time, and over real HTTP against a server in a child process
+with concurrent clients. Model calls go to the deterministic OpenAI stub
+(stubs/openai_stub.py, run in its own process). YouTube transcripts come from
+the local transcript provider. Voice notes are recognized by a scripted
+recognizer. Inputs are generated by fixtures.py and differ per request, so
+the caches are not what gets measured.
+
+For every route, mode and text size the report gives p50/p95/p99 latency,
+throughput, errors, model calls per request and peak RSS. Client mode also
+reports the peak memory allocated per request (tracemalloc). Results are written
+as JSON, by default to benchmarks/results/<commit>.json. --compare prints the
+change between two such files.
+
+Usage:
+    python benchmarks/bench_endpoints.py
+    python benchmarks/bench_endpoints.py --sizes 1KB 100KB 5MB --modes http --concurrency 16 --server asgi
+    python benchmarks/bench_endpoints.py --endpoints process-text upload-pdf --llm-latency 0.2
+    python benchmarks/bench_endpoints.py --compare results/abc1234.json results/def5678.json
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import fixtures
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+MODES = ("client", "http")
+
+# Route name -> (method, path, body kind); the kind decides how fixtures become a request
+ENDPOINTS = {
+    "status": ("GET", "/api/status", None),
+    "process-text": ("POST", "/api/process-text", "text"),
+    "process-text-stream": ("POST", "/api/process-text/stream", "text"),
+    "generate-quiz": ("POST", "/api/generate-quiz", "quiz"),
+    "generate-quiz-stream": ("POST", "/api/generate-quiz/stream", "quiz"),
+    "generate-flashcards": ("POST", "/api/generate-flashcards", "flashcards"),
+    "generate-flashcards-stream": ("POST", "/api/generate-flashcards/stream", "flashcards"),
+    "study-pack": ("POST", "/api/study-pack", "text"),
+    "process-youtube": ("POST", "/api/process-youtube", "youtube"),
+    "upload-pdf": ("POST", "/api/upload-pdf", "pdf"),
+    "process-voice": ("POST", "/api/process-voice", "voice")
+}
+# Body kinds whose input does not scale with --sizes; they run once per mode at the first size
+UNSIZED = (None, "voice")
+DEFAULT_SIZES = ("1KB", "10KB", "100KB", "1MB", "5MB")
+
+
+def build_request(endpoint, size, nonce, workdir, audio_seconds):
+    """Return (method, path, headers, body) for one request; bodies are built before timing starts"""
+    method, path, kind = ENDPOINTS[endpoint]
+    if kind is None:
+        return method, path, {}, b""
+    if kind == "voice":
+        return method, path, {"Content-Type": "audio/wav"}, fixtures.sample_wav(audio_seconds, nonce)
+
+    text = fixtures.sample_text(size, nonce)
+    if kind == "youtube":
+        video_id = fixtures.write_transcript(workdir, nonce, text)
+        body = {"video_url": f"https://www.youtube.com/watch?v={video_id}"}
+    elif kind == "pdf":
+        boundary = uuid.uuid4().hex
+        body = b"".join([
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"notes.pdf\"\r\n"
+            f"Content-Type: application/pdf\r\n\r\n".encode(),
+            fixtures.sample_pdf(text),
+            f"\r\n--{boundary}--\r\n".encode()
+        ])
+        return method, path, {"Content-Type": f"multipart/form-data; boundary={boundary}"}, body
+    elif kind == "quiz":
+        body = {"text": text, "quiz_type": "all", "num_questions": 5}
+    elif kind == "flashcards":
+        body = {"text": text, "num_cards": 10}
+    else:
+        body = {"text": text}
+    return method, path, {"Content-Type": "application/json"}, json.dumps(body).encode()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+class StubProcess:
+    """The OpenAI stub in a child process, so its work is not billed to the process being measured"""
+
+    def __init__(self, latency):
+        self.port = _free_port()
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(BACKEND_DIR, 'stubs', 'openai_stub.py'), '--port', str(self.port),
+             '--latency', str(latency)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        _wait_for_port(self.port)
+        self.base_url = f"http://127.0.0.1:{self.port}/v1"
+
+    def requests(self):
+        with urllib.request.urlopen(f"{self.base_url}/stats") as response:
+            return json.load(response)["requests"]
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def app_environment(stub_url, transcript_dir, local):
+    """Environment the backend runs under, in this process (client mode) or the server child (http mode)"""
+    return {
+        "OPENAI_API_KEY": "" if local else "stub",
+        "OPENAI_BASE_URL": stub_url,
+        "TRANSCRIPT_PROVIDER": "local",
+        "LOCAL_TRANSCRIPT_DIR": transcript_dir,
+        "SPEECH_RECOGNIZER": "fixtures:ScriptedRecognizer",
+        "MAX_UPLOAD_MB": "200",
+        # A fresh extraction cache per run, so PDFs from an earlier run are not served from disk
+        "PDF_CACHE_DIR": os.path.join(transcript_dir, "pdf_text"),
+        "PYTHONPATH": os.pathsep.join([BENCHMARK_DIR, BACKEND_DIR, os.getenv("PYTHONPATH", "")])
+    }
+
+
+def _status_kb(pid, field):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss(pid):
+    """Reset a process's peak RSS counter to its current RSS (Linux); False when unsupported"""
+    try:
+        with open(f'/proc/{pid}/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb(pid):
+    """Peak resident set size of a process in MiB, or None where /proc is unavailable"""
+    peak = _status_kb(pid, 'VmHWM')
+    if peak is None and pid == os.getpid():
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if peak is not None else None
+
+
+def summarize(latencies, wall_seconds, statuses):
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        "requests": len(latencies),
+        "p50_ms": percentile(50) * 1000,
+        "p95_ms": percentile(95) * 1000,
+        "p99_ms": percentile(99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "throughput_rps": len(latencies) / wall_seconds if wall_seconds else None,
+        "errors": sum(1 for status in statuses if status >= 400),
+        "statuses": sorted(set(statuses))
+    }
+
+
+class ClientRunner:
+    """Requests through the Flask test client in this process, one at a time"""
+
+    mode = "client"
+
+    def __init__(self, environment, allocations):
+        os.environ.update(environment)
+        sys.path[:0] = [BENCHMARK_DIR, BACKEND_DIR]
+        import app as backend
+        self.client = backend.create_app().test_client()
+        self.allocations = allocations
+
+    def _send(self, request):
+        method, path, headers, body = request
+        start = time.perf_counter()
+        response = self.client.open(path, method=method, headers=headers, data=body)
+        response.get_data()
+        return time.perf_counter() - start, response.status_code
+
+    def run(self, requests, traced):
+        reset_peak_rss(os.getpid())
+        start = time.perf_counter()
+        timings = [self._send(request) for request in requests]
+        wall = time.perf_counter() - start
+        result = summarize([t for t, _ in timings], wall, [s for _, s in timings])
+        result["peak_rss_mb"] = peak_rss_mb(os.getpid())
+
+        if self.allocations and traced:
+            # Traced separately: tracemalloc slows every allocation down, which would skew the latencies
+            peaks = []
+            tracemalloc.start()
+            try:
+                for request in traced:
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                    self._send(request)
+                    peaks.append(tracemalloc.get_traced_memory()[1] - before)
+            finally:
+                tracemalloc.stop()
+            result["alloc_peak_mb_per_request"] = statistics.median(peaks) / (1024 * 1024)
+        return result
+
+    def close(self):
+        pass
+
+
+class HTTPRunner:
+    """Requests over HTTP to a server in a child process, from a pool of concurrent clients"""
+
+    mode = "http"
+
+    def __init__(self, environment, concurrency, server):
+        self.concurrency = concurrency
+        self.port = _free_port()
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve', server, '--port', str(self.port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=dict(os.environ, **environment), cwd=BACKEND_DIR)
+        _wait_for_port(self.port)
+
+    def _send(self, request):
+        method, path, headers, body = request
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=600)
+        start = time.perf_counter()
+        connection.request(method, path, body=body or None, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        elapsed = time.perf_counter() - start
+        connection.close()
+        return elapsed, response.status
+
+    def run(self, requests, traced):
+        reset_peak_rss(self.process.pid)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            timings = list(executor.map(self._send, requests))
+        wall = time.perf_counter() - start
+        result = summarize([t for t, _ in timings], wall, [s for _, s in timings])
+        result["peak_rss_mb"] = peak_rss_mb(self.process.pid)
+        return result
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def serve(server, port):
+    """Child process: serve the app until terminated"""
+    sys.path[:0] = [BENCHMARK_DIR, BACKEND_DIR]
+    if server == "asgi":
+        import uvicorn
+        uvicorn.run("asgi:app", host='127.0.0.1', port=port, log_level="warning")
+        return
+    from werkzeug.serving import make_server
+    import app as backend
+    make_server('127.0.0.1', port, backend.create_app(), threaded=True).serve_forever()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(args, workdir):
+    sizes = [fixtures.parse_size(size) for size in args.sizes]
+    stub = StubProcess(args.llm_latency)
+    environment = app_environment(stub.base_url, workdir, args.local)
+    results = []
+    nonce = 0
+    try:
+        for mode in args.modes:
+            runner = (ClientRunner(environment, not args.no_allocations) if mode == "client"
+                      else HTTPRunner(environment, args.concurrency, args.server))
+            try:
+                for endpoint in args.endpoints:
+                    kind = ENDPOINTS[endpoint][2]
+                    for size in (sizes[:1] if kind in UNSIZED else sizes):
+                        # One untimed request loads the route's lazily imported dependencies
+                        runner.run([build_request(endpoint, size, nonce, workdir, args.audio_seconds)], [])
+                        requests = [build_request(endpoint, size, nonce + 1 + i, workdir, args.audio_seconds)
+                                    for i in range(args.requests)]
+                        traced = [build_request(endpoint, size, nonce + 1 + args.requests + i, workdir,
+                                                args.audio_seconds) for i in range(min(3, args.requests))]
+                        nonce += 1 + args.requests + len(traced)
+
+                        llm_before = stub.requests()
+                        result = runner.run(requests, traced if mode == "client" else [])
+                        calls = stub.requests() - llm_before
+                        result.update({
+                            "endpoint": endpoint,
+                            "mode": mode,
+                            "size": None if kind in UNSIZED else fixtures.format_size(size),
+                            "request_bytes": statistics.median(len(r[3]) for r in requests),
+                            "concurrency": args.concurrency if mode == "http" else 1,
+                            "llm_calls_per_request": calls / (len(requests) + len(traced if mode == "client" else []))
+                        })
+                        results.append(result)
+                        print_result(result)
+            finally:
+                runner.close()
+    finally:
+        stub.stop()
+    return results
+
+
+def print_header():
+    print(f"{'endpoint':<27} {'mode':<6} {'size':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} "
+          f"{'errors':>6} {'llm/req':>7} {'RSS MB':>8} {'alloc MB':>8}")
+
+
+def _optional(value, digits):
+    return f"{value:.{digits}f}" if value is not None else "-"
+
+
+def print_result(r):
+    print(f"{r['endpoint']:<27} {r['mode']:<6} {r['size'] or '-':>6} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+          f"{r['p99_ms']:>9.1f} {r['throughput_rps']:>8.1f} {r['errors']:>6} {r['llm_calls_per_request']:>7.1f} "
+          f"{_optional(r.get('peak_rss_mb'), 1):>8} {_optional(r.get('alloc_peak_mb_per_request'), 2):>8}", flush=True)
+
+
+def compare(base_path, head_path):
+    """Print the relative change of each shared result between two result files"""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(head_path) as f:
+        head = json.load(f)
+    print(f"{base.get('commit') or base_path} -> {head.get('commit') or head_path}")
+    base_results = {(r["endpoint"], r["mode"], r["size"]): r for r in base["results"]}
+    metrics = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "peak_rss_mb", "alloc_peak_mb_per_request")
+    print(f"{'endpoint':<27} {'mode':<6} {'size':>6} " + " ".join(f"{m:>15}" for m in metrics))
+    for r in head["results"]:
+        old = base_results.get((r["endpoint"], r["mode"], r["size"]))
+        if old is None:
+            continue
+        changes = []
+        for metric in metrics:
+            if old.get(metric) and r.get(metric) is not None:
+                changes.append(f"{(r[metric] - old[metric]) / old[metric] * 100:>+14.1f}%")
+            else:
+                changes.append(f"{'-':>15}")
+        print(f"{r['endpoint']:<27} {r['mode']:<6} {r['size'] or '-':>6} " + " ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--sizes', nargs='+', default=list(DEFAULT_SIZES), help='text sizes, e.g. 1KB 250KB 5MB')
+    parser.add_argument('--requests', type=int, default=10, help='timed requests per endpoint, mode and size')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients in http mode')
+    parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi',
+                        help='threaded werkzeug server or uvicorn with asgi:app in http mode')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='seconds the stub waits before answering')
+    parser.add_argument('--audio-seconds', type=float, default=30, help='length of the voice note fixture')
+    parser.add_argument('--local', action='store_true', help='run without an API key, measuring the local engines')
+    parser.add_argument('--no-allocations', action='store_true', help='skip the tracemalloc pass in client mode')
+    parser.add_argument('--json', help='results file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'), help='compare two results files and exit')
+    parser.add_argument('--serve', choices=('wsgi', 'asgi'), help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_endpoints_")
+    print_header()
+    try:
+        results = run_benchmarks(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    commit = _git_commit()
+    path = args.json or os.path.join(RESULTS_DIR, f"{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            "commit": commit,
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ('serve', 'port', 'compare', 'json')},
+            "results": results
+        }, f, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == '__main__':
+    main()
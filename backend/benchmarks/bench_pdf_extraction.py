@@ -0,0 +1,98 @@
+"""Benchmark PDF text extraction throughput (pages per second).
+
+Compares the original single-process pdfplumber loop with the page-parallel
+extractor in pdf_extraction.py. A multi-page test document is built by
+repeating the pages of a source PDF.
+
+Usage:
+    python benchmarks/bench_pdf_extraction.py --pages 300 --workers 1 2 4
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pdfplumber
+import PyPDF2
+
+import pdf_extraction
+
+DEFAULT_SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads', 'release.pdf')
+
+
+def legacy_extract_text_from_pdf(file_path):
+    """The extractor as it was before page-parallel extraction"""
+    text = ""
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages:
+            text += page.extract_text() or ""
+    return text
+
+
+def build_document(source, pages, path):
+    """Write a PDF with the given number of pages by cycling through the source pages"""
+    reader = PyPDF2.PdfReader(source)
+    writer = PyPDF2.PdfWriter()
+    for i in range(pages):
+        writer.add_page(reader.pages[i % len(reader.pages)])
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+
+def measure(func, repeat):
+    """Return the best wall-clock time of several runs along with the last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default=DEFAULT_SOURCE, help='PDF whose pages are repeated')
+    parser.add_argument('--pages', type=int, default=300, help='number of pages in the test document')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--repeat', type=int, default=3, help='runs per configuration (best is reported)')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        build_document(args.source, args.pages, path)
+        results = []
+
+        elapsed, text = measure(lambda: legacy_extract_text_from_pdf(path), args.repeat)
+        results.append({"extractor": "legacy", "workers": 1, "seconds": elapsed,
+                        "pages_per_second": args.pages / elapsed, "characters": len(text)})
+
+        for workers in args.workers:
+            # Warm the pool so process start-up is not billed to the first run
+            pdf_extraction.extract_text_from_pdf(path, max_workers=workers)
+            elapsed, text = measure(lambda: pdf_extraction.extract_text_from_pdf(path, max_workers=workers), args.repeat)
+            results.append({"extractor": "parallel", "workers": workers, "seconds": elapsed,
+                            "pages_per_second": args.pages / elapsed, "characters": len(text)})
+    finally:
+        os.remove(path)
+
+    baseline = results[0]["pages_per_second"]
+    print(f"{'extractor':<10} {'workers':>7} {'seconds':>9} {'pages/s':>9} {'speedup':>8} {'chars':>9}")
+    for r in results:
+        print(f"{r['extractor']:<10} {r['workers']:>7} {r['seconds']:>9.3f} {r['pages_per_second']:>9.1f} "
+              f"{r['pages_per_second'] / baseline:>7.2f}x {r['characters']:>9}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"pages": args.pages, "source": args.source, "results": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
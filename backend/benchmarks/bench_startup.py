@@ -0,0 +1,113 @@
+"""Benchmark cold startup: interpreter launch and app creation through the first request served.
+
+Each run starts the backend in a fresh child process, sends GET /api/test as soon
+as the server is listening and reports how long that took from process launch,
+along with the time spent importing app.py and building the app. With --analysis
+a local /api/process-text request follows, showing what the first request that
+loads the text processing stack costs once startup no longer pays for it.
+
+Usage:
+    python benchmarks/bench_startup.py --repeat 5
+    python benchmarks/bench_startup.py --analysis
+    python benchmarks/bench_startup.py --backend /path/to/other/checkout/backend
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_TEXT = " ".join(
+    f"Photosynthesis converts light energy into chemical energy in stage {i}. "
+    f"Chlorophyll molecules absorb photons and drive electron transport chains. "
+    f"The Calvin cycle then fixes carbon dioxide into sugars used for growth."
+    for i in range(40)
+)
+
+
+def serve(backend_dir, requests):
+    """Child process: import the app, serve a fixed number of requests and exit"""
+    start = time.perf_counter()
+    sys.path.insert(0, backend_dir)
+    from werkzeug.serving import make_server
+    import app as backend
+    # Checkouts from before the app factory build their app at import time
+    application = backend.create_app() if hasattr(backend, 'create_app') else backend.app
+    import_seconds = time.perf_counter() - start
+
+    server = make_server('127.0.0.1', 0, application, threaded=False)
+    print(json.dumps({"port": server.server_port, "import_seconds": import_seconds}), flush=True)
+    for _ in range(requests):
+        server.handle_request()
+
+
+def _request(port, method, path, body=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    start = time.perf_counter()
+    connection.request(method, path, body=body, headers={"Content-Type": "application/json"} if body else {})
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    return response.status, time.perf_counter() - start
+
+
+def run_once(backend_dir, analysis):
+    # No API key, so the analysis request exercises the local path without network calls
+    env = dict(os.environ, OPENAI_API_KEY="")
+    requests = 2 if analysis else 1
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(requests), '--backend', backend_dir],
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=env, cwd=backend_dir)
+    ready = json.loads(child.stdout.readline())
+    status, _ = _request(ready["port"], "GET", "/api/test")
+    first_request = time.perf_counter() - start
+    if status != 200:
+        raise RuntimeError(f"/api/test failed with {status}")
+
+    result = {"import_seconds": ready["import_seconds"], "first_request_seconds": first_request}
+    if analysis:
+        status, seconds = _request(ready["port"], "POST", "/api/process-text", json.dumps({"text": SAMPLE_TEXT}))
+        result["analysis_status"] = status
+        result["first_analysis_seconds"] = seconds
+    child.wait()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='cold starts to measure')
+    parser.add_argument('--analysis', action='store_true', help='also time the first local analysis request')
+    parser.add_argument('--backend', default=BACKEND_DIR, help='backend directory to start')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(os.path.abspath(args.backend), args.serve)
+        return
+
+    backend_dir = os.path.abspath(args.backend)
+    runs = [run_once(backend_dir, args.analysis) for _ in range(args.repeat)]
+
+    print(f"{args.repeat} cold starts of {backend_dir}")
+    print(f"{'metric':<24} {'median s':>9} {'best s':>8} {'worst s':>8}")
+    metrics = ["import_seconds", "first_request_seconds"] + (["first_analysis_seconds"] if args.analysis else [])
+    for metric in metrics:
+        values = [run[metric] for run in runs]
+        print(f"{metric:<24} {statistics.median(values):>9.3f} {min(values):>8.3f} {max(values):>8.3f}")
+    if args.analysis:
+        statuses = sorted({run["analysis_status"] for run in runs})
+        if statuses != [200]:
+            print(f"analysis returned {statuses}; is the NLTK data provisioned? (python nltk_resources.py)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"backend": backend_dir, "runs": runs}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
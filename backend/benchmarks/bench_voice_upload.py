@@ -0,0 +1,192 @@
+"""Benchmark voice note uploads: base64 JSON versus multipart and raw audio bodies.
+
+Starts the backend in a child process for each upload mode, posts the same
+recording to /api/process-voice (preview only, with a no-op recognizer so only
+upload handling and decoding are measured) and reports request latency and the
+server's peak RSS growth while serving.
+
+Usage:
+    python benchmarks/bench_voice_upload.py --minutes 10 --repeat 3
+    python benchmarks/bench_voice_upload.py --minutes 10 --format wav
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+MODES = ("base64", "multipart", "raw")
+
+
+class NullRecognizer:
+    """Recognizer that skips recognition so the benchmark measures upload and decoding only"""
+
+    name = "null"
+
+    def transcribe(self, audio):
+        return "speech"
+
+
+def build_recording(minutes, path, format="m4a"):
+    """Write a recording of 4 s tones separated by 1 s pauses, as AAC in M4A (like the mobile app) or 16 kHz WAV
+
+    WAV is written with pydub when ffmpeg is not installed.
+    """
+    ffmpeg = os.getenv("FFMPEG_PATH") or shutil.which("ffmpeg")
+    if ffmpeg:
+        codec = ['-c:a', 'aac', '-b:a', '64k'] if format == "m4a" else ['-c:a', 'pcm_s16le', '-ar', '16000', '-ac', '1']
+        path += f".{format}"
+        subprocess.run([
+            ffmpeg, '-y', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+            '-i', f"aevalsrc='0.4*sin(2*PI*(220+20*mod(floor(t/5),10))*t)*lt(mod(t,5),4)':s=44100:d={minutes * 60}",
+            *codec, path
+        ], check=True)
+        return path, 'audio/mp4' if format == "m4a" else 'audio/wav'
+
+    sys.path.insert(0, BACKEND_DIR)
+    from pydub import AudioSegment
+    from pydub.generators import Sine
+    burst = Sine(300).to_audio_segment(duration=4000).apply_gain(-8) + AudioSegment.silent(duration=1000)
+    recording = (burst * int(minutes * 12)).set_frame_rate(16000)
+    path += ".wav"
+    recording.export(path, format="wav")
+    return path, 'audio/wav'
+
+
+def build_request(mode, data, content_type):
+    """Return (path, headers, body) for an upload mode; bodies are built before timing starts"""
+    if mode == "base64":
+        body = json.dumps({"audio_data": base64.b64encode(data).decode('ascii'), "preview_only": True}).encode()
+        return "/api/process-voice", {"Content-Type": "application/json"}, body
+    if mode == "multipart":
+        boundary = uuid.uuid4().hex
+        body = b"".join([
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"preview_only\"\r\n\r\ntrue\r\n".encode(),
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"audio\"; filename=\"recording\"\r\n"
+            f"Content-Type: {content_type}\r\n\r\n".encode(),
+            data,
+            f"\r\n--{boundary}--\r\n".encode()
+        ])
+        return "/api/process-voice", {"Content-Type": f"multipart/form-data; boundary={boundary}"}, body
+    return "/api/process-voice?preview_only=true", {"Content-Type": content_type}, data
+
+
+def _status_kb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB"""
+    return _status_kb('VmHWM') or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter to the current RSS so import-time peaks are not counted
+
+    Returns the RSS the counter was reset to, or the current peak when resetting is unsupported.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return _status_kb('VmRSS')
+    except OSError:
+        return peak_rss_kb()
+
+
+def serve(requests):
+    """Child process: serve a fixed number of requests, then report peak RSS as JSON"""
+    sys.path.insert(0, BACKEND_DIR)
+    from werkzeug.serving import make_server
+    import app as backend
+
+    server = make_server('127.0.0.1', 0, backend.create_app(), threaded=False)
+    baseline = reset_peak_rss()
+    print(server.server_port, flush=True)
+    for _ in range(requests):
+        server.handle_request()
+    print(json.dumps({"baseline_kb": baseline, "peak_kb": peak_rss_kb()}), flush=True)
+
+
+def run_mode(mode, data, content_type, repeat):
+    env = dict(os.environ, SPEECH_RECOGNIZER="bench_voice_upload:NullRecognizer",
+               PYTHONPATH=os.pathsep.join([BENCHMARK_DIR, BACKEND_DIR, os.getenv("PYTHONPATH", "")]),
+               MAX_UPLOAD_MB=str(max(50, len(data) * 2 // (1024 * 1024) + 1)))
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(repeat)],
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=env, cwd=BACKEND_DIR)
+    port = int(child.stdout.readline())
+    path, headers, body = build_request(mode, data, content_type)
+
+    latencies = []
+    for _ in range(repeat):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+        start = time.perf_counter()
+        connection.request("POST", path, body=body, headers=headers)
+        response = connection.getresponse()
+        payload = response.read()
+        latencies.append(time.perf_counter() - start)
+        connection.close()
+        if response.status != 200:
+            raise RuntimeError(f"{mode} upload failed with {response.status}: {payload[:200]!r}")
+
+    memory = json.loads(child.stdout.readline())
+    child.wait()
+    peak_growth = memory["peak_kb"] - memory["baseline_kb"]
+    return {"mode": mode, "request_bytes": len(body), "median_seconds": statistics.median(latencies),
+            "best_seconds": min(latencies), "peak_rss_mb": memory["peak_kb"] / 1024,
+            "peak_rss_growth_mb": peak_growth / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=10, help='length of the test recording')
+    parser.add_argument('--format', choices=('m4a', 'wav'), default='m4a', help='recording format')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--repeat', type=int, default=3, help='requests per mode')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    directory = tempfile.mkdtemp()
+    try:
+        path, content_type = build_recording(args.minutes, os.path.join(directory, 'recording'), args.format)
+        with open(path, 'rb') as f:
+            data = f.read()
+        results = [run_mode(mode, data, content_type, args.repeat) for mode in args.modes]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"{args.minutes:g}-minute recording, {len(data) / 1e6:.1f} MB ({content_type})")
+    print(f"{'mode':<10} {'request MB':>10} {'median s':>9} {'best s':>8} {'peak RSS MB':>12} {'RSS growth MB':>14}")
+    for r in results:
+        print(f"{r['mode']:<10} {r['request_bytes'] / 1e6:>10.1f} {r['median_seconds']:>9.3f} {r['best_seconds']:>8.3f} "
+              f"{r['peak_rss_mb']:>12.1f} {r['peak_rss_growth_mb']:>14.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"minutes": args.minutes, "recording_bytes": len(data), "content_type": content_type,
+                       "results": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
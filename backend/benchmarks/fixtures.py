@@ -0,0 +1,162 @@
+"""Deterministic sample inputs for the benchmarks: study text, PDFs, WAV recordings and transcripts.
+
+Everything is generated from a seed rather than checked in, so a fixture of
+any size can be rebuilt byte for byte on another machine or commit. A nonce
+makes otherwise identical inputs distinct, which keeps the analysis and
+document caches from answering repeated benchmark requests.
+"""
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import struct
+import wave
+
+VOCABULARY = (
+    "photosynthesis chlorophyll molecule energy electron transport chain membrane protein enzyme "
+    "substrate reaction catalyst glucose oxygen carbon dioxide mitochondria respiration nucleus "
+    "chromosome gene expression transcription translation ribosome amino acid sequence mutation "
+    "evolution selection population species ecosystem habitat predator nutrient cycle nitrogen "
+    "phosphorus water temperature pressure volume gas law equilibrium concentration gradient "
+    "diffusion osmosis cell division mitosis meiosis replication polymerase signal receptor hormone "
+    "neuron synapse potential voltage current resistance circuit force mass acceleration velocity "
+    "momentum friction gravity orbit planet star galaxy radiation wavelength frequency spectrum "
+    "theory hypothesis experiment observation evidence model variable control measurement error"
+).split()
+CONNECTIVES = ("the", "a", "of", "in", "and", "to", "by", "with", "for", "from", "during", "through")
+VERBS = ("converts", "drives", "regulates", "produces", "requires", "transfers", "explains", "controls",
+         "increases", "reduces", "determines", "supports", "describes", "measures")
+
+# Speech the scripted recognizer returns per audio segment
+RECOGNIZED_WORDS_PER_SEGMENT = 40
+
+
+def parse_size(value):
+    """'1KB', '250KB', '5MB' or a plain byte count to a number of bytes"""
+    value = value.strip().upper()
+    for suffix, factor in (("MB", 1024 * 1024), ("KB", 1024), ("B", 1)):
+        if value.endswith(suffix):
+            return int(float(value[:-len(suffix)]) * factor)
+    return int(value)
+
+
+def format_size(size):
+    if size >= 1024 * 1024 and size % (1024 * 1024) == 0:
+        return f"{size // (1024 * 1024)}MB"
+    if size >= 1024 and size % 1024 == 0:
+        return f"{size // 1024}KB"
+    return f"{size}B"
+
+
+def _sentence(rng):
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(3, 6))]
+    words.insert(rng.randint(1, len(words) - 1), rng.choice(VERBS))
+    for _ in range(rng.randint(1, 3)):
+        words.insert(rng.randint(1, len(words) - 1), rng.choice(CONNECTIVES))
+    return " ".join(words).capitalize() + "."
+
+
+def sample_text(size, nonce=0, seed=0):
+    """About size bytes of sentence-structured study text; nonce varies the opening sentence only"""
+    rng = random.Random(seed)
+    parts = [f"Study notes revision {nonce}."]
+    length = len(parts[0])
+    while length < size:
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(4, 8)))
+        parts.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(parts)[:max(size, len(parts[0]))]
+
+
+def _pdf_escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def sample_pdf(text, lines_per_page=50, chars_per_line=90):
+    """A text PDF (uncompressed, Helvetica) holding text, wrapped into pages"""
+    words = text.split()
+    lines, current = [], ""
+    for word in words:
+        if current and len(current) + len(word) + 1 > chars_per_line:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        lines.append(current)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>",
+               3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for i, page in enumerate(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        stream = ("BT /F1 9 Tf 36 760 Td 14 TL " +
+                  " ".join(f"({_pdf_escape(line)}) '" for line in page) + " ET").encode('latin-1', 'replace')
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {content_id} 0 R "
+                            f"/Resources << /Font << /F1 3 0 R >> >> >>").encode()
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        kids.append(f"{page_id} 0 R")
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(pdf)
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, objects[number])
+    xref = len(pdf)
+    size = max(objects) + 1
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    for number in range(1, size):
+        pdf += b"%010d 00000 n \n" % offsets[number]
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref)
+    return bytes(pdf)
+
+
+def sample_wav(seconds, nonce=0, sample_rate=16000):
+    """16 kHz mono WAV of 4 s tones separated by 1 s pauses; nonce shifts the pitch"""
+    frequency = 220 + (nonce % 40) * 5
+    frames = bytearray()
+    for n in range(int(seconds * sample_rate)):
+        t = n / sample_rate
+        value = 0.3 * math.sin(2 * math.pi * frequency * t) if t % 5 < 4 else 0.0
+        frames += struct.pack('<h', int(value * 32767))
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+def video_id(nonce):
+    """An 11-character id the YouTube URL parser and the local transcript provider accept"""
+    return f"bench{nonce:06d}"
+
+
+def write_transcript(directory, nonce, text, seconds_per_line=4.0, words_per_line=12):
+    """Store text as <video_id>.json segments for the local transcript provider; returns the video id"""
+    words = text.split()
+    segments = [{"text": " ".join(words[i:i + words_per_line]), "start": n * seconds_per_line,
+                 "duration": seconds_per_line}
+                for n, i in enumerate(range(0, len(words), words_per_line))]
+    with open(os.path.join(directory, f"{video_id(nonce)}.json"), 'w', encoding='utf-8') as f:
+        json.dump(segments, f)
+    return video_id(nonce)
+
+
+class ScriptedRecognizer:
+    """Speech recognizer stand-in: returns vocabulary words derived from the audio itself
+
+    Identical audio gives identical text, and different recordings give
+    different text, so downstream caching behaves as it would with real speech.
+    """
+
+    name = "scripted"
+
+    def transcribe(self, audio):
+        rng = random.Random(hashlib.sha1(audio.raw_data).hexdigest())
+        return " ".join(rng.choice(VOCABULARY) for _ in range(RECOGNIZED_WORDS_PER_SEGMENT))
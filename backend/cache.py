@@ -0,0 +1,136 @@
+import copy
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from storage import SQLiteTable
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """Normalize text so trivially different submissions share a cache entry"""
+    return re.sub(r'\s+', ' ', text or '').strip()
+
+
+def make_cache_key(text, model, prompt_version):
+    """Build a content-addressed key from the normalized text, model name and prompt version"""
+    digest = hashlib.sha256()
+    digest.update(f"{prompt_version}\x00{model}\x00".encode('utf-8'))
+    digest.update(normalize_text(text).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with optional TTL expiry"""
+
+    def __init__(self, max_size=256, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if self.ttl and time.time() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache(SQLiteTable):
+    """On-disk cache tier storing JSON values in a SQLite database"""
+
+    def __init__(self, path, ttl=None, max_entries=10000):
+        super().__init__(path, "cache", max_entries=max_entries, ttl=ttl)
+
+
+class AnalysisCache:
+    """Two-tier cache for analysis results: an in-memory LRU backed by an optional SQLite file"""
+
+    def __init__(self, max_size=256, ttl=None, disk_path=None, disk_max_entries=10000):
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.disk = None
+        if disk_path:
+            try:
+                os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+                self.disk = SQLiteCache(disk_path, ttl=ttl, max_entries=disk_max_entries)
+                logger.info(f"Analysis disk cache enabled at {disk_path}")
+            except Exception as e:
+                logger.warning(f"Failed to open analysis disk cache at {disk_path}: {e}")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def get(self, key):
+        """Return a copy of the cached result, or None on a miss"""
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except Exception as e:
+                logger.warning(f"Analysis disk cache read failed: {e}")
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+                with self._lock:
+                    self.disk_hits += 1
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        # Callers decorate results per request, so never hand out the shared object
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except Exception as e:
+                logger.warning(f"Analysis disk cache write failed: {e}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses, disk_hits = self.hits, self.misses, self.disk_hits
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "disk_hits": disk_hits,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_enabled": self.disk is not None
+        }
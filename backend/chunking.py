@@ -0,0 +1,91 @@
+import asyncio
+import contextvars
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from text_processing import split_sentences
+from token_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def _split_oversized(unit, max_tokens):
+    """Hard-split a single unit that is larger than a chunk on word boundaries, as (piece, tokens) pairs"""
+    pieces = []
+    current = []
+    size = 0
+    for word in unit.split():
+        tokens = count_tokens(word) + 1
+        if current and size + tokens > max_tokens:
+            pieces.append((' '.join(current), size))
+            current, size = [], 0
+        current.append(word)
+        size += tokens
+    if current:
+        pieces.append((' '.join(current), size))
+    return pieces
+
+
+def split_text_into_chunks(text, max_tokens=3500):
+    """Split text into chunks of at most max_tokens, breaking on paragraph and sentence boundaries
+
+    Tokens are counted by token_budget, the same way prompts are budgeted.
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    # Break paragraphs into sentences only when a paragraph does not fit on its own
+    units = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        if tokens <= max_tokens:
+            units.append((paragraph, tokens))
+            continue
+        for sentence in split_sentences(paragraph):
+            tokens = count_tokens(sentence)
+            if tokens <= max_tokens:
+                units.append((sentence, tokens))
+            else:
+                units.extend(_split_oversized(sentence, max_tokens))
+
+    chunks = []
+    current = []
+    size = 0
+    for unit, tokens in units:
+        # The blank line joining two units costs about one token
+        if current and size + tokens + 1 > max_tokens:
+            chunks.append('\n\n'.join(current))
+            current, size = [], 0
+        current.append(unit)
+        size += tokens + 1
+    if current:
+        chunks.append('\n\n'.join(current))
+
+    logger.info(f"Split {len(text)} characters into {len(chunks)} chunks of up to {max_tokens} tokens")
+    return chunks
+
+
+def map_concurrently(func, items, max_workers=4):
+    """Apply func to every item on a thread pool, returning results in input order"""
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        # Each item runs in a copy of the caller's context so per-request state such as timings follows it
+        futures = [executor.submit(contextvars.copy_context().run, func, item) for item in items]
+        return [future.result() for future in futures]
+
+
+async def gather_concurrently(coroutines, limit=4):
+    """Await coroutines with at most limit in flight, returning results in input order"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(c) for c in coroutines))
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+from cache import LRUCache
+from storage import DiskLRUStore, SQLiteTable
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("memory", "sqlite", "disk")
+
+_DOCUMENT_ID = re.compile(r'[0-9a-f]{32}')
+
+
+def make_document_id(text):
+    """Content-addressed id, so resubmitting the same text reuses its document"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+def is_document_id(value):
+    """Whether value has the format make_document_id() produces; anything else comes from a confused or hostile client"""
+    return isinstance(value, str) and _DOCUMENT_ID.fullmatch(value) is not None
+
+
+class SQLiteDocumentBackend(SQLiteTable):
+    """Documents in a SQLite table, evicting the least recently used past max_entries"""
+
+    def __init__(self, path, max_entries=1000, ttl=None):
+        super().__init__(path, "documents", max_entries=max_entries, ttl=ttl)
+
+
+class DiskDocumentBackend:
+    """Documents as JSON files in a directory, evicting the least recently read past max_entries"""
+
+    def __init__(self, directory, max_entries=1000, ttl=None):
+        self.store = DiskLRUStore(directory, '.json', is_document_id, max_entries=max_entries, ttl=ttl)
+
+    def get(self, key):
+        data = self.store.read(key)
+        return None if data is None else json.loads(data)
+
+    def set(self, key, value):
+        self.store.write(key, json.dumps(value).encode('utf-8'))
+
+    def __len__(self):
+        return len(self.store)
+
+
+class DocumentStore:
+    """Keeps analyzed texts server-side so follow-up requests can refer to them by document_id"""
+
+    def __init__(self, backend, name="memory"):
+        self.backend = backend
+        self.name = name
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, text, **metadata):
+        """Store a text with optional metadata and return its document_id"""
+        document_id = make_document_id(text)
+        try:
+            self.backend.set(document_id, {"text": text, **metadata})
+        except Exception as e:
+            logger.warning(f"Failed to store document {document_id}: {e}")
+        return document_id
+
+    def get(self, document_id):
+        """Return the stored document (its text plus metadata), or None if unknown, expired or not a valid id"""
+        if not is_document_id(document_id):
+            logger.warning(f"Rejected malformed document id {str(document_id)[:80]!r}")
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            document = self.backend.get(document_id)
+        except Exception as e:
+            logger.warning(f"Failed to read document {document_id}: {e}")
+            document = None
+        with self._lock:
+            if document is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return document
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "backend": self.name,
+            "documents": len(self.backend),
+            "hits": hits,
+            "misses": misses
+        }
+
+
+def create_document_store(backend="memory", path=None, max_entries=256, ttl=None):
+    """Build a DocumentStore on the named backend: memory, sqlite (path is a file) or disk (path is a directory)"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown document store backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    if backend == "sqlite":
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return DocumentStore(SQLiteDocumentBackend(path, max_entries, ttl), backend)
+    if backend == "disk":
+        return DocumentStore(DiskDocumentBackend(path, max_entries, ttl), backend)
+    return DocumentStore(LRUCache(max_size=max_entries, ttl=ttl), backend)
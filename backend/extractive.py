@@ -0,0 +1,134 @@
+import logging
+
+import numpy as np
+from scipy import sparse
+
+from text_processing import get_stop_words
+
+logger = logging.getLogger(__name__)
+
+# Damping factor for the TextRank random walk
+DAMPING = 0.85
+# Trade-off between centrality and novelty when picking sentences (1.0 ignores redundancy)
+MMR_LAMBDA = 0.7
+# Only the best-ranked sentences are considered for selection
+CANDIDATE_POOL = 60
+
+
+def build_tfidf_matrix(doc):
+    """Build an L2-normalized sparse TF-IDF matrix (sentences x terms) from a ProcessedDocument"""
+    stop_words = get_stop_words()
+    vocabulary = {}
+    rows, cols, counts = [], [], []
+    for sentence_id, tokens in enumerate(doc.sentence_tokens):
+        term_counts = {}
+        for token in tokens:
+            term = token.lower()
+            if len(term) > 2 and term.isalnum() and term not in stop_words:
+                term_counts[term] = term_counts.get(term, 0) + 1
+        for term, count in term_counts.items():
+            rows.append(sentence_id)
+            cols.append(vocabulary.setdefault(term, len(vocabulary)))
+            counts.append(count)
+
+    n_sentences = len(doc.sentence_tokens)
+    terms = [None] * len(vocabulary)
+    for term, index in vocabulary.items():
+        terms[index] = term
+    if not vocabulary:
+        return sparse.csr_matrix((n_sentences, 0)), terms
+
+    # Sublinear term frequency with smoothed inverse document frequency
+    tf = sparse.csr_matrix(
+        (1.0 + np.log(np.asarray(counts, dtype=np.float64)), (rows, cols)),
+        shape=(n_sentences, len(vocabulary))
+    )
+    df = np.bincount(cols, minlength=len(vocabulary))
+    idf = np.log((1.0 + n_sentences) / (1.0 + df)) + 1.0
+    matrix = tf.multiply(idf).tocsr()
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    matrix = sparse.diags(1.0 / norms).dot(matrix).tocsr()
+    return matrix, terms
+
+
+def textrank_scores(matrix, iterations=50, tolerance=1e-6):
+    """Score sentences by centrality in the cosine-similarity graph
+
+    The n x n similarity matrix is never materialized: W @ v is computed as
+    X @ (X.T @ v) minus the self-similarity, which keeps this linear in the
+    number of non-zero TF-IDF entries.
+    """
+    n = matrix.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    xt = matrix.T.tocsr()
+    self_similarity = np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()
+
+    def similarity_dot(vector):
+        return matrix.dot(xt.dot(vector)) - self_similarity * vector
+
+    degree = similarity_dot(np.ones(n))
+    degree[degree <= 0] = 1.0
+    scores = np.full(n, 1.0 / n)
+    for _ in range(iterations):
+        updated = (1.0 - DAMPING) / n + DAMPING * similarity_dot(scores / degree)
+        if np.abs(updated - scores).sum() < tolerance:
+            scores = updated
+            break
+        scores = updated
+    return scores
+
+
+def mmr_select(matrix, scores, k, exclude=()):
+    """Pick k sentence ids by maximal marginal relevance: central but not redundant with earlier picks"""
+    ranked = np.argsort(-scores)
+    pool = [int(i) for i in ranked if int(i) not in exclude][:max(CANDIDATE_POOL, k)]
+    if not pool:
+        return []
+    relevance = scores[pool] / (scores[pool].max() or 1.0)
+    pool_vectors = matrix[pool]
+    redundancy = np.zeros(len(pool))
+    selected = []
+    available = np.ones(len(pool), dtype=bool)
+    for _ in range(min(k, len(pool))):
+        mmr = MMR_LAMBDA * relevance - (1.0 - MMR_LAMBDA) * redundancy
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(pool[best])
+        available[best] = False
+        # Track each candidate's highest similarity to anything already selected
+        similarity = pool_vectors.dot(pool_vectors[best].T).toarray().ravel()
+        redundancy = np.maximum(redundancy, similarity)
+    return selected
+
+
+def top_terms(matrix, terms, k):
+    """Terms with the highest total TF-IDF weight across the document"""
+    if not terms:
+        return []
+    weights = np.asarray(matrix.sum(axis=0)).ravel()
+    return [terms[i] for i in np.argsort(-weights)[:k]]
+
+
+def analyze_document(doc, summary_sentences=3, num_key_points=5, num_concepts=10):
+    """Extractive analysis of a ProcessedDocument: ranked summary sentences, key points and key concepts"""
+    sentences = doc.sentences
+    matrix, terms = build_tfidf_matrix(doc)
+    scores = textrank_scores(matrix)
+
+    summary_ids = mmr_select(matrix, scores, summary_sentences)
+    key_point_ids = mmr_select(matrix, scores, num_key_points, exclude=set(summary_ids))
+    if not key_point_ids:
+        key_point_ids = summary_ids[:num_key_points]
+
+    return {
+        # Summary sentences read best in their original order
+        "summary": " ".join(sentences[i] for i in sorted(summary_ids)),
+        "key_points": [sentences[i] for i in key_point_ids],
+        "word_count": doc.word_count,
+        "sentence_count": len(sentences),
+        "key_concepts": top_terms(matrix, terms, num_concepts),
+        "full_text": doc.text
+    }
@@ -0,0 +1,34 @@
+"""Gunicorn settings for production: `gunicorn -c gunicorn.conf.py wsgi:app`
+
+Every setting can be overridden from the environment.
+"""
+import multiprocessing
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 8000)}"
+
+# One worker process per core; threads inside each cover requests waiting on the model, YouTube or ffmpeg
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+worker_class = "gthread"
+
+# Import the app once in the master and fork workers from it, so imports and configuration are
+# shared copy-on-write. This is safe because pools, HTTP clients and database connections are
+# only created on first use, inside each worker.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# Streamed responses and background jobs can outlive a short timeout
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 60))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+
+# Worker processes do not share memory, so documents, job status and cached results go where
+# every worker can read them. Explicit settings in the environment take precedence.
+if workers > 1:
+    os.environ.setdefault("DOCUMENT_STORE_BACKEND", "sqlite")
+    os.environ.setdefault("JOB_STORE_BACKEND", "sqlite")
+    os.environ.setdefault("ANALYSIS_CACHE_DISK", "true")
+    os.environ.setdefault("TRANSCRIPT_CACHE_DISK", "true")
@@ -0,0 +1,197 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from storage import SQLiteTable
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at its depth limit"""
+
+
+class Job:
+    """A unit of background work with progress reporting"""
+
+    def __init__(self, kind, on_change=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.status_code = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # Bumped on every change so event streams can wait for the next update
+        self.version = 0
+        self._changed = threading.Condition()
+        self._on_change = on_change
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def update(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.updated_at = time.time()
+            self.version += 1
+            self._changed.notify_all()
+        if self._on_change:
+            self._on_change(self)
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until the job changes past the given version; returns the current version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version or self.finished, timeout=timeout)
+            return self.version
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+        if self.status == SUCCEEDED:
+            data["result"] = self.result
+        elif self.status == FAILED:
+            data["error"] = self.error
+            data["status_code"] = self.status_code
+        return data
+
+
+class SQLiteJobStore:
+    """Job snapshots in SQLite, so any worker process can report on a job another one is running"""
+
+    def __init__(self, path):
+        self.table = SQLiteTable(path, "jobs")
+
+    def save(self, snapshot):
+        self.table.set(snapshot["job_id"], snapshot, stored_at=snapshot["updated_at"])
+
+    def load(self, job_id):
+        return self.table.get(job_id, touch=False)
+
+    def prune(self, cutoff):
+        """Drop jobs not updated since cutoff, including ones orphaned by a worker that exited"""
+        self.table.purge(cutoff)
+
+
+class JobManager:
+    """Runs jobs on a bounded worker pool and keeps finished results for a limited time
+
+    With a store, every job change is also written there so other worker
+    processes can serve status requests for jobs this one runs.
+    """
+
+    def __init__(self, max_workers=4, max_queue=16, result_ttl=3600, store=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def submit(self, kind, func):
+        """Queue func(progress) as a new job, raising QueueFullError when the queue is full
+
+        The progress callback takes a stage name and an optional fraction between 0 and 1.
+        """
+        with self._lock:
+            self._prune()
+            active = sum(1 for job in self._jobs.values() if not job.finished)
+            if active >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(f"Job queue is full ({active} active jobs)")
+            job = Job(kind, on_change=self._save if self.store else None)
+            self._jobs[job.id] = job
+        self._save(job)
+
+        self._executor.submit(self._run, job, func)
+        logger.info(f"Queued {kind} job {job.id}")
+        return job
+
+    def get(self, job_id):
+        """The Job object, for jobs running in this process"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def snapshot(self, job_id):
+        """The job's status dict, from this process or from the shared store; None if unknown"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.store is None:
+            return None
+        try:
+            return self.store.load(job_id)
+        except Exception as e:
+            logger.warning(f"Failed to read job {job_id} from the job store: {e}")
+            return None
+
+    def _save(self, job):
+        if self.store is None:
+            return
+        try:
+            self.store.save(job.to_dict())
+        except Exception as e:
+            logger.warning(f"Failed to save job {job.id} to the job store: {e}")
+
+    def _run(self, job, func):
+        def progress(stage, fraction=None):
+            fields = {"stage": stage}
+            if fraction is not None:
+                fields["progress"] = max(job.progress, min(fraction, 1.0))
+            job.update(**fields)
+
+        job.update(status=RUNNING, stage='started')
+        try:
+            result = func(progress)
+            job.update(status=SUCCEEDED, stage='done', progress=1.0, result=result)
+            logger.info(f"{job.kind} job {job.id} succeeded")
+        except Exception as e:
+            # Pipelines raise errors that carry an HTTP status and response payload
+            status_code = getattr(e, 'status_code', 500)
+            payload = getattr(e, 'payload', None) or {"error": str(e)}
+            job.update(status=FAILED, stage='failed', error=payload, status_code=status_code)
+            logger.error(f"{job.kind} job {job.id} failed: {e}")
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.updated_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.store is not None:
+            try:
+                self.store.prune(cutoff)
+            except Exception as e:
+                logger.warning(f"Failed to prune the job store: {e}")
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {state: 0 for state in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+        for job in jobs:
+            counts[job.status] += 1
+        counts["rejected"] = self.rejected
+        counts["max_workers"] = self.max_workers
+        counts["max_queue"] = self.max_queue
+        return counts
@@ -0,0 +1,422 @@
+import asyncio
+import collections
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-3.5-turbo-0125"
+# Tasks that can be routed to their own model with OPENAI_MODEL_<TASK>
+TASKS = ("analysis", "quiz", "flashcards", "study_pack", "transcript", "voice")
+
+
+class LLMError(Exception):
+    """Raised when a model call fails after all retries or cannot get a request slot in time"""
+
+
+class _SlotWaiter:
+    """A caller queued for a request slot: a thread waiting on an event or a coroutine on a future"""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.granted = False
+        self.ready = threading.Event() if loop is None else loop.create_future()
+
+    def grant(self):
+        """Hand the slot over; False if the waiter's event loop is gone"""
+        if self.loop is None:
+            self.ready.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self._resolve)
+            except RuntimeError:
+                return False
+        self.granted = True
+        return True
+
+    def _resolve(self):
+        if not self.ready.done():
+            self.ready.set_result(True)
+
+
+class RateLimiter:
+    """Caps requests in flight and requests per minute (with a token bucket) for the whole process
+
+    Threads and coroutines on any event loop take slots from the same count and
+    queue for them in one line, so max_concurrent holds however the requests
+    are made. A released slot goes straight to the longest waiting caller.
+    """
+
+    def __init__(self, max_concurrent=8, requests_per_minute=0):
+        self.max_concurrent = max_concurrent
+        self.requests_per_minute = requests_per_minute
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters = collections.deque()
+        self._tokens = float(requests_per_minute)
+        self._refilled_at = time.monotonic()
+
+    def _reserve_token(self):
+        """Take a token from the per-minute bucket; returns 0 on success or the seconds until one is due"""
+        if not self.requests_per_minute:
+            return 0
+        rate = self.requests_per_minute / 60.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.requests_per_minute, self._tokens + (now - self._refilled_at) * rate)
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / rate
+
+    def _try_slot(self, loop=None):
+        """Take a free slot and return None, or queue and return the waiter to wait on; call with the lock held"""
+        if self._in_flight < self.max_concurrent and not self._waiters:
+            self._in_flight += 1
+            return None
+        waiter = _SlotWaiter(loop)
+        self._waiters.append(waiter)
+        return waiter
+
+    def _abandon(self, waiter):
+        """Leave the queue after a timeout or cancellation; True if a slot was granted meanwhile"""
+        with self._lock:
+            if not waiter.granted:
+                self._waiters.remove(waiter)
+                return False
+        return True
+
+    def _take_token(self, deadline):
+        """Wait for a token from the per-minute bucket; False if the deadline passes first"""
+        while True:
+            wait = self._reserve_token()
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            waiter = self._try_slot()
+        if waiter is not None:
+            waiter.ready.wait(timeout)
+            if not waiter.granted and not self._abandon(waiter):
+                return False
+        if not self._take_token(deadline):
+            self.release()
+            return False
+        return True
+
+    async def acquire_async(self, timeout):
+        """acquire() for coroutines: waits without holding a thread"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            waiter = self._try_slot(asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(waiter.ready, timeout)
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter):
+                    return False
+            except asyncio.CancelledError:
+                if self._abandon(waiter):
+                    self.release()
+                raise
+        while True:
+            wait = self._reserve_token()
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                self.release()
+                return False
+            await asyncio.sleep(wait)
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                if self._waiters.popleft().grant():
+                    return
+            self._in_flight -= 1
+
+    def in_flight(self):
+        with self._lock:
+            return self._in_flight
+
+
+class LLMGateway:
+    """Single entry point for chat completions: pooled connections, timeouts, retries and rate limits"""
+
+    def __init__(self, api_key, base_url=None, timeout=60.0, max_retries=3, backoff_base=0.5, backoff_cap=20.0,
+                 max_concurrent=8, requests_per_minute=0, queue_timeout=30.0, models=None,
+                 default_model=DEFAULT_MODEL, max_connections=20):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.queue_timeout = queue_timeout
+        self.default_model = default_model
+        self.models = dict(models or {})
+        self.max_connections = max_connections
+        self.limiter = RateLimiter(max_concurrent, requests_per_minute)
+        self._client = None
+        self._client_lock = threading.Lock()
+        # Async clients pool connections on the event loop they were created on
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "failures": 0, "throttled": 0, "in_flight": 0,
+                       "prompt_tokens": 0, "completion_tokens": 0}
+
+    @classmethod
+    def from_env(cls, api_key):
+        """Build a gateway configured from OPENAI_* / LLM_* environment variables"""
+        default_model = os.getenv("OPENAI_MODEL", DEFAULT_MODEL)
+        models = {task: os.getenv(f"OPENAI_MODEL_{task.upper()}", default_model) for task in TASKS}
+        return cls(
+            api_key,
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            timeout=float(os.getenv("LLM_TIMEOUT", 60)),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", 3)),
+            max_concurrent=int(os.getenv("LLM_MAX_CONCURRENT", 8)),
+            requests_per_minute=int(os.getenv("LLM_REQUESTS_PER_MINUTE", 0)),
+            queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", 30)),
+            models=models,
+            default_model=default_model,
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+        )
+
+    @property
+    def client(self):
+        """The shared OpenAI client, created on first use with a pooled HTTP client"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import httpx
+                    from openai import OpenAI
+                    http_client = httpx.Client(
+                        limits=httpx.Limits(max_connections=self.max_connections,
+                                            max_keepalive_connections=self.max_connections),
+                        timeout=self.timeout
+                    )
+                    # Retries are handled here so backoff and rate limits apply consistently
+                    self._client = OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout,
+                                          max_retries=0, http_client=http_client)
+        return self._client
+
+    @property
+    def async_client(self):
+        """The AsyncOpenAI client for the running event loop, created on first use
+
+        Its connection pool is sized for the process-wide cap on requests in flight.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            import httpx
+            from openai import AsyncOpenAI
+            connections = self.limiter.max_concurrent
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+                timeout=self.timeout
+            )
+            client = self._async_clients[loop] = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                                             timeout=self.timeout, max_retries=0,
+                                                             http_client=http_client)
+        return client
+
+    def model_for(self, task):
+        return self.models.get(task, self.default_model)
+
+    def _count(self, name, delta=1):
+        with self._stats_lock:
+            self._stats[name] += delta
+
+    def _is_retryable(self, error):
+        import openai
+        if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+            return True
+        status = getattr(error, 'status_code', None)
+        return status is not None and (status == 429 or status >= 500)
+
+    def _backoff(self, attempt, error):
+        """Exponential backoff with full jitter, honouring Retry-After when the server sends it"""
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_cap)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def _params(self, task, messages, json_response=False, max_tokens=None, timeout=None, **kwargs):
+        params = {"model": self.model_for(task), "messages": messages, "timeout": timeout or self.timeout}
+        if json_response:
+            params["response_format"] = {"type": "json_object"}
+        if max_tokens:
+            params["max_tokens"] = max_tokens
+        params.update(kwargs)
+        return params
+
+    def _request(self, task, params):
+        """Call the API with retries; on success the caller holds a request slot and must _release() it"""
+        attempt = 0
+        while True:
+            if not self.limiter.acquire(self.queue_timeout):
+                self._count("throttled")
+                raise LLMError(f"No LLM request slot available within {self.queue_timeout}s")
+            self._count("requests")
+            self._count("in_flight")
+            try:
+                return self.client.chat.completions.create(**params)
+            except Exception as e:
+                self._release()
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    self._count("failures")
+                    raise
+                delay = self._backoff(attempt, e)
+                logger.warning(f"LLM {task} call failed ({e}); retrying in {delay:.2f}s")
+            self._count("retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def _release(self):
+        self._count("in_flight", -1)
+        self.limiter.release()
+
+    async def _arequest(self, task, params):
+        """_request() for coroutines; the request slot is released before returning"""
+        attempt = 0
+        while True:
+            if not await self.limiter.acquire_async(self.queue_timeout):
+                self._count("throttled")
+                raise LLMError(f"No LLM request slot available within {self.queue_timeout}s")
+            self._count("requests")
+            self._count("in_flight")
+            try:
+                return await self.async_client.chat.completions.create(**params)
+            except Exception as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    self._count("failures")
+                    raise
+                delay = self._backoff(attempt, e)
+                logger.warning(f"LLM {task} call failed ({e}); retrying in {delay:.2f}s")
+            finally:
+                self._count("in_flight", -1)
+                self.limiter.release()
+            self._count("retries")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _record_usage(self, task, response):
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            self._count("prompt_tokens", usage.prompt_tokens or 0)
+            self._count("completion_tokens", usage.completion_tokens or 0)
+            metrics.LLM_TOKENS.observe(usage.prompt_tokens or 0, task=task, kind="prompt")
+            metrics.LLM_TOKENS.observe(usage.completion_tokens or 0, task=task, kind="completion")
+
+    def _record_duration(self, task, params, start, outcome):
+        elapsed = time.perf_counter() - start
+        metrics.LLM_REQUEST_SECONDS.observe(elapsed, task=task, model=params["model"], outcome=outcome)
+        metrics.record_timing(f"llm_{task}", elapsed)
+
+    def create(self, task, messages, **kwargs):
+        """Run a chat completion for a task and return the raw response"""
+        params = self._params(task, messages, **kwargs)
+        start = time.perf_counter()
+        try:
+            response = self._request(task, params)
+        except Exception:
+            self._record_duration(task, params, start, "error")
+            raise
+        self._release()
+        self._record_duration(task, params, start, "ok")
+        self._record_usage(task, response)
+        return response
+
+    async def acreate(self, task, messages, **kwargs):
+        """create() on the async client, awaiting the model without holding a thread"""
+        params = self._params(task, messages, **kwargs)
+        start = time.perf_counter()
+        try:
+            response = await self._arequest(task, params)
+        except Exception:
+            self._record_duration(task, params, start, "error")
+            raise
+        self._record_duration(task, params, start, "ok")
+        self._record_usage(task, response)
+        return response
+
+    def stream(self, task, system, prompt, **kwargs):
+        """Run a streaming system + user prompt, yielding content deltas as they arrive
+
+        Retries only cover opening the stream; the request slot is held until the stream ends.
+        """
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ]
+        params = self._params(task, messages, stream=True, **kwargs)
+        start = time.perf_counter()
+        try:
+            stream = self._request(task, params)
+        except Exception:
+            self._record_duration(task, params, start, "error")
+            raise
+        outcome = "error"
+        try:
+            for chunk in stream:
+                if chunk.choices:
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+            outcome = "ok"
+        finally:
+            stream.close()
+            self._release()
+            # Streams are timed until the last delta, so this covers the whole generation
+            self._record_duration(task, params, start, outcome)
+
+    def chat_text(self, task, system, prompt, **kwargs):
+        """Run a system + user prompt and return the message text"""
+        response = self.create(task, [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ], **kwargs)
+        return response.choices[0].message.content
+
+    def chat_json(self, task, system, prompt, **kwargs):
+        """Run a system + user prompt in JSON mode and return the parsed object"""
+        return json.loads(self.chat_text(task, system, prompt, json_response=True, **kwargs))
+
+    async def achat_text(self, task, system, prompt, **kwargs):
+        """chat_text() for coroutines"""
+        response = await self.acreate(task, [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ], **kwargs)
+        return response.choices[0].message.content
+
+    async def achat_json(self, task, system, prompt, **kwargs):
+        """chat_json() for coroutines"""
+        return json.loads(await self.achat_text(task, system, prompt, json_response=True, **kwargs))
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["max_concurrent"] = self.limiter.max_concurrent
+        stats["requests_per_minute"] = self.limiter.requests_per_minute
+        stats["models"] = {task: self.model_for(task) for task in TASKS}
+        return stats
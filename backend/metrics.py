@@ -0,0 +1,158 @@
+"""Latency histograms and counters for the processing hot paths.
+
+Stages are timed with `with metrics.span("pdf_extraction"):`. The duration is
+added to the stage's histogram and, while a request is being served, to that
+request's Server-Timing header. Everything is aggregated per process and
+rendered in the Prometheus text format by render().
+"""
+import contextlib
+import contextvars
+import threading
+import time
+
+# Upper bounds in seconds, from a fast tokenization to a long model call
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Upper bounds for tokens per model call
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+# Every exported metric name starts with this
+PREFIX = "study_companion_"
+
+# Durations recorded during the current request, as a list of (name, seconds); None outside requests
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label combination"""
+
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in sorted(self._series.items())]
+        for key, counts, total, count in series:
+            labels = dict(zip(self.labelnames, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to produce an HTTP response, by endpoint",
+    ("method", "endpoint", "status"))
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds", "Time spent in each processing stage", ("stage",))
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_duration_seconds", "Time per model call including queueing and retries, by task",
+    ("task", "model", "outcome"))
+LLM_TOKENS = Histogram(
+    "llm_tokens", "Tokens per model call, by task and kind (prompt or completion)",
+    ("task", "kind"), buckets=TOKEN_BUCKETS)
+
+_histograms = [HTTP_REQUEST_SECONDS, STAGE_SECONDS, LLM_REQUEST_SECONDS, LLM_TOKENS]
+_collectors = []
+
+
+def register_collector(collect):
+    """Export values owned elsewhere, such as cache counters, at render time
+
+    collect() returns (name, type, help, samples) tuples, with samples a list of
+    (labels dict, value) pairs.
+    """
+    _collectors.append(collect)
+
+
+def start_request():
+    """Start collecting Server-Timing entries for the current request; returns a token for finish_request()"""
+    return _request_timings.set([])
+
+
+def finish_request(token):
+    """Stop collecting for the request started with token and return its (name, seconds) entries"""
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+
+def record_timing(name, seconds):
+    """Add an entry to the current request's Server-Timing header, if a request is being served"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Time the enclosed block, or every call of the decorated function, as a processing stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        record_timing(stage, elapsed)
+
+
+def server_timing_header(timings, total=None):
+    """Format (name, seconds) entries as a Server-Timing header, merging repeated stages"""
+    merged = {}
+    for name, seconds in timings:
+        duration, count = merged.get(name, (0.0, 0))
+        merged[name] = (duration + seconds, count + 1)
+    entries = []
+    for name, (duration, count) in merged.items():
+        entry = f"{name};dur={duration * 1000:.1f}"
+        if count > 1:
+            entry += f';desc="{count} calls"'
+        entries.append(entry)
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for histogram in _histograms:
+        lines.extend(histogram.render())
+    for collect in _collectors:
+        for name, kind, help, samples in collect():
+            name = PREFIX + name
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,113 @@
+"""Locate and provision the NLTK data used by local text processing.
+
+Nothing here imports NLTK: the startup check only looks for the data files, so
+workers boot without loading NLTK or touching the network. Provision the data
+once, as a build or deploy step:
+
+    python nltk_resources.py            # into backend/nltk_data (or NLTK_DATA_DIR)
+    python nltk_resources.py --dir /srv/nltk_data
+"""
+import argparse
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+# (resource path, download package) pairs needed for tokenizing and stop word filtering
+REQUIRED_RESOURCES = (
+    ("tokenizers/punkt", "punkt"),
+    ("corpora/stopwords", "stopwords")
+)
+# Provisioned as well but not required: the local quiz's distractor ranking falls back to suffix rules without it
+OPTIONAL_RESOURCES = (
+    ("taggers/averaged_perceptron_tagger", "averaged_perceptron_tagger"),
+)
+# Provisioned data lives here by default and is searched before NLTK's own locations
+NLTK_DATA_DIR = os.getenv("NLTK_DATA_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data')
+PROVISION_COMMAND = f"python {os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_resources.py')}"
+
+
+def search_paths():
+    """Directories NLTK searches for data, mirroring nltk.data.path without importing NLTK"""
+    paths = [NLTK_DATA_DIR]
+    paths += [p for p in os.getenv("NLTK_DATA", "").split(os.pathsep) if p]
+    paths.append(os.path.expanduser("~/nltk_data"))
+    if sys.platform.startswith("win"):
+        paths += [os.path.join(sys.prefix, "nltk_data"), os.path.join(sys.prefix, "share", "nltk_data"),
+                  os.path.join(sys.prefix, "lib", "nltk_data"),
+                  os.path.join(os.environ.get("APPDATA", "C:\\"), "nltk_data"),
+                  "C:\\nltk_data", "D:\\nltk_data", "E:\\nltk_data"]
+    else:
+        paths += [os.path.join(sys.prefix, "nltk_data"), os.path.join(sys.prefix, "share", "nltk_data"),
+                  os.path.join(sys.prefix, "lib", "nltk_data"),
+                  "/usr/share/nltk_data", "/usr/local/share/nltk_data", "/usr/lib/nltk_data", "/usr/local/lib/nltk_data"]
+    return paths
+
+
+def _exists(resource):
+    for path in search_paths():
+        location = os.path.join(path, *resource.split("/"))
+        if os.path.isdir(location) or os.path.isfile(location + ".zip"):
+            return True
+    return False
+
+
+def missing_resources():
+    """Download packages whose data cannot be found locally"""
+    return [package for resource, package in REQUIRED_RESOURCES if not _exists(resource)]
+
+
+def configure():
+    """Point NLTK at the provisioned data directory before it is first imported"""
+    paths = [p for p in os.getenv("NLTK_DATA", "").split(os.pathsep) if p]
+    if NLTK_DATA_DIR not in paths:
+        os.environ["NLTK_DATA"] = os.pathsep.join([NLTK_DATA_DIR] + paths)
+
+
+def check(mode="warn"):
+    """Verify the NLTK data exists locally; mode is "warn", "strict" (raise) or "off"
+
+    Returns the missing packages.
+    """
+    configure()
+    if mode == "off":
+        return []
+    missing = missing_resources()
+    if not missing:
+        logger.info("NLTK data found locally")
+        return missing
+    message = (f"NLTK data missing: {', '.join(missing)}. Local processing falls back to regex "
+               f"tokenizers and a built-in stop word list; provision it with '{PROVISION_COMMAND}' or set NLTK_DATA")
+    if mode == "strict":
+        raise RuntimeError(message)
+    logger.warning(message)
+    return missing
+
+
+def provision(download_dir=NLTK_DATA_DIR):
+    """Download the required and optional NLTK data into download_dir; returns the packages that failed"""
+    import nltk
+
+    os.makedirs(download_dir, exist_ok=True)
+    failed = []
+    for _, package in REQUIRED_RESOURCES + OPTIONAL_RESOURCES:
+        if not nltk.download(package, download_dir=download_dir, quiet=True, raise_on_error=False):
+            failed.append(package)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default=NLTK_DATA_DIR, help='directory to download the data into')
+    args = parser.parse_args()
+
+    failed = provision(args.dir)
+    if failed:
+        print(f"Failed to download: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+    print(f"NLTK data ready in {args.dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import json
+import logging
+import re
+import threading
+import zlib
+
+from storage import DiskLRUStore
+
+logger = logging.getLogger(__name__)
+
+# zlib level for stored pages; extracted text compresses to about a quarter at this level
+COMPRESSION_LEVEL = 6
+
+_SHA256 = re.compile(r'[0-9a-f]{64}')
+
+
+def is_sha256(value):
+    """Whether value is a lowercase hex SHA-256 digest, and so safe to use as a file name"""
+    return isinstance(value, str) and _SHA256.fullmatch(value) is not None
+
+
+class PDFTextCache:
+    """Extracted PDF text per page, compressed on disk and keyed by the SHA-256 of the file
+
+    Each entry is one zlib-compressed JSON list of page texts in a DiskLRUStore,
+    which worker processes can share. Once the entries together exceed
+    max_bytes the least recently read are removed. max_bytes=0 disables the cache.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.store = DiskLRUStore(directory, '.pages.z', is_sha256, max_bytes=max_bytes) if self.enabled else None
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def contains(self, digest):
+        """Whether the text of the PDF with this digest is cached, without reading it"""
+        return self.enabled and self.store.contains(digest)
+
+    def get(self, digest):
+        """The cached page texts for a digest, or None"""
+        if not self.enabled:
+            return None
+        data = self.store.read(digest)
+        if data is None:
+            self._count(False)
+            return None
+        try:
+            pages = json.loads(zlib.decompress(data).decode('utf-8'))
+        except (ValueError, zlib.error) as e:
+            logger.warning(f"Discarding unreadable PDF cache entry {digest}: {e}")
+            self.store.remove(digest)
+            self._count(False)
+            return None
+        self._count(True)
+        return pages
+
+    def set(self, digest, pages):
+        if not self.enabled:
+            return
+        data = zlib.compress(json.dumps(pages, ensure_ascii=False).encode('utf-8'), COMPRESSION_LEVEL)
+        if len(data) > self.max_bytes:
+            logger.info(f"Not caching PDF {digest}: {len(data)} compressed bytes exceed the cache size")
+            return
+        self.store.write(digest, data)
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        entries, size = self.store.usage() if self.enabled else (0, 0)
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses
+        }
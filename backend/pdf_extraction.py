@@ -0,0 +1,136 @@
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Worker processes used for page-parallel extraction (defaults to one per CPU)
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+# Documents shorter than this are extracted in-process; a pool round-trip costs more than it saves
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 16))
+# A fast-pass page with less text than this is re-extracted with pdfplumber
+MIN_USEFUL_PAGE_CHARS = 20
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _mp_context():
+    """forkserver where the platform has it (Linux, macOS), spawn elsewhere"""
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def _get_executor():
+    """Lazily create the shared process pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Not fork: the server's threads may hold locks at fork time, which a forked child would deadlock on
+            _executor = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS, mp_context=_mp_context())
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _is_useful(text):
+    """Whether a fast-pass result has enough real text to keep"""
+    return text is not None and sum(1 for c in text if c.isalnum()) >= MIN_USEFUL_PAGE_CHARS
+
+
+def _open_source(source):
+    """Return a path or a fresh stream for a PDF given as a file path or as bytes"""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+
+def extract_page_range(source, start, end):
+    """Extract the text of pages [start, end), trying PyPDF2 first and pdfplumber for empty pages"""
+    import PyPDF2
+
+    texts = []
+    missing = []
+    reader = PyPDF2.PdfReader(_open_source(source))
+    for index in range(start, end):
+        try:
+            text = reader.pages[index].extract_text()
+        except Exception as e:
+            logger.debug(f"PyPDF2 failed on page {index}: {e}")
+            text = None
+        if _is_useful(text):
+            texts.append(text)
+        else:
+            texts.append("")
+            missing.append(index)
+
+    if missing:
+        import pdfplumber
+        with pdfplumber.open(_open_source(source)) as pdf:
+            for index in missing:
+                page = pdf.pages[index]
+                texts[index - start] = page.extract_text() or ""
+                # Release the parsed page objects as we go to keep memory flat on long documents
+                page.close()
+
+    return texts
+
+
+def _page_ranges(page_count, workers, per_worker=4):
+    """Split pages into contiguous ranges, a few per worker so slow pages even out"""
+    size = max(1, -(-page_count // (workers * per_worker)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def extract_pages(source, max_workers=None):
+    """Extract the text of every page of a PDF given as a file path or as bytes, in order"""
+    import PyPDF2
+
+    workers = max_workers or PDF_EXTRACT_WORKERS
+    page_count = len(PyPDF2.PdfReader(_open_source(source)).pages)
+
+    if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        return extract_page_range(source, 0, page_count)
+
+    # In-memory documents are pickled to every task, so keep to one range per worker
+    in_memory = isinstance(source, (bytes, bytearray))
+    ranges = _page_ranges(page_count, workers, per_worker=1 if in_memory else 4)
+    logger.info(f"Extracting {page_count} pages in {len(ranges)} ranges across {workers} processes")
+    try:
+        executor = _get_executor()
+        futures = [executor.submit(extract_page_range, source, start, end) for start, end in ranges]
+        pages = []
+        for future in futures:
+            pages.extend(future.result())
+        return pages
+    except BrokenProcessPool as e:
+        logger.warning(f"PDF process pool failed, extracting in-process instead: {e}")
+        _reset_executor()
+        return extract_page_range(source, 0, page_count)
+
+
+@metrics.span("pdf_extraction")
+def extract_pdf_pages(source, max_workers=None):
+    """Per-page text of a PDF given as a file path or as bytes; an empty list if it cannot be read"""
+    try:
+        return extract_pages(source, max_workers)
+    except Exception as e:
+        logger.error(f"Error extracting text from PDF: {e}")
+        return []
+
+
+def extract_text_from_pdf(source, max_workers=None):
+    """Extract text from a PDF given as a file path or as bytes"""
+    return "\n".join(extract_pdf_pages(source, max_workers))
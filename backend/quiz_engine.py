@@ -0,0 +1,190 @@
+"""Candidate-term table and similarity-ranked distractors for the local quiz generator.
+
+The table is built once per ProcessedDocument: every distinct candidate term
+with its frequency, length, coarse part of speech, a character n-gram
+spelling vector and a sentence co-occurrence vector. Distractors for any
+number of answers are then ranked with a single sparse matrix product, so
+options look like the answer (same word class, similar length, used in the
+same passages) instead of being random words from the text.
+"""
+import functools
+import logging
+import random
+
+import numpy as np
+from scipy import sparse
+
+import metrics
+from text_processing import get_stop_words
+
+logger = logging.getLogger(__name__)
+
+# Characters per n-gram in the spelling vectors; terms are padded with ^ and $ first
+NGRAM_SIZE = 3
+# Weights of the similarity signals in a distractor's score
+CONTEXT_WEIGHT = 0.4
+SPELLING_WEIGHT = 0.2
+POS_WEIGHT = 0.25
+LENGTH_WEIGHT = 0.1
+FREQUENCY_WEIGHT = 0.05
+# Terms spelled this much like the answer are inflections of it (enzyme, enzymes), not distractors
+MAX_SPELLING_SIMILARITY = 0.6
+# Distractors are drawn from this many best-scoring terms so repeated quizzes vary
+DISTRACTOR_POOL = 8
+
+# Coarse word classes, from the first letter of a Penn Treebank tag
+NOUN, VERB, ADJECTIVE, ADVERB, OTHER = range(5)
+_TAG_CLASSES = {"N": NOUN, "V": VERB, "J": ADJECTIVE, "R": ADVERB}
+# Suffix rules used when the NLTK tagger is not provisioned, checked in order
+_SUFFIX_CLASSES = (
+    (("tion", "sion", "ment", "ness", "ity", "ism", "ance", "ence", "ship", "ogy"), NOUN),
+    (("ly",), ADVERB),
+    (("ous", "ive", "able", "ible", "ical", "ful", "less", "ary", "ic", "al"), ADJECTIVE),
+    (("ing", "ed", "ize", "ise", "ify", "ate"), VERB)
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_tagger():
+    """NLTK's perceptron tagger when its data is provisioned, else None"""
+    try:
+        from nltk.tag import PerceptronTagger
+        return PerceptronTagger()
+    except LookupError:
+        logger.info("NLTK tagger data not provisioned; using suffix rules for distractor word classes")
+    except (OSError, ImportError) as e:
+        logger.warning(f"POS tagger unavailable ({e}); using suffix rules for distractor word classes")
+    return None
+
+
+def _suffix_class(term):
+    for suffixes, word_class in _SUFFIX_CLASSES:
+        if term.endswith(suffixes):
+            return word_class
+    return NOUN
+
+
+def tag_terms(terms):
+    """Coarse word class per term, from the tagger if provisioned or suffix rules otherwise"""
+    tagger = _get_tagger()
+    if tagger is None:
+        return np.array([_suffix_class(term) for term in terms], dtype=np.int8)
+    return np.array([_TAG_CLASSES.get(tag[:1], OTHER) for _, tag in tagger.tag(terms)], dtype=np.int8)
+
+
+def _normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms).dot(matrix).tocsr()
+
+
+def _ngrams(term):
+    padded = f"^{term}$"
+    return [padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)]
+
+
+class TermTable:
+    """Distinct candidate terms of a document and the vectors distractors are ranked by"""
+
+    def __init__(self, doc):
+        stop_words = get_stop_words()
+        # Lowercased term -> row. Options show a term as spelled mid-sentence, since a
+        # capital at the start of a sentence says nothing about the word itself
+        self.index = {}
+        self.terms = []
+        counts = []
+        settled = []
+        rows, cols = [], []
+        for sentence_id, sentence_terms in enumerate(doc.sentence_terms):
+            tokens = doc.sentence_tokens[sentence_id]
+            opening = tokens[0] if tokens else None
+            seen = set()
+            for word in sentence_terms:
+                key = word.lower()
+                if key in stop_words:
+                    continue
+                mid_sentence = word != opening
+                row = self.index.get(key)
+                if row is None:
+                    row = self.index[key] = len(self.terms)
+                    self.terms.append(word if mid_sentence else key)
+                    counts.append(0)
+                    settled.append(mid_sentence)
+                elif mid_sentence and not settled[row]:
+                    self.terms[row] = word
+                    settled[row] = True
+                counts[row] += 1
+                if row not in seen:
+                    seen.add(row)
+                    rows.append(row)
+                    cols.append(sentence_id)
+
+        n_terms = len(self.terms)
+        self.frequencies = np.asarray(counts, dtype=np.float64)
+        self.lengths = np.array([len(term) for term in self.terms], dtype=np.float64)
+        self.word_classes = tag_terms([term.lower() for term in self.terms]) if n_terms else np.zeros(0, np.int8)
+
+        # Which sentences each term appears in: terms used in the same passages score as related
+        self.context_vectors = _normalize_rows(sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(n_terms, max(len(doc.sentence_terms), 1))))
+        self._context_transposed = self.context_vectors.T.tocsr()
+
+        ngram_ids = {}
+        ngram_rows, ngram_cols = [], []
+        for row, key in enumerate(self.index):
+            for ngram in set(_ngrams(key)):
+                ngram_rows.append(row)
+                ngram_cols.append(ngram_ids.setdefault(ngram, len(ngram_ids)))
+        self.ngram_vectors = _normalize_rows(sparse.csr_matrix(
+            (np.ones(len(ngram_rows)), (ngram_rows, ngram_cols)), shape=(n_terms, max(len(ngram_ids), 1))))
+        self._ngrams_transposed = self.ngram_vectors.T.tocsr()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __contains__(self, word):
+        return word.lower() in self.index
+
+    def scores(self, rows):
+        """Distractor score of every term for each answer row (answers x terms); excluded pairs are -inf"""
+        rows = np.asarray(rows, dtype=np.int64)
+        context = self.context_vectors[rows].dot(self._context_transposed).toarray()
+        spelling = self.ngram_vectors[rows].dot(self._ngrams_transposed).toarray()
+        same_class = self.word_classes[rows][:, None] == self.word_classes[None, :]
+        answer_lengths = self.lengths[rows][:, None]
+        length = 1.0 - np.minimum(1.0, np.abs(self.lengths[None, :] - answer_lengths) / answer_lengths)
+        log_frequencies = np.log(self.frequencies)
+        frequency = np.exp(-np.abs(log_frequencies[None, :] - log_frequencies[rows][:, None]))
+
+        scores = (CONTEXT_WEIGHT * context + SPELLING_WEIGHT * spelling + POS_WEIGHT * same_class
+                  + LENGTH_WEIGHT * length + FREQUENCY_WEIGHT * frequency)
+        # Drops the answer itself too, whose spelling similarity is 1
+        scores[spelling > MAX_SPELLING_SIMILARITY] = -np.inf
+        return scores
+
+    def distractors(self, answers, k=3):
+        """Up to k plausible wrong options for each answer word, shaped like the answer's capitalization"""
+        picks = [[] for _ in answers]
+        known = [(i, self.index[answer.lower()]) for i, answer in enumerate(answers) if answer in self]
+        if not known or len(self) < 2:
+            return picks
+
+        scores = self.scores([row for _, row in known])
+        pool_size = min(max(DISTRACTOR_POOL, k), len(self) - 1)
+        pools = np.argpartition(-scores, pool_size - 1, axis=1)[:, :pool_size]
+        for (i, _), pool, row_scores in zip(known, pools, scores):
+            candidates = [int(j) for j in pool if np.isfinite(row_scores[j])]
+            words = [self.terms[j] for j in random.sample(candidates, min(k, len(candidates)))]
+            if answers[i][:1].isupper():
+                words = [word[:1].upper() + word[1:] for word in words]
+            picks[i] = words
+        return picks
+
+
+def get_term_table(doc):
+    """The TermTable for a ProcessedDocument, built on first use and kept with the document"""
+    if doc.term_table is None:
+        with metrics.span("term_table"):
+            doc.term_table = TermTable(doc)
+        logger.info(f"Built quiz term table: {len(doc.term_table)} terms")
+    return doc.term_table
@@ -0,0 +1,99 @@
+import asyncio
+import copy
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one
+
+    The first caller for a key runs the computation; callers arriving while it
+    is in flight wait for it and get a copy of its result (or its exception)
+    instead of repeating the work. Nothing is kept once the call finishes;
+    pair it with a cache for results that should outlive the burst.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        # Coroutine callers wait on futures, kept per event loop
+        self._tasks = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, func):
+        """Return func(), sharing one run among concurrent threads with the same key"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Callers decorate results per request, so each gets its own copy
+            return copy.deepcopy(call.result)
+
+        try:
+            # call.result is a private snapshot: the leader gets a copy like everyone
+            # else, so its caller can modify it while followers are still copying
+            call.result = func()
+            return copy.deepcopy(call.result)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, func):
+        """Await func(), sharing one run among concurrent coroutines with the same key
+
+        The run is a task of its own rather than part of the first caller, so a
+        caller that is cancelled (a client disconnecting) stops waiting without
+        cancelling the run for the callers still waiting on it.
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = self._tasks[task_key] = loop.create_task(func())
+                task.add_done_callback(lambda done: self._task_done(task_key, done))
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _task_done(self, task_key, task):
+        with self._lock:
+            if self._tasks.get(task_key) is task:
+                del self._tasks[task_key]
+        # Mark the exception retrieved so a run whose callers all left does not log a warning
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._tasks)
+            }
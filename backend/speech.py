@@ -0,0 +1,162 @@
+import importlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Recognizers get 16 kHz mono 16-bit audio
+SAMPLE_RATE = 16000
+# Upper bound on a single recognition request; speech is packed into segments up to this long
+MAX_SEGMENT_MS = int(float(os.getenv("SPEECH_MAX_SEGMENT_SECONDS", 30)) * 1000)
+# Pauses at least this long are candidate split points
+MIN_SILENCE_MS = 500
+# Silence kept around each split so words are not clipped
+SILENCE_PADDING_MS = 200
+# Segments transcribed concurrently across all requests
+SPEECH_WORKERS = int(os.getenv("SPEECH_WORKERS", 4))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class SpeechServiceError(Exception):
+    """Raised when a recognition service cannot be reached or rejects a request"""
+
+
+class SpeechNotUnderstood(Exception):
+    """Raised when no speech could be recognized in the audio"""
+
+
+def _get_executor():
+    """Lazily create the shared recognition pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SPEECH_WORKERS, thread_name_prefix="speech")
+        return _executor
+
+
+class GoogleRecognizer:
+    """Google Web Speech API through SpeechRecognition; needs network access"""
+
+    name = "google"
+
+    def __init__(self, language="en-US"):
+        self.language = language
+
+    def transcribe(self, audio):
+        import speech_recognition as sr
+
+        recognizer = sr.Recognizer()
+        data = sr.AudioData(audio.raw_data, audio.frame_rate, audio.sample_width)
+        try:
+            return recognizer.recognize_google(data, language=self.language)
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError as e:
+            raise SpeechServiceError(str(e)) from e
+
+
+class VoskRecognizer:
+    """Offline recognition with a local Vosk model (pip install vosk and download a model)"""
+
+    name = "vosk"
+
+    def __init__(self, model_path):
+        from vosk import Model, SetLogLevel
+        SetLogLevel(-1)
+        # The model is loaded once and shared; each segment gets its own lightweight recognizer
+        self.model = Model(model_path)
+
+    def transcribe(self, audio):
+        from vosk import KaldiRecognizer
+        recognizer = KaldiRecognizer(self.model, audio.frame_rate)
+        recognizer.AcceptWaveform(audio.raw_data)
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+
+RECOGNIZERS = {
+    "google": lambda options: GoogleRecognizer(options.get("language") or "en-US"),
+    "vosk": lambda options: VoskRecognizer(options["model_path"])
+}
+
+
+def create_recognizer(name="google", **options):
+    """Build a recognizer by name, or from 'module:Class' for any class with transcribe(audio) -> text"""
+    if name in RECOGNIZERS:
+        return RECOGNIZERS[name](options)
+    if ":" in name:
+        module_name, class_name = name.split(":", 1)
+        return getattr(importlib.import_module(module_name), class_name)()
+    raise ValueError(f"Unknown speech recognizer '{name}', expected one of {', '.join(RECOGNIZERS)} or module:Class")
+
+
+def plan_segments(audio, max_segment_ms=MAX_SEGMENT_MS):
+    """Split audio into (start_ms, end_ms) segments at pauses, each at most max_segment_ms long"""
+    from pydub.silence import detect_nonsilent
+
+    if len(audio) == 0 or audio.max == 0:
+        return []
+    speech = detect_nonsilent(audio, min_silence_len=MIN_SILENCE_MS, silence_thresh=audio.dBFS - 16, seek_step=10)
+
+    segments = []
+    current = None
+    for start, end in speech:
+        start = max(0, start - SILENCE_PADDING_MS)
+        end = min(len(audio), end + SILENCE_PADDING_MS)
+        if current and end - current[0] <= max_segment_ms:
+            current[1] = end
+            continue
+        if current:
+            segments.append(tuple(current))
+        # Speech with no usable pause is cut at the segment limit
+        while end - start > max_segment_ms:
+            segments.append((start, start + max_segment_ms))
+            start += max_segment_ms
+        current = [start, end]
+    if current:
+        segments.append(tuple(current))
+    return segments
+
+
+@metrics.span("speech_recognition")
+def transcribe_audio(audio, recognizer, progress=None):
+    """Transcribe audio segment by segment, concurrently, and stitch the text back in order
+
+    Returns (text, segments) where each segment has start/end offsets in seconds
+    and its text. A segment that fails is reported with an error and left out of
+    the text; the first error is raised only when every segment fails.
+    progress(done, total) is called as segments finish.
+    """
+    audio = audio.set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
+    spans = plan_segments(audio)
+    if not spans:
+        return "", []
+    logger.info(f"Transcribing {len(audio) / 1000:.1f}s of audio in {len(spans)} segments")
+
+    executor = _get_executor()
+    futures = {executor.submit(recognizer.transcribe, audio[start:end]): i for i, (start, end) in enumerate(spans)}
+    segments = [None] * len(spans)
+    errors = []
+    for done, future in enumerate(as_completed(futures), 1):
+        index = futures[future]
+        start, end = spans[index]
+        segment = {"start": start / 1000, "end": end / 1000, "text": ""}
+        try:
+            segment["text"] = (future.result() or "").strip()
+        except Exception as e:
+            logger.warning(f"Segment {start / 1000:.1f}-{end / 1000:.1f}s failed: {e}")
+            segment["error"] = str(e)
+            errors.append(e)
+        segments[index] = segment
+        if progress:
+            progress(done, len(spans))
+
+    if len(errors) == len(spans):
+        raise errors[0]
+    return " ".join(s["text"] for s in segments if s["text"]), segments
@@ -0,0 +1,129 @@
+import hashlib
+import io
+import logging
+import os
+import tempfile
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSpool:
+    """Upload buffer that stays in memory up to max_memory bytes, then rolls over to a unique temp file
+
+    The size limit is enforced on every write, so an oversized upload is rejected
+    while it streams in rather than after the whole body has been buffered. The
+    SHA-256 of the content is computed along the way.
+    """
+
+    def __init__(self, max_memory, max_size=None, dir=None, suffix=''):
+        self.max_memory = max_memory
+        self.max_size = max_size
+        self.dir = dir
+        self.suffix = suffix
+        self.size = 0
+        self.path = None
+        self._file = io.BytesIO()
+        self._detached = False
+        self._digest = hashlib.sha256()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            raise RequestEntityTooLarge(f"Upload exceeds the {self.max_size} byte limit")
+        if self.path is None and self.size > self.max_memory:
+            self._rollover()
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def _rollover(self):
+        fd, path = tempfile.mkstemp(prefix='upload_', suffix=self.suffix, dir=self.dir)
+        disk_file = os.fdopen(fd, 'w+b')
+        disk_file.write(self._file.getbuffer())
+        self._file.close()
+        self._file = disk_file
+        self.path = path
+        logger.debug(f"Upload spool rolled over to {path}")
+
+    def sha256(self):
+        """Hex SHA-256 of everything written so far"""
+        return self._digest.hexdigest()
+
+    @property
+    def in_memory(self):
+        return self.path is None
+
+    def source(self):
+        """Return something extractors can open: the temp file path, or the bytes when in memory"""
+        if self.path is not None:
+            self._file.flush()
+            return self.path
+        return self._file.getvalue()
+
+    def detach(self):
+        """Hand the spooled data to a new owner; closing the spool will no longer delete the temp file"""
+        source = self.source()
+        self._detached = True
+        return source
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if self.path is not None and not self._detached and os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def __getattr__(self, name):
+        # read, seek, tell, readline, flush, ... are served by the underlying buffer
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SpoolingRequest(Request):
+    """Request class that streams uploaded files into an UploadSpool"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = current_app.config
+        suffix = os.path.splitext(filename or '')[1]
+        return UploadSpool(
+            max_memory=config.get('UPLOAD_SPOOL_MEMORY_LIMIT', 5 * 1024 * 1024),
+            max_size=config.get('MAX_CONTENT_LENGTH'),
+            dir=config.get('UPLOAD_FOLDER'),
+            suffix=suffix
+        )
+
+    def spool_body(self, suffix='', chunk_size=64 * 1024):
+        """Stream the raw request body into an UploadSpool, enforcing the upload size limit as it arrives"""
+        max_size = current_app.config.get('MAX_CONTENT_LENGTH')
+        if max_size is not None and self.content_length is not None and self.content_length > max_size:
+            raise RequestEntityTooLarge(f"Upload exceeds the {max_size} byte limit")
+        spool = self._get_file_stream(self.content_length, self.mimetype, f"body{suffix}")
+        try:
+            while True:
+                chunk = self.stream.read(chunk_size)
+                if not chunk:
+                    break
+                spool.write(chunk)
+        except Exception:
+            spool.close()
+            raise
+        return spool
+
+
+def remove_source(source):
+    """Delete a detached spool source if it lives on disk"""
+    if isinstance(source, str) and os.path.exists(source):
+        os.remove(source)
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DiskLRUStore:
+    """Byte values as files in a directory, bounded by entry count and total size
+
+    Each value is written under a temporary name and renamed into place, so
+    readers never see a partial file and worker processes can share the
+    directory. A file's mtime is its store time, used for ttl, and its atime the
+    last read; past max_entries or max_bytes the least recently read go first.
+    Keys must satisfy is_valid_key, since they become file names.
+    """
+
+    def __init__(self, directory, suffix, is_valid_key, max_entries=None, max_bytes=None, ttl=None):
+        self.directory = directory
+        self.suffix = suffix
+        self.is_valid_key = is_valid_key
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        if not self.is_valid_key(key):
+            raise ValueError(f"Invalid key for {self.directory}: {key!r}")
+        root = os.path.realpath(self.directory)
+        path = os.path.realpath(os.path.join(root, f"{key}{self.suffix}"))
+        if os.path.dirname(path) != root:
+            raise ValueError(f"Key escapes the store directory: {key!r}")
+        return path
+
+    def _entries(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                yield entry
+
+    def _expired(self, stat, now):
+        return bool(self.ttl) and now - stat.st_mtime > self.ttl
+
+    def contains(self, key):
+        """Whether a live value is stored under key, without reading it or counting as an access"""
+        try:
+            return not self._expired(os.stat(self._path(key)), time.time())
+        except FileNotFoundError:
+            return False
+
+    def read(self, key):
+        """The bytes stored under key, or None if missing or expired"""
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            now = time.time()
+            if self._expired(stat, now):
+                self.remove(key)
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Record the access explicitly; noatime mounts would not do it for us
+            os.utime(path, (now, stat.st_mtime))
+        except FileNotFoundError:
+            return None
+        return data
+
+    def write(self, key, data):
+        path = self._path(key)
+        with self._lock:
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            self._evict()
+
+    def remove(self, key):
+        self._remove(self._path(key))
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        now = time.time()
+        entries = []
+        total = 0
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if self._expired(stat, now):
+                self._remove(entry.path)
+                continue
+            entries.append((stat.st_atime, stat.st_size, entry.path))
+            total += stat.st_size
+        entries.sort()
+        count = len(entries)
+        for _, size, path in entries:
+            over_count = self.max_entries is not None and count > self.max_entries
+            over_size = self.max_bytes is not None and total > self.max_bytes
+            if not (over_count or over_size):
+                break
+            self._remove(path)
+            count -= 1
+            total -= size
+            logger.debug(f"Evicted {path}")
+
+    def usage(self):
+        """(entries, bytes) currently stored"""
+        entries, size = 0, 0
+        for entry in self._entries():
+            try:
+                size += entry.stat().st_size
+                entries += 1
+            except FileNotFoundError:
+                continue
+        return entries, size
+
+    def __len__(self):
+        return self.usage()[0]
+
+
+class SQLiteTable:
+    """JSON values by key in one table of a SQLite file, bounded by entry count and age
+
+    Rows record when they were stored (for ttl) and last read; past max_entries
+    the least recently read go first. Every call opens its own connection and
+    the file is in WAL mode, so worker processes can share it and reads do not
+    wait for writes.
+    """
+
+    COLUMNS = ["key", "value", "stored_at", "accessed_at"]
+
+    def __init__(self, path, table, max_entries=None, ttl=None):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            if columns and columns != self.COLUMNS:
+                # Written by an older layout; everything kept here can be recomputed or resubmitted
+                logger.warning(f"Recreating {table} in {path} with the current layout")
+                conn.execute(f"DROP TABLE {table}")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_stored_at ON {table} (stored_at)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key, touch=True):
+        """The value stored under key, or None if missing or expired; touch=False leaves its LRU position alone"""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, stored_at = row
+            if self.ttl and now - stored_at > self.ttl:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            if touch:
+                conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key, value, stored_at=None):
+        now = time.time()
+        stored_at = now if stored_at is None else stored_at
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), stored_at, now)
+            )
+            if self.max_entries is not None:
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN ("
+                    f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            if self.ttl:
+                conn.execute(f"DELETE FROM {self.table} WHERE stored_at < ?", (now - self.ttl,))
+
+    def purge(self, cutoff):
+        """Drop rows stored before cutoff"""
+        with self._lock, self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE stored_at < ?", (cutoff,))
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self._lock, self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
@@ -0,0 +1,96 @@
+import json
+
+
+class IncrementalJSONParser:
+    """Parse a JSON object as it streams in, emitting values as soon as they are complete
+
+    Top-level fields are emitted as (key, value, False) once their value closes.
+    Top-level arrays are not emitted whole; each element is emitted as
+    (key, item, True) the moment it closes, which lets callers forward quiz
+    questions or flashcards one by one while the model is still writing.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key = None
+        self._key_start = None
+        self._track_start = None
+        self._track_kind = None
+        self._track_depth = None
+
+    def _at_value_position(self):
+        depth = len(self._stack)
+        if depth == 1:
+            return not self._expect_key and self._key is not None
+        return depth == 2 and self._stack[-1] == '['
+
+    def _begin(self, pos, kind):
+        self._track_start = pos
+        self._track_kind = kind
+        self._track_depth = len(self._stack)
+
+    def _finish(self, end, events):
+        value = json.loads(self.text[self._track_start:end])
+        events.append((self._key, value, self._track_depth == 2))
+        self._track_start = self._track_kind = self._track_depth = None
+
+    def feed(self, chunk):
+        """Consume the next piece of text and return the values it completed"""
+        events = []
+        start = len(self.text)
+        self.text += chunk
+        text = self.text
+        for pos in range(start, len(text)):
+            c = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._key = json.loads(text[self._key_start:pos + 1])
+                        self._key_start = None
+                    elif self._track_kind == 'string' and len(self._stack) == self._track_depth:
+                        self._finish(pos + 1, events)
+                continue
+
+            # Numbers, booleans and null end at the next delimiter
+            if self._track_kind == 'scalar' and (c in ',}]' or c.isspace()):
+                self._finish(pos, events)
+
+            if c == '"':
+                self._in_string = True
+                if len(self._stack) == 1 and self._expect_key:
+                    self._key_start = pos
+                    self._expect_key = False
+                elif self._track_kind is None and self._at_value_position():
+                    self._begin(pos, 'string')
+            elif c in '{[':
+                # Arrays directly under the root are streamed item by item instead of tracked whole
+                if self._track_kind is None and self._at_value_position() and not (len(self._stack) == 1 and c == '['):
+                    self._begin(pos, 'container')
+                self._stack.append(c)
+                if len(self._stack) == 1:
+                    self._expect_key = True
+            elif c in '}]':
+                if self._stack:
+                    self._stack.pop()
+                if self._track_kind == 'container' and len(self._stack) == self._track_depth:
+                    self._finish(pos + 1, events)
+            elif c == ',':
+                if len(self._stack) == 1:
+                    self._expect_key = True
+            elif c != ':' and not c.isspace():
+                if self._track_kind is None and self._at_value_position():
+                    self._begin(pos, 'scalar')
+        return events
+
+    def result(self):
+        """Parse the complete document once the stream has ended"""
+        return json.loads(self.text)
@@ -0,0 +1,267 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Returns deterministic, schema-shaped answers for the analysis, quiz, flashcard
+and transcript prompts used by the backend, with configurable latency, rate
+limiting and failure injection. Point the backend at it with:
+
+    python stubs/openai_stub.py --port 8001 --latency 0.2 --rpm 60
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub python app.py
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubState:
+    """Configuration and counters shared by all request handlers"""
+
+    def __init__(self, latency=0.0, rpm=0, fail_every=0, stream_delay=0.0):
+        self.latency = latency
+        self.stream_delay = stream_delay
+        self.rpm = rpm
+        self.fail_every = fail_every
+        self.lock = threading.Lock()
+        self.window = []
+        self.requests = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompt_tokens = 0
+
+    def admit(self):
+        """Count a request; returns an HTTP status to fail it with, or None to serve it"""
+        with self.lock:
+            self.requests += 1
+            now = time.monotonic()
+            self.window = [t for t in self.window if now - t < 60]
+            if self.rpm and len(self.window) >= self.rpm:
+                self.rate_limited += 1
+                return 429
+            self.window.append(now)
+            if self.fail_every and self.requests % self.fail_every == 0:
+                self.failed += 1
+                return 500
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return None
+
+    def done(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests, "rate_limited": self.rate_limited, "failed": self.failed,
+                    "max_in_flight": self.max_in_flight, "prompt_tokens": self.prompt_tokens}
+
+
+def _words(text, seed, count):
+    """Pick a deterministic run of words from the prompt's source text"""
+    words = re.findall(r"[A-Za-z]{4,}", text) or ["content"]
+    start = int(seed, 16) % len(words)
+    return [words[(start + i * 7) % len(words)] for i in range(count)]
+
+
+def _source_text(prompt):
+    """The document part of a prompt follows its final 'to ...:' / 'transcript:' heading"""
+    match = re.search(r"(?:Text to [^\n]*|transcript|transcription to analyze|Partial analyses):\s*(.*)$", prompt, re.S)
+    return match.group(1) if match else prompt
+
+
+def build_content(prompt, json_mode):
+    """Build a deterministic answer shaped like what the prompt asks for"""
+    seed = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    source = _source_text(prompt)
+
+    if not json_mode:
+        return " ".join(_words(source, seed, 120)).capitalize() + "."
+
+    questions = '"questions"' in prompt
+    flashcards = '"flashcards"' in prompt
+    if questions and flashcards:
+        # Combined study pack: analysis, quiz and flashcards in one object
+        pack = _analysis(source, seed)
+        pack.update(_questions(prompt, source, seed))
+        pack.update(_flashcards(prompt, source, seed))
+        return json.dumps(pack)
+    if questions:
+        return json.dumps(_questions(prompt, source, seed))
+    if flashcards:
+        return json.dumps(_flashcards(prompt, source, seed))
+    return json.dumps(_analysis(source, seed))
+
+
+def _questions(prompt, source, seed):
+    count = int((re.search(r"(?:precisely|exactly) (\d+) (?:quiz )?questions", prompt, re.I) or [None, 5])[1])
+    questions = []
+    for i in range(count):
+        words = _words(source, seed[i % 60:] + str(i), 12)
+        kind = ("multiple-choice", "true-false", "open-ended")[i % 3]
+        if kind == "multiple-choice":
+            questions.append({"type": kind, "question": f"Which term completes: {' '.join(words[:8])} ____?",
+                              "options": words[8:12], "answer": words[8], "explanation": " ".join(words)})
+        elif kind == "true-false":
+            questions.append({"type": kind, "question": " ".join(words).capitalize() + ".",
+                              "answer": i % 2 == 0, "explanation": " ".join(words[:6])})
+        else:
+            questions.append({"type": kind, "question": f"Explain the role of {words[0]}.",
+                              "context": " ".join(words), "suggested_answer": " ".join(words),
+                              "key_points": words[:3]})
+    return {"questions": questions}
+
+
+def _flashcards(prompt, source, seed):
+    count = int((re.search(r"exactly (\d+) (?:high-quality )?flashcards", prompt, re.I) or [None, 10])[1])
+    cards = []
+    for i in range(count):
+        words = _words(source, seed[i % 60:] + str(i), 12)
+        cards.append({"front": f"What is {words[0]}?", "back": " ".join(words).capitalize() + ".",
+                      "key_term": words[0], "context": " ".join(words[:6]), "example": " ".join(words[6:]),
+                      "related_concepts": words[1:3]})
+    return {"flashcards": cards}
+
+
+def _analysis(source, seed):
+    words = _words(source, seed, 60)
+    return {
+        "summary": " ".join(words[:30]).capitalize() + ".",
+        "key_points": [" ".join(words[i:i + 8]).capitalize() + "." for i in range(0, 40, 8)],
+        "key_concepts": sorted(set(w.lower() for w in words))[:10],
+        "word_count": len(source.split()),
+        "sentence_count": max(1, source.count('.')),
+        "subject": words[0]
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/stats'):
+            self._send_json(200, self.server.state.stats())
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        state = self.server.state
+        status = state.admit()
+        if status == 429:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                            {"Retry-After": "1"})
+            return
+        if status == 500:
+            self._send_json(500, {"error": {"message": "Injected failure", "type": "server_error"}})
+            return
+
+        try:
+            if state.latency:
+                time.sleep(state.latency)
+            prompt = "\n".join(m.get("content", "") for m in request.get("messages", []) if m.get("role") == "user")
+            with state.lock:
+                state.prompt_tokens += len(prompt) // 4
+            json_mode = (request.get("response_format") or {}).get("type") == "json_object"
+            content = build_content(prompt, json_mode)
+            if request.get("stream"):
+                self._stream(request, content)
+                return
+            prompt_tokens = len(prompt) // 4
+            completion_tokens = len(content) // 4
+            self._send_json(200, {
+                "id": "chatcmpl-stub-" + hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12],
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop", "logprobs": None}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens}
+            })
+        finally:
+            state.done()
+
+
+    def _stream(self, request, content, piece_size=16):
+        """Send the answer as chat.completion.chunk server-sent events, a few characters at a time"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        created = int(time.time())
+        pieces = [content[i:i + piece_size] for i in range(0, len(content), piece_size)]
+        delay = self.server.state.stream_delay
+        for i, piece in enumerate(pieces + [None]):
+            delta = {"content": piece} if piece is not None else {}
+            if i == 0:
+                delta["role"] = "assistant"
+            chunk = {
+                "id": "chatcmpl-stub-stream",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None if piece is not None else "stop",
+                             "logprobs": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            if delay and piece is not None:
+                time.sleep(delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_stub_server(host='127.0.0.1', port=0, latency=0.0, rpm=0, fail_every=0, stream_delay=0.0):
+    """Start the stub on a background thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(latency=latency, rpm=rpm, fail_every=fail_every, stream_delay=stream_delay)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before answering')
+    parser.add_argument('--rpm', type=int, default=0, help='requests per minute before answering 429')
+    parser.add_argument('--fail-every', type=int, default=0, help='answer every Nth request with a 500')
+    parser.add_argument('--stream-delay', type=float, default=0.0, help='seconds between streamed chunks')
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.host, args.port, args.latency, args.rpm, args.fail_every,
+                                         args.stream_delay)
+    print(f"OpenAI stub listening at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
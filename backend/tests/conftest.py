@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+# Backend modules are imported flat, as app.py does
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope="session")
+def backend(tmp_path_factory):
+    """The app module, imported once against the OpenAI stub with its caches in a temporary directory
+
+    Services are built from the environment at import, so it is set here first.
+    Tests that need the local generators patch backend.openai_api_key to None.
+    """
+    from stubs.openai_stub import start_stub_server
+
+    server, base_url = start_stub_server()
+    cache_dir = tmp_path_factory.mktemp("cache")
+    saved = dict(os.environ)
+    os.environ.update({
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": base_url,
+        "PDF_CACHE_DIR": str(cache_dir / "pdf_text"),
+        "NLTK_DATA_CHECK": "off",
+        "TRANSCRIPT_PROVIDER": "local",
+        "LOCAL_TRANSCRIPT_DIR": str(cache_dir / "transcripts")
+    })
+    import app
+    app.stub_server = server
+    yield app
+    os.environ.clear()
+    os.environ.update(saved)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(backend):
+    return backend.create_app().test_client()
@@ -0,0 +1,74 @@
+import asyncio
+
+import httpx
+import pytest
+
+TEXT = ("Photosynthesis converts light energy into chemical energy in plants. Chlorophyll in the "
+        "chloroplasts absorbs red and blue light. The light reactions split water and release oxygen. "
+        "The Calvin cycle then fixes carbon dioxide into sugars using ATP and NADPH. ")
+
+
+@pytest.fixture
+def asgi_app(backend):
+    import async_api
+    return async_api.create_asgi_app(backend.create_app())
+
+
+def post_async(asgi_app, path, body):
+    async def run():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, json=body)
+
+    response = asyncio.run(run())
+    return response.status_code, response.json()
+
+
+def post_sync(client, path, body):
+    response = client.post(path, json=body)
+    return response.status_code, response.get_json()
+
+
+def stub_requests(backend):
+    return backend.stub_server.state.stats()["requests"]
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/api/process-text", {"text": TEXT}),
+    ("/api/generate-quiz", {"text": TEXT, "num_questions": 4}),
+    ("/api/generate-flashcards", {"text": TEXT, "num_cards": 6}),
+])
+def test_async_routes_match_sync(backend, client, asgi_app, path, body):
+    backend.analysis_cache.clear()
+    before = stub_requests(backend)
+    sync_result = post_sync(client, path, body)
+    sync_calls = stub_requests(backend) - before
+
+    backend.analysis_cache.clear()
+    before = stub_requests(backend)
+    async_result = post_async(asgi_app, path, body)
+
+    assert sync_result[0] == 200
+    assert async_result == sync_result
+    assert stub_requests(backend) - before == sync_calls
+
+
+def test_async_map_reduce_matches_sync(backend, client, asgi_app, monkeypatch):
+    # Small chunks and a small reduce window force several chunks and more than one reduce round
+    monkeypatch.setattr(backend, "ANALYSIS_CHUNK_TOKENS", 60)
+    monkeypatch.setattr(backend.token_budgeter, "prompt_room", lambda task, system: 700)
+    body = {"text": TEXT * 12}
+
+    backend.analysis_cache.clear()
+    before = stub_requests(backend)
+    sync_result = post_sync(client, "/api/process-text", body)
+    sync_calls = stub_requests(backend) - before
+
+    backend.analysis_cache.clear()
+    before = stub_requests(backend)
+    async_result = post_async(asgi_app, "/api/process-text", body)
+
+    assert sync_calls > len(backend.analysis_chunks(body["text"])) + 1
+    assert sync_result[0] == 200
+    assert async_result == sync_result
+    assert stub_requests(backend) - before == sync_calls
@@ -0,0 +1,113 @@
+import sqlite3
+import time
+
+import pytest
+
+from cache import AnalysisCache, LRUCache, SQLiteCache, make_cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+
+def test_cache_key_ignores_whitespace_but_not_model_or_version():
+    key = make_cache_key("Cells  divide.\n", "model-a", "v1")
+    assert key == make_cache_key(" Cells divide.", "model-a", "v1")
+    assert key != make_cache_key("Cells divide.", "model-b", "v1")
+    assert key != make_cache_key("Cells divide.", "model-a", "v2")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_lru_expires_entries(clock):
+    cache = LRUCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    clock.now += 59
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_sqlite_tier_bounds_and_expires(tmp_path, clock):
+    disk = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl=60, max_entries=2)
+    disk.set("a", {"n": 1})
+    clock.now += 1
+    disk.set("b", {"n": 2})
+    clock.now += 1
+    assert disk.get("a") == {"n": 1}
+    clock.now += 1
+    disk.set("c", {"n": 3})
+    assert disk.get("b") is None
+    assert len(disk) == 2
+
+    clock.now += 60
+    assert disk.get("a") is None
+    clock.now += 1
+    disk.set("d", {"n": 4})
+    assert disk.get("c") is None
+    assert len(disk) == 1
+
+
+def test_two_tiers(tmp_path):
+    path = str(tmp_path / "analysis.sqlite3")
+    cache = AnalysisCache(max_size=1, disk_path=path)
+    cache.set("a", {"summary": "first"})
+    cache.set("b", {"summary": "second"})
+
+    # "a" fell out of memory but is still on disk, and is promoted back
+    assert cache.get("a") == {"summary": "first"}
+    assert cache.get("a") == {"summary": "first"}
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["disk_hits"], stats["misses"]) == (2, 1, 1)
+
+    # Another process with the same file sees the entries
+    assert AnalysisCache(max_size=1, disk_path=path).get("b") == {"summary": "second"}
+
+
+def test_results_are_copies():
+    cache = AnalysisCache()
+    result = {"key_points": ["one"]}
+    cache.set("a", result)
+    result["key_points"].append("changed by the caller")
+    cache.get("a")["key_points"].append("changed by a reader")
+    assert cache.get("a") == {"key_points": ["one"]}
+
+
+def test_unusable_disk_path_falls_back_to_memory(tmp_path):
+    (tmp_path / "file").write_text("")
+    cache = AnalysisCache(disk_path=str(tmp_path / "file" / "analysis.sqlite3"))
+    assert cache.disk is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+
+def test_old_sqlite_layout_is_replaced(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)")
+        conn.execute("INSERT INTO cache VALUES ('a', '1', 0)")
+    disk = SQLiteCache(path)
+    assert len(disk) == 0
+    disk.set("a", 2)
+    assert disk.get("a") == 2
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from documents import DiskDocumentBackend, create_document_store, is_document_id, make_document_id
+
+MALFORMED_IDS = [
+    None,
+    42,
+    "",
+    "../victim",
+    "../" * 10 + "etc/passwd",
+    "0" * 31,
+    "0" * 33,
+    "A" * 32,
+    "g" * 32,
+    "0" * 31 + "/",
+    "0" * 32 + "\n",
+]
+
+
+def test_generated_ids_are_valid():
+    assert is_document_id(make_document_id("some text"))
+
+
+@pytest.mark.parametrize("value", MALFORMED_IDS)
+def test_malformed_ids_are_rejected(value):
+    assert not is_document_id(value)
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite", "disk"])
+def test_store_round_trip_and_malformed_lookups(tmp_path, backend):
+    path = tmp_path / ("documents.sqlite3" if backend == "sqlite" else "documents")
+    store = create_document_store(backend, path=str(path))
+
+    document_id = store.put("Cells are the basic unit of life.", title="Biology")
+    assert store.get(document_id) == {"text": "Cells are the basic unit of life.", "title": "Biology"}
+
+    for value in MALFORMED_IDS:
+        assert store.get(value) is None
+    stats = store.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == len(MALFORMED_IDS)
+
+
+def test_disk_backend_stays_in_its_directory(tmp_path):
+    directory = tmp_path / "documents"
+    victim = tmp_path / "victim.json"
+    victim.write_text('{"text": "outside"}')
+    backend = DiskDocumentBackend(str(directory))
+
+    with pytest.raises(ValueError):
+        backend.get("../victim")
+    with pytest.raises(ValueError):
+        backend.set("../victim", {"text": "overwritten"})
+
+    assert victim.read_text() == '{"text": "outside"}'
+    assert os.listdir(directory) == []
+
+
+@pytest.mark.parametrize("path", ["/api/generate-quiz", "/api/generate-flashcards", "/api/study-pack"])
+def test_routes_reject_malformed_document_ids(client, path):
+    for value in ["../victim", "0" * 31, "g" * 32, 42]:
+        response = client.post(path, json={"document_id": value})
+        assert response.status_code == 400
+        assert "document_expired" not in response.get_json()
+
+
+@pytest.mark.parametrize("path", ["/api/generate-quiz", "/api/generate-flashcards", "/api/study-pack"])
+def test_routes_report_unknown_documents_as_expired(client, path):
+    response = client.post(path, json={"document_id": make_document_id("never stored")})
+    assert response.status_code == 404
+    assert response.get_json()["document_expired"] is True
+
+
+def test_routes_resolve_stored_documents(backend, client):
+    document_id = backend.document_store.put("Enzymes lower the activation energy of reactions. " * 5)
+    response = client.post("/api/generate-quiz", json={"document_id": document_id, "num_questions": 2})
+    assert response.status_code == 200
+    assert response.get_json()["questions"]
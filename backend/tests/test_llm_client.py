@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+
+import openai
+import pytest
+
+from llm_client import LLMGateway, RateLimiter
+from stubs.openai_stub import start_stub_server
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kwargs):
+        server, base_url = start_stub_server(**kwargs)
+        servers.append(server)
+        return server, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def make_gateway(base_url, **kwargs):
+    # No jitter to wait for: backoff_base=0 retries immediately
+    kwargs.setdefault("backoff_base", 0.0)
+    return LLMGateway("stub", base_url=base_url, timeout=5.0, **kwargs)
+
+
+def test_retries_injected_server_error(stub):
+    server, base_url = stub(fail_every=2)
+    gateway = make_gateway(base_url, max_retries=3)
+
+    assert gateway.chat_text("analysis", "system", "first")
+    assert gateway.chat_text("analysis", "system", "second")
+
+    assert server.state.stats()["failed"] == 1
+    stats = gateway.stats()
+    assert stats["requests"] == 3
+    assert stats["retries"] == 1
+    assert stats["failures"] == 0
+    assert stats["in_flight"] == 0
+
+
+def test_gives_up_after_max_retries(stub):
+    server, base_url = stub(fail_every=1)
+    gateway = make_gateway(base_url, max_retries=2)
+
+    with pytest.raises(openai.InternalServerError):
+        gateway.chat_text("analysis", "system", "prompt")
+
+    assert server.state.stats()["requests"] == 3
+    stats = gateway.stats()
+    assert stats["retries"] == 2
+    assert stats["failures"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_retry_after_is_capped(stub):
+    # The stub asks for Retry-After: 1 once its per-minute budget is spent
+    server, base_url = stub(rpm=1)
+    gateway = make_gateway(base_url, max_retries=2, backoff_cap=0.05)
+    gateway.chat_text("analysis", "system", "allowed")
+
+    start = time.monotonic()
+    with pytest.raises(openai.RateLimitError):
+        gateway.chat_text("analysis", "system", "throttled")
+
+    assert time.monotonic() - start < 1.0
+    assert server.state.stats()["rate_limited"] == 3
+
+
+def test_async_retries_injected_server_error(stub):
+    server, base_url = stub(fail_every=2)
+    gateway = make_gateway(base_url, max_retries=3)
+
+    async def run():
+        return [await gateway.achat_text("analysis", "system", prompt) for prompt in ("first", "second")]
+
+    assert all(asyncio.run(run()))
+    assert server.state.stats()["failed"] == 1
+    assert gateway.stats()["retries"] == 1
+    assert gateway.stats()["in_flight"] == 0
+
+
+def test_concurrency_cap_is_shared_by_threads_and_event_loops(stub):
+    server, base_url = stub(latency=0.05)
+    gateway = make_gateway(base_url, max_concurrent=3)
+
+    async def burst():
+        await asyncio.gather(*[gateway.achat_text("analysis", "system", f"async {i}") for i in range(6)])
+
+    workers = [threading.Thread(target=gateway.chat_text, args=("analysis", "system", f"sync {i}"))
+               for i in range(6)]
+    # Each thread below runs its own event loop
+    workers += [threading.Thread(target=asyncio.run, args=(burst(),)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    stats = server.state.stats()
+    assert stats["requests"] == 18
+    assert stats["max_in_flight"] <= 3
+    assert gateway.limiter.in_flight() == 0
+
+
+def test_slot_wait_times_out_without_leaking():
+    limiter = RateLimiter(max_concurrent=1)
+    assert limiter.acquire(1)
+    assert not limiter.acquire(0.01)
+    assert not asyncio.run(limiter.acquire_async(0.01))
+    limiter.release()
+    assert limiter.in_flight() == 0
+    assert limiter.acquire(0.01)
+    limiter.release()
+
+
+def test_cancelled_coroutine_gives_up_its_place():
+    limiter = RateLimiter(max_concurrent=1)
+    assert limiter.acquire(1)
+
+    async def run():
+        waiting = asyncio.ensure_future(limiter.acquire_async(5))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        limiter.release()
+        return limiter.in_flight()
+
+    assert asyncio.run(run()) == 0
+
+
+def test_released_slot_goes_to_the_waiting_thread():
+    limiter = RateLimiter(max_concurrent=1)
+    assert limiter.acquire(1)
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(limiter.acquire(5)))
+    waiter.start()
+    time.sleep(0.01)
+    limiter.release()
+    waiter.join(5)
+    assert acquired == [True]
+    assert limiter.in_flight() == 1
+    limiter.release()
@@ -0,0 +1,85 @@
+import hashlib
+import os
+
+import pytest
+
+from pdf_cache import PDFTextCache
+
+
+def digest_of(name):
+    return hashlib.sha256(name.encode('utf-8')).hexdigest()
+
+
+def pages_of(size):
+    # Random hex compresses to about half: an entry of pages_of(2000) takes about 2300 bytes
+    return [os.urandom(size // 2).hex() for _ in range(2)]
+
+
+def test_hit_and_miss(tmp_path):
+    cache = PDFTextCache(str(tmp_path), max_bytes=1024 * 1024)
+    digest = digest_of("lecture.pdf")
+
+    assert cache.get(digest) is None
+    assert not cache.contains(digest)
+    cache.set(digest, ["Page one", "Page two"])
+
+    assert cache.contains(digest)
+    assert cache.get(digest) == ["Page one", "Page two"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_evicts_least_recently_read_past_max_bytes(tmp_path):
+    cache = PDFTextCache(str(tmp_path), max_bytes=5000)
+    first, second, third = digest_of("first"), digest_of("second"), digest_of("third")
+    cache.set(first, pages_of(2000))
+    cache.set(second, pages_of(2000))
+    # Reading the first makes the second the least recently used
+    os.utime(cache.store._path(second), (1, 1))
+    assert cache.get(first) is not None
+
+    cache.set(third, pages_of(2000))
+
+    assert cache.contains(first) and cache.contains(third)
+    assert not cache.contains(second)
+    assert cache.stats()["bytes"] <= 5000
+
+
+def test_entries_larger_than_the_cache_are_skipped(tmp_path):
+    cache = PDFTextCache(str(tmp_path), max_bytes=1000)
+    cache.set(digest_of("huge"), pages_of(4000))
+    assert cache.stats()["entries"] == 0
+
+
+def test_unreadable_entry_is_discarded(tmp_path):
+    cache = PDFTextCache(str(tmp_path), max_bytes=1024 * 1024)
+    digest = digest_of("broken")
+    cache.store.write(digest, b"not zlib")
+
+    assert cache.get(digest) is None
+    assert not cache.contains(digest)
+
+
+def test_disabled_cache(tmp_path):
+    cache = PDFTextCache(str(tmp_path / "off"), max_bytes=0)
+    cache.set(digest_of("x"), ["text"])
+    assert cache.get(digest_of("x")) is None
+    assert not os.path.exists(tmp_path / "off")
+
+
+def test_rejects_non_digest_keys(tmp_path):
+    cache = PDFTextCache(str(tmp_path), max_bytes=1024)
+    with pytest.raises(ValueError):
+        cache.get("../" + digest_of("x")[:61])
+
+
+def test_pdf_cache_route(backend, client):
+    digest = digest_of("route.pdf")
+
+    assert client.get(f"/api/pdf-cache/{digest}").status_code == 404
+    backend.pdf_text_cache.set(digest, ["Cached page"])
+    response = client.get(f"/api/pdf-cache/{digest.upper()}")
+    assert response.status_code == 200
+    assert response.get_json() == {"sha256": digest, "cached": True}
+
+    assert client.get("/api/pdf-cache/not-a-digest").status_code == 400
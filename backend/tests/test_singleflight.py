@@ -0,0 +1,100 @@
+import asyncio
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_followers_get_their_own_copy():
+    flight = SingleFlight("test")
+    started = threading.Event()
+    release = threading.Event()
+    results = {}
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return {"items": [1, 2, 3]}
+
+    def leader():
+        result = flight.do("key", compute)
+        # The leader decorates its result while the follower may still be copying
+        result["items"].append("leader")
+        results["leader"] = result
+
+    def follower():
+        results["follower"] = flight.do("key", lambda: pytest.fail("follower ran the computation"))
+
+    threads = [threading.Thread(target=leader)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=follower))
+    threads[1].start()
+    while flight.stats()["coalesced"] < 1:
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results["leader"] == {"items": [1, 2, 3, "leader"]}
+    assert results["follower"] == {"items": [1, 2, 3]}
+    assert flight.stats() == {"calls": 1, "coalesced": 1, "in_flight": 0}
+
+
+def test_followers_see_the_leaders_error():
+    flight = SingleFlight("test")
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    def call():
+        try:
+            flight.do("key", compute)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    while flight.stats()["coalesced"] < 1:
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == ["boom", "boom"]
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight("test")
+    runs = []
+
+    async def compute():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": 42}
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do_async("key", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do_async("key", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        result = await follower
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return result
+
+    result = asyncio.run(run())
+    assert result == {"value": 42}
+    assert runs == [1]
+    assert flight.stats() == {"calls": 1, "coalesced": 1, "in_flight": 0}
@@ -0,0 +1,80 @@
+import os
+import re
+
+import pytest
+
+from storage import DiskLRUStore
+
+KEY = re.compile(r'[a-z]+')
+
+
+def make_store(directory, **kwargs):
+    return DiskLRUStore(str(directory), '.bin', lambda key: isinstance(key, str) and KEY.fullmatch(key) is not None, **kwargs)
+
+
+def test_round_trip_and_missing(tmp_path):
+    store = make_store(tmp_path)
+    assert store.read("missing") is None
+    store.write("alpha", b"value")
+    assert store.read("alpha") == b"value"
+    assert store.contains("alpha")
+    store.remove("alpha")
+    assert not store.contains("alpha")
+
+
+def test_evicts_least_recently_read_past_max_entries(tmp_path):
+    store = make_store(tmp_path, max_entries=2)
+    store.write("alpha", b"1")
+    store.write("beta", b"2")
+    os.utime(store._path("alpha"), (1, 1))
+    os.utime(store._path("beta"), (2, 2))
+    store.read("alpha")
+
+    store.write("gamma", b"3")
+
+    assert store.contains("alpha") and store.contains("gamma")
+    assert not store.contains("beta")
+    assert len(store) == 2
+
+
+def test_expired_entries_are_not_served(tmp_path):
+    store = make_store(tmp_path, ttl=60)
+    store.write("alpha", b"old")
+    os.utime(store._path("alpha"), (0, 0))
+
+    assert not store.contains("alpha")
+    assert store.read("alpha") is None
+    assert not os.path.exists(store._path("alpha"))
+
+
+def test_no_temporary_files_are_left(tmp_path):
+    store = make_store(tmp_path)
+    store.write("alpha", b"1")
+    store.write("alpha", b"2")
+    assert os.listdir(tmp_path) == ["alpha.bin"]
+
+
+@pytest.mark.parametrize("key", ["../alpha", "ALPHA", "", None])
+def test_rejects_invalid_keys(tmp_path, key):
+    store = make_store(tmp_path)
+    with pytest.raises(ValueError):
+        store.write(key, b"x")
+
+
+def test_sqlite_table_shared_by_stores(tmp_path):
+    from jobs import SQLiteJobStore
+    from storage import SQLiteTable
+
+    path = str(tmp_path / "shared.sqlite3")
+    table = SQLiteTable(path, "entries")
+    jobs = SQLiteJobStore(path)
+    table.set("alpha", {"n": 1})
+    jobs.save({"job_id": "job", "status": "queued", "updated_at": 100.0})
+    jobs.save({"job_id": "old", "status": "failed", "updated_at": 10.0})
+
+    assert table.get("alpha") == {"n": 1}
+    assert jobs.load("job")["status"] == "queued"
+    jobs.prune(50.0)
+    assert jobs.load("old") is None
+    assert jobs.load("job") is not None
+    assert len(table) == 1
@@ -0,0 +1,66 @@
+import json
+
+from streaming import IncrementalJSONParser
+
+DOCUMENT = {
+    "title": "Cells \"and\" {membranes}",
+    "score": -1.5e3,
+    "done": True,
+    "missing": None,
+    "meta": {"tags": ["a", "b]"], "depth": {"x": 1}},
+    "questions": [
+        {"question": "What is a cell?", "options": ["a", "b, c"]},
+        "plain item",
+        7,
+        [1, [2]]
+    ],
+    "empty": [],
+    "escaped": "back\\slash \\\" quote é"
+}
+
+
+def expected_events():
+    events = []
+    for key, value in DOCUMENT.items():
+        if isinstance(value, list):
+            events.extend((key, item, True) for item in value)
+        else:
+            events.append((key, value, False))
+    return events
+
+
+def parse(pieces):
+    parser = IncrementalJSONParser()
+    events = []
+    for piece in pieces:
+        events.extend(parser.feed(piece))
+    return parser, events
+
+
+def test_whole_document():
+    text = json.dumps(DOCUMENT, indent=2, ensure_ascii=False)
+    parser, events = parse([text])
+    assert events == expected_events()
+    assert parser.result() == DOCUMENT
+
+
+def test_every_split_point():
+    for indent in (None, 2):
+        text = json.dumps(DOCUMENT, indent=indent, ensure_ascii=False)
+        for split in range(1, len(text)):
+            parser, events = parse([text[:split], text[split:]])
+            assert events == expected_events(), f"split after {text[:split][-20:]!r}"
+            assert parser.result() == DOCUMENT
+
+
+def test_one_character_at_a_time():
+    text = json.dumps(DOCUMENT)
+    parser, events = parse(text)
+    assert events == expected_events()
+
+
+def test_items_are_emitted_as_soon_as_they_close():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"cards": [{"front": "a"}') == [("cards", {"front": "a"}, True)]
+    assert parser.feed(', {"front": "b"') == []
+    assert parser.feed('}]}') == [("cards", {"front": "b"}, True)]
@@ -0,0 +1,66 @@
+import nltk.corpus
+import nltk.tokenize
+import pytest
+
+import text_processing
+from chunking import split_text_into_chunks
+
+TEXT = ("Photosynthesis converts light energy into chemical energy. Chlorophyll absorbs sunlight "
+        "in the chloroplasts! Plants release oxygen as a byproduct of photosynthesis. Doesn't the "
+        "Calvin cycle fix carbon dioxide into sugars? Mitochondria perform cellular respiration.")
+
+
+class _MissingStopwords:
+    def words(self, language):
+        raise LookupError("stopwords not provisioned")
+
+
+@pytest.fixture
+def no_nltk_data(monkeypatch):
+    """Behave as if neither punkt nor the stopwords corpus were provisioned"""
+    def missing(*args, **kwargs):
+        raise LookupError("punkt not provisioned")
+
+    monkeypatch.setattr(nltk.tokenize, "sent_tokenize", missing)
+    monkeypatch.setattr(nltk.tokenize, "word_tokenize", missing)
+    monkeypatch.setattr(nltk.corpus, "stopwords", _MissingStopwords())
+    text_processing._nltk_tokenizers.cache_clear()
+    text_processing.get_stop_words.cache_clear()
+    yield
+    text_processing._nltk_tokenizers.cache_clear()
+    text_processing.get_stop_words.cache_clear()
+
+
+def test_regex_fallback_tokenizers(no_nltk_data):
+    sentences = text_processing.split_sentences(TEXT)
+    assert len(sentences) == 5
+    assert sentences[1] == "Chlorophyll absorbs sunlight in the chloroplasts!"
+    assert text_processing.split_words(sentences[3]) == [
+        "Doesn't", "the", "Calvin", "cycle", "fix", "carbon", "dioxide", "into", "sugars", "?"]
+    assert text_processing.get_stop_words() is text_processing.FALLBACK_STOP_WORDS
+
+
+def test_processed_document_without_nltk_data(no_nltk_data):
+    document = text_processing.ProcessedDocument(TEXT)
+    assert len(document.sentences) == 5
+    assert "Photosynthesis" in document.candidate_terms
+    assert "the" not in document.frequencies
+    assert document.term_index["photosynthesis"] == [0, 2]
+
+
+def test_chunking_without_nltk_data(no_nltk_data):
+    paragraph = " ".join([TEXT] * 40)
+    chunks = split_text_into_chunks(paragraph, max_tokens=200)
+    assert len(chunks) > 1
+    assert all(chunk.endswith((".", "!", "?")) for chunk in chunks)
+
+
+@pytest.mark.parametrize("path, field", [("/api/generate-quiz", "questions"),
+                                         ("/api/generate-flashcards", "flashcards")])
+def test_local_generators_without_nltk_data(no_nltk_data, monkeypatch, backend, client, path, field):
+    monkeypatch.setattr(backend, "openai_api_key", None)
+    # A text of its own, so no document tokenized with NLTK by another test is reused
+    text = TEXT + " Without provisioned data the regex tokenizers are used."
+    response = client.post(path, json={"text": text, "num_questions": 3, "num_cards": 3})
+    assert response.status_code == 200
+    assert response.get_json()[field]
@@ -0,0 +1,109 @@
+import pytest
+
+from token_budget import TokenBudgeter, count_tokens, trim_to_tokens
+
+SENTENCE = "The mitochondria produce most of the chemical energy needed by the cell. "
+LIMITS = {"small": (2000, 500), "big": (100000, 4000)}
+
+
+def make_budgeter(model="small", **kwargs):
+    kwargs.setdefault("model_limits", LIMITS)
+    return TokenBudgeter(lambda task: model, **kwargs)
+
+
+def build_prompt(text):
+    return f"Summarize:\n{text}"
+
+
+def test_trim_cuts_at_a_sentence_boundary():
+    text = SENTENCE * 50
+    trimmed = trim_to_tokens(text, 100)
+    assert count_tokens(trimmed) <= 100
+    assert trimmed.endswith("cell.")
+    # Only whole sentences are dropped, and no more than needed
+    assert count_tokens(trimmed + " " + SENTENCE.strip()) > 100
+
+
+def test_trim_falls_back_to_a_word_boundary():
+    text = "word " * 500
+    trimmed = trim_to_tokens(text, 50)
+    assert count_tokens(trimmed) <= 50
+    assert trimmed.endswith("word")
+
+
+def test_text_that_fits_is_sent_whole():
+    budgeter = make_budgeter()
+    budget = budgeter.plan("analysis", "system", build_prompt, SENTENCE * 3)
+    assert not budget.trimmed
+    assert budget.prompt == build_prompt(SENTENCE * 3)
+    assert budget.params == {"model": "small", "max_tokens": 500}
+
+
+def test_prompt_token_limit_trims_long_text():
+    budgeter = make_budgeter("big", prompt_token_limit=200)
+    budget = budgeter.plan("analysis", "system", build_prompt, SENTENCE * 200)
+    assert budget.trimmed
+    assert count_tokens(budget.text) <= 200
+    assert budget.text.endswith("cell.")
+    assert budgeter.stats()["trimmed"] == 1
+
+
+@pytest.mark.parametrize("task, options, expected", [
+    ("analysis", {}, 800),
+    ("quiz", {"num_questions": 5}, 150 + 5 * 180),
+    ("flashcards", {"num_cards": 10}, 100 + 10 * 130),
+    # More questions than the model can answer in one response are capped at its largest response
+    ("quiz", {"num_questions": 100}, 4000),
+])
+def test_max_tokens_per_task(task, options, expected):
+    budget = make_budgeter("big").plan(task, "system", build_prompt, SENTENCE, **options)
+    assert budget.max_tokens == expected
+
+
+def test_max_tokens_never_exceeds_the_models_largest_response():
+    budget = make_budgeter("small").plan("quiz", "system", build_prompt, SENTENCE, num_questions=10)
+    assert budget.max_tokens == 500
+
+
+def test_text_too_long_for_the_window_is_trimmed_without_a_long_context_model():
+    budgeter = make_budgeter()
+    budget = budgeter.plan("analysis", "system", build_prompt, SENTENCE * 200, ceiling=False)
+    assert budget.model == "small"
+    assert budget.trimmed
+    assert budget.prompt_tokens + budget.max_tokens <= LIMITS["small"][0]
+
+
+def test_text_too_long_for_the_window_goes_to_the_long_context_model():
+    budgeter = make_budgeter(long_context_model="big")
+    text = SENTENCE * 200
+    budget = budgeter.plan("analysis", "system", build_prompt, text, ceiling=False)
+    assert budget.params == {"model": "big", "max_tokens": 800}
+    assert not budget.trimmed
+    assert budget.text == text
+    assert budgeter.stats()["long_context"] == 1
+
+    # Text that fits stays on the task's own model
+    assert budgeter.plan("analysis", "system", build_prompt, SENTENCE).model == "small"
+
+
+def test_prompt_room_uses_the_largest_usable_model():
+    assert make_budgeter(long_context_model="big").prompt_room("analysis", "system") > \
+        make_budgeter().prompt_room("analysis", "system")
+
+
+def test_fingerprint_follows_the_budget_configuration():
+    base = make_budgeter().fingerprint("analysis")
+    assert base == make_budgeter().fingerprint("analysis")
+    assert base != make_budgeter("big").fingerprint("analysis")
+    assert base != make_budgeter(prompt_token_limit=1000).fingerprint("analysis")
+    assert base != make_budgeter(long_context_model="big").fingerprint("analysis")
+    assert base != make_budgeter(model_limits={"small": (4000, 500)}).fingerprint("analysis")
+
+
+def test_analysis_cache_key_changes_with_the_budget(backend, monkeypatch):
+    key = backend.analysis_cache_key(SENTENCE)
+    monkeypatch.setattr(backend.token_budgeter, "long_context_model", "gpt-4o")
+    assert backend.analysis_cache_key(SENTENCE) != key
+    monkeypatch.undo()
+    monkeypatch.setattr(backend, "ANALYSIS_CHUNK_TOKENS", 1000)
+    assert backend.analysis_cache_key(SENTENCE) != key
@@ -0,0 +1,132 @@
+import functools
+import hashlib
+import logging
+import os
+import random
+import re
+
+import metrics
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Tokenized documents are reused across analysis, quiz and flashcard requests for the same text
+_document_cache = LRUCache(max_size=int(os.getenv("PROCESSED_DOCUMENT_CACHE_SIZE", 32)))
+
+
+# Used when the NLTK data is not provisioned and NLTK_DATA_CHECK lets the server start without it
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+_WORD = re.compile(r"\w+(?:'\w+)?|[^\w\s]")
+FALLBACK_STOP_WORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just me more most my myself no nor not
+now of off on once only or other our ours ourselves out over own same she should so some such than that
+the their theirs them themselves then there these they this those through to too under until up very was
+we were what when where which while who whom why will with would you your yours yourself yourselves
+""".split())
+
+
+@functools.lru_cache(maxsize=None)
+def _nltk_tokenizers():
+    """NLTK's (sent_tokenize, word_tokenize) when punkt is provisioned, else None"""
+    from nltk.tokenize import sent_tokenize, word_tokenize
+    try:
+        sent_tokenize("Probe.")
+    except LookupError:
+        logger.warning("NLTK punkt data not provisioned; splitting sentences and words with regular expressions")
+        return None
+    return sent_tokenize, word_tokenize
+
+
+def split_sentences(text):
+    """Split text into sentences, preferring NLTK and falling back to a regex splitter"""
+    tokenizers = _nltk_tokenizers()
+    if tokenizers is None:
+        return [s for s in _SENTENCE_BOUNDARY.split(text) if s.strip()]
+    return tokenizers[0](text)
+
+
+def split_words(sentence):
+    """Split a sentence into word and punctuation tokens, preferring NLTK and falling back to a regex"""
+    tokenizers = _nltk_tokenizers()
+    if tokenizers is None:
+        return _WORD.findall(sentence)
+    return tokenizers[1](sentence)
+
+
+@functools.lru_cache(maxsize=None)
+def get_stop_words():
+    """English stop words, loaded once per process; a built-in list if the NLTK corpus is not provisioned"""
+    from nltk.corpus import stopwords
+    try:
+        return frozenset(stopwords.words('english'))
+    except LookupError:
+        logger.warning("NLTK stopwords data not provisioned; using the built-in stop word list")
+        return FALLBACK_STOP_WORDS
+
+
+def is_candidate_term(word):
+    """Whether a token is worth asking about: alphabetic and longer than four characters"""
+    return len(word) > 4 and word.isalpha()
+
+
+class ProcessedDocument:
+    """Sentences, tokens and term statistics for a text, computed once and shared by the local generators"""
+
+    def __init__(self, text):
+        # NLTK is imported on first use rather than at startup; later imports are dictionary lookups
+        from nltk.probability import FreqDist
+
+        self.text = text
+        self.sentences = split_sentences(text)
+        self.sentence_tokens = [split_words(sentence) for sentence in self.sentences]
+        # Per-sentence candidate terms, in sentence order
+        self.sentence_terms = [[w for w in tokens if is_candidate_term(w)] for tokens in self.sentence_tokens]
+        # Every candidate term occurrence in the document; sampling from it favours frequent terms
+        self.candidate_terms = [w for terms in self.sentence_terms for w in terms]
+        self.word_count = sum(len(tokens) for tokens in self.sentence_tokens)
+
+        stop_words = get_stop_words()
+        self.frequencies = FreqDist(
+            w for tokens in self.sentence_tokens for w in (t.lower() for t in tokens)
+            if w.isalnum() and w not in stop_words
+        )
+
+        # Lowercased token -> ids of the sentences containing it, in document order
+        self.term_index = {}
+        for sentence_id, tokens in enumerate(self.sentence_tokens):
+            for token in set(t.lower() for t in tokens):
+                self.term_index.setdefault(token, []).append(sentence_id)
+
+        # Candidate-term table for quiz distractors, built by quiz_engine on the first quiz for this text
+        self.term_table = None
+
+    def sample_terms(self, k, exclude=()):
+        """Pick up to k distinct candidate terms from the whole document, skipping excluded words"""
+        exclude = set(exclude)
+        picked = []
+        if not self.candidate_terms:
+            return picked
+        # Rejection sampling keeps this independent of document length in the common case
+        for _ in range(k * 10):
+            word = random.choice(self.candidate_terms)
+            if word not in exclude and word not in picked:
+                picked.append(word)
+                if len(picked) == k:
+                    return picked
+        remaining = [w for w in set(self.candidate_terms) if w not in exclude and w not in picked]
+        picked.extend(random.sample(remaining, min(k - len(picked), len(remaining))))
+        return picked
+
+
+def get_processed_document(text):
+    """Return the ProcessedDocument for a text, memoized by content hash"""
+    key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    document = _document_cache.get(key)
+    if document is None:
+        with metrics.span("tokenization"):
+            document = ProcessedDocument(text)
+        _document_cache.set(key, document)
+        logger.info(f"Processed document: {len(document.sentences)} sentences, {document.word_count} tokens")
+    return document
@@ -0,0 +1,303 @@
+"""Token counting and per-task token budgets for model calls.
+
+Prompts are sized in tokens instead of characters. The source text is cut at a
+sentence boundary to what fits beside the instructions and the expected answer
+in the model's context window, up to PROMPT_TOKEN_LIMIT. The answer is capped
+with max_tokens sized for the task, so a call can neither overflow the window
+nor run on longer than its task needs.
+
+Counts come from tiktoken when it is installed and its encoding has been
+provisioned locally; nothing is downloaded while serving. Provision it once,
+as a build or deploy step:
+
+    python token_budget.py              # into backend/tiktoken_cache (or TIKTOKEN_CACHE_DIR)
+
+Without it a deliberately high estimate is used.
+"""
+import argparse
+import functools
+import hashlib
+import logging
+import math
+import os
+import re
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Encoding of the gpt-3.5-turbo and gpt-4 families, close enough for budgeting newer models too
+ENCODING = "cl100k_base"
+ENCODING_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+# tiktoken reads (and provisioning writes) encodings here, under the SHA-1 of their URL
+TIKTOKEN_CACHE_DIR = os.getenv("TIKTOKEN_CACHE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'tiktoken_cache')
+
+# (context window, largest response) per model, matched by the longest prefix of the model name
+MODEL_LIMITS = {
+    "gpt-3.5-turbo": (16385, 4096),
+    "gpt-3.5-turbo-instruct": (4096, 4096),
+    "gpt-4": (8192, 4096),
+    "gpt-4-32k": (32768, 4096),
+    "gpt-4-turbo": (128000, 4096),
+    "gpt-4-1106": (128000, 4096),
+    "gpt-4-0125": (128000, 4096),
+    "gpt-4o": (128000, 4096),
+    "gpt-4o-mini": (128000, 16384)
+}
+# Assumed for models not listed above or in LLM_MODEL_LIMITS
+DEFAULT_MODEL_LIMITS = (8192, 4096)
+# Tokens each chat request spends on message framing
+MESSAGE_OVERHEAD_TOKENS = 12
+# Left free in the window so a tokenizer mismatch cannot push a request over it
+SAFETY_MARGIN_TOKENS = 256
+# The estimate used without tiktoken scales its per-piece count by this, and never goes below
+# one token per this many characters; English averages about 1.3 tokens per word and 4 characters per token
+ESTIMATE_PIECE_FACTOR = 1.35
+ESTIMATE_CHARS_PER_TOKEN = 3.5
+# Only this many characters per budgeted token are ever looked at, so huge texts are not counted in full
+MAX_CHARS_PER_TOKEN = 8
+
+# Expected answer per task as (fixed tokens, tokens per requested question or card), with room to spare
+OUTPUT_TOKENS = {
+    "analysis": (800, 0),
+    "voice": (800, 0),
+    "quiz": (150, 180),
+    "flashcards": (100, 130)
+}
+# A transcript refinement condenses its input; it is allowed up to this share of the input's tokens
+TRANSCRIPT_OUTPUT_RATIO = 0.6
+MIN_TRANSCRIPT_OUTPUT_TOKENS = 256
+
+_WORD_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _encoding_file():
+    return os.path.join(TIKTOKEN_CACHE_DIR, hashlib.sha1(ENCODING_URL.encode()).hexdigest())
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    """The tiktoken encoding when it can be loaded without network access, else None"""
+    if not os.path.exists(_encoding_file()):
+        return None
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", TIKTOKEN_CACHE_DIR)
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(ENCODING)
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, estimating token counts instead: {e}")
+        return None
+
+
+def tokenizer_name():
+    return f"tiktoken:{ENCODING}" if _encoding() is not None else "estimate"
+
+
+def estimate_tokens(text):
+    """Token count estimate that errs high, so a prompt sized by it fits the window without tiktoken
+
+    Words, digit runs and punctuation are counted as pieces (long words and
+    digit runs as several), non-Latin characters one each, and the total is
+    padded for the extra splits real tokenizers make in code and rare words.
+    """
+    count = 0
+    for piece in _WORD_PIECES.findall(text):
+        if piece[0].isdigit():
+            count += math.ceil(len(piece) / 3)
+        elif piece[0].isalpha():
+            count += 1 + (len(piece) - 1) // 6
+        else:
+            count += 1
+    return max(math.ceil(count * ESTIMATE_PIECE_FACTOR), math.ceil(len(text) / ESTIMATE_CHARS_PER_TOKEN))
+
+
+def count_tokens(text):
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def _longest_fitting_prefix(text, boundaries, limit):
+    """End offset of the longest prefix ending at one of the sorted boundaries within limit tokens, or 0"""
+    low, high, best = 0, len(boundaries) - 1, 0
+    while low <= high:
+        middle = (low + high) // 2
+        if count_tokens(text[:boundaries[middle]]) <= limit:
+            best = boundaries[middle]
+            low = middle + 1
+        else:
+            high = middle - 1
+    return best
+
+
+def trim_to_tokens(text, limit):
+    """Cut text to at most limit tokens, at the last sentence (or failing that, word) boundary that fits"""
+    if count_tokens(text) <= limit:
+        return text
+    end = _longest_fitting_prefix(text, [m.start() for m in _SENTENCE_END.finditer(text)], limit)
+    if not end:
+        end = _longest_fitting_prefix(text, [m.start() for m in _WHITESPACE.finditer(text)], limit)
+    return text[:end].rstrip()
+
+
+def parse_model_limits(value):
+    """'model=window[:max_response],...' (LLM_MODEL_LIMITS) to {model: (window, max_response)}"""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in (value or "").split(","))):
+        model, _, sizes = entry.partition("=")
+        window, _, response = sizes.partition(":")
+        limits[model.strip()] = (int(window), int(response) if response else DEFAULT_MODEL_LIMITS[1])
+    return limits
+
+
+class Budget:
+    """A prompt fitted to one model call, with the parameters to send it with"""
+
+    def __init__(self, prompt, text, model, max_tokens, prompt_tokens, trimmed):
+        self.prompt = prompt
+        self.text = text
+        self.model = model
+        self.max_tokens = max_tokens
+        self.prompt_tokens = prompt_tokens
+        self.trimmed = trimmed
+
+    @property
+    def params(self):
+        """Keyword arguments for the LLM gateway's chat calls"""
+        return {"model": self.model, "max_tokens": self.max_tokens}
+
+
+class TokenBudgeter:
+    """Sizes prompts and responses per task from token counts and model context windows
+
+    Text beyond prompt_token_limit (a cost ceiling) is never sent. Text within it
+    that does not fit the task's model goes to long_context_model when one is
+    configured and trimmed otherwise.
+    """
+
+    def __init__(self, model_for, prompt_token_limit=4000, long_context_model=None, model_limits=None):
+        self.model_for = model_for
+        self.prompt_token_limit = prompt_token_limit
+        self.long_context_model = long_context_model
+        self.model_limits = dict(MODEL_LIMITS, **(model_limits or {}))
+        self._lock = threading.Lock()
+        self.planned = 0
+        self.trimmed = 0
+        self.long_context = 0
+
+    @classmethod
+    def from_env(cls, model_for):
+        return cls(
+            model_for,
+            prompt_token_limit=int(os.getenv("PROMPT_TOKEN_LIMIT", 4000)),
+            long_context_model=os.getenv("OPENAI_LONG_CONTEXT_MODEL") or None,
+            model_limits=parse_model_limits(os.getenv("LLM_MODEL_LIMITS"))
+        )
+
+    def limits_for(self, model):
+        matches = [name for name in self.model_limits if model.startswith(name)]
+        return self.model_limits[max(matches, key=len)] if matches else DEFAULT_MODEL_LIMITS
+
+    def expected_output_tokens(self, task, text_tokens=0, num_questions=0, num_cards=0):
+        """Response tokens to allow for a task, given its input size and requested item counts"""
+        if task == "transcript":
+            return max(MIN_TRANSCRIPT_OUTPUT_TOKENS, int(text_tokens * TRANSCRIPT_OUTPUT_RATIO))
+        if task == "study_pack":
+            return (self.expected_output_tokens("analysis") + self.expected_output_tokens("quiz", 0, num_questions)
+                    + self.expected_output_tokens("flashcards", 0, 0, num_cards))
+        fixed, per_item = OUTPUT_TOKENS.get(task, OUTPUT_TOKENS["analysis"])
+        return fixed + per_item * int((num_questions if task == "quiz" else num_cards) or 0)
+
+    def _room_for_text(self, model, overhead, output):
+        window, max_response = self.limits_for(model)
+        output = min(output, max_response)
+        return window - overhead - output - SAFETY_MARGIN_TOKENS, output
+
+    def prompt_room(self, task, system):
+        """Tokens left for a task's user prompt beside the system prompt and expected answer, on the largest usable model"""
+        overhead = count_tokens(system) + MESSAGE_OVERHEAD_TOKENS
+        expected = self.expected_output_tokens(task)
+        models = [self.model_for(task)] + ([self.long_context_model] if self.long_context_model else [])
+        return max(self._room_for_text(model, overhead, expected)[0] for model in models)
+
+    def fingerprint(self, task):
+        """Everything besides the prompt and text that decides what a task's calls send, for cache keys
+
+        Covers the task's model and the long-context model with their limits, the
+        prompt ceiling and the tokenizer, since each changes what gets trimmed and where.
+        """
+        models = [self.model_for(task)] + ([self.long_context_model] if self.long_context_model else [])
+        limits = ",".join(f"{model}={window}:{response}" for model in models
+                          for window, response in [self.limits_for(model)])
+        return f"{limits};ceiling={self.prompt_token_limit};tokenizer={tokenizer_name()}"
+
+    def plan(self, task, system, build_prompt, text, num_questions=0, num_cards=0, ceiling=True):
+        """Fit text into build_prompt(text) for a task, returning a Budget
+
+        ceiling=False lifts prompt_token_limit for work that is already split into
+        bounded pieces, such as map-reduce chunks, leaving only the window to fit.
+        """
+        model = self.model_for(task)
+        overhead = count_tokens(system) + count_tokens(build_prompt("")) + MESSAGE_OVERHEAD_TOKENS
+        text_limit = self.prompt_token_limit if ceiling else max(
+            self.limits_for(model)[0], self.limits_for(self.long_context_model or model)[0])
+        candidate = text[:text_limit * MAX_CHARS_PER_TOKEN]
+        text_tokens = count_tokens(candidate)
+        wanted = min(text_tokens, text_limit)
+        expected = self.expected_output_tokens(task, wanted, num_questions, num_cards)
+        room, output = self._room_for_text(model, overhead, expected)
+
+        long_context = False
+        if wanted > room and self.long_context_model and self.long_context_model != model:
+            long_room, long_output = self._room_for_text(self.long_context_model, overhead, expected)
+            if long_room > room:
+                model, room, output, long_context = self.long_context_model, long_room, long_output, True
+
+        limit = max(0, min(text_limit, room))
+        trimmed = len(candidate) < len(text) or text_tokens > limit
+        if trimmed:
+            candidate = trim_to_tokens(candidate, limit)
+            text_tokens = count_tokens(candidate)
+            logger.info(f"Trimmed {task} text from {len(text)} to {len(candidate)} characters "
+                        f"({text_tokens} tokens) for {model}")
+        with self._lock:
+            self.planned += 1
+            self.trimmed += trimmed
+            self.long_context += long_context
+        return Budget(build_prompt(candidate), candidate, model, output, overhead + text_tokens, trimmed)
+
+    def stats(self):
+        with self._lock:
+            stats = {"planned": self.planned, "trimmed": self.trimmed, "long_context": self.long_context}
+        stats.update({"tokenizer": tokenizer_name(), "prompt_token_limit": self.prompt_token_limit,
+                      "long_context_model": self.long_context_model})
+        return stats
+
+
+def provision(cache_dir=TIKTOKEN_CACHE_DIR):
+    """Download the tiktoken encoding into cache_dir so budgeting can use it offline"""
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ["TIKTOKEN_CACHE_DIR"] = cache_dir
+    import tiktoken
+    tiktoken.get_encoding(ENCODING)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default=TIKTOKEN_CACHE_DIR, help='directory to download the encoding into')
+    args = parser.parse_args()
+
+    try:
+        provision(args.dir)
+    except Exception as e:
+        print(f"Failed to provision {ENCODING}: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{ENCODING} ready in {args.dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import json
+import logging
+import os
+import re
+import threading
+
+import metrics
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ("youtube", "local")
+# Seconds assigned to each line of a plain-text local transcript
+LOCAL_LINE_SECONDS = 5.0
+
+_VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class TranscriptUnavailable(Exception):
+    """Raised when a video has no transcript the provider can return"""
+
+
+class YouTubeTranscriptProvider:
+    """Fetches transcripts from YouTube"""
+
+    name = "youtube"
+
+    def fetch(self, video_id):
+        from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled
+
+        try:
+            return YouTubeTranscriptApi.get_transcript(video_id)
+        except TranscriptsDisabled as e:
+            raise TranscriptUnavailable('Transcripts are disabled for this video') from e
+        except NoTranscriptFound as e:
+            raise TranscriptUnavailable('No transcript found for this video') from e
+
+
+class LocalTranscriptProvider:
+    """Serves transcripts from a directory, for tests and offline development
+
+    <video_id>.json holds segments in YouTube's format ({"text", "start", "duration"});
+    <video_id>.txt holds plain text with one segment per line.
+    """
+
+    name = "local"
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, video_id):
+        if not _VIDEO_ID_RE.match(video_id):
+            raise TranscriptUnavailable('No transcript found for this video')
+        json_path = os.path.join(self.directory, f"{video_id}.json")
+        if os.path.exists(json_path):
+            with open(json_path, encoding='utf-8') as f:
+                return json.load(f)
+        text_path = os.path.join(self.directory, f"{video_id}.txt")
+        if os.path.exists(text_path):
+            with open(text_path, encoding='utf-8') as f:
+                lines = [line.strip() for line in f if line.strip()]
+            return [{"text": line, "start": i * LOCAL_LINE_SECONDS, "duration": LOCAL_LINE_SECONDS}
+                    for i, line in enumerate(lines)]
+        raise TranscriptUnavailable('No transcript found for this video')
+
+
+def create_transcript_provider(name="youtube", directory=None):
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown transcript provider '{name}', expected one of {', '.join(PROVIDERS)}")
+    if name == "local":
+        return LocalTranscriptProvider(directory)
+    return YouTubeTranscriptProvider()
+
+
+class TranscriptCache:
+    """Per-video cache of the raw transcript, its processed text and its refinement
+
+    Concurrent misses for a video are coalesced with a SingleFlight.
+    """
+
+    def __init__(self, provider, cache):
+        self.provider = provider
+        self.cache = cache
+        self.flight = SingleFlight("transcripts")
+        self._stats_lock = threading.Lock()
+        self.fetches = 0
+        self.refinements = 0
+
+    def _get_or_create(self, key, create):
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+
+        def run():
+            value = create()
+            if value is not None:
+                self.cache.set(key, value)
+            return value
+
+        return self.flight.do(key, run)
+
+    def get_transcript(self, video_id, process):
+        """Return (segments, processed text) for a video, with process turning segments into text"""
+        def fetch():
+            with metrics.span("transcript_fetch"):
+                segments = self.provider.fetch(video_id)
+            with self._stats_lock:
+                self.fetches += 1
+            logger.info(f"Fetched transcript for {video_id} ({len(segments)} segments)")
+            return {"segments": segments, "text": process(segments)}
+
+        entry = self._get_or_create(f"{video_id}:transcript", fetch)
+        return entry["segments"], entry["text"]
+
+    def get_refined(self, video_id, refine, version):
+        """Return the refined transcript for a video, calling refine() at most once per version
+
+        Failed refinements (None) are not cached.
+        """
+        def run():
+            refined = refine()
+            with self._stats_lock:
+                self.refinements += 1
+            return refined
+
+        return self._get_or_create(f"{video_id}:refined:{version}", run)
+
+    async def get_refined_async(self, video_id, refine, version):
+        """get_refined() for coroutines, with refine an async function"""
+        key = f"{video_id}:refined:{version}"
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+
+        async def run():
+            refined = await refine()
+            with self._stats_lock:
+                self.refinements += 1
+            if refined is not None:
+                self.cache.set(key, refined)
+            return refined
+
+        return await self.flight.do_async(key, run)
+
+    def peek_refined(self, video_id, version):
+        """The cached refined transcript for a video, or None"""
+        return self.cache.get(f"{video_id}:refined:{version}")
+
+    def stats(self):
+        with self._stats_lock:
+            stats = {"provider": self.provider.name, "fetches": self.fetches, "refinements": self.refinements}
+        stats["coalesced"] = self.flight.stats()["coalesced"]
+        stats.update(self.cache.stats())
+        return stats
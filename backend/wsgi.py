@@ -0,0 +1,7 @@
+"""Production WSGI entry point: `gunicorn -c gunicorn.conf.py wsgi:app`
+
+Under uvicorn, serve asgi:app instead so the LLM-bound endpoints run async.
+"""
+from app import create_app
+
+app = create_app()
@@ -83,7 +83,7 @@ export default function PDFUploadScreen({ navigation }) {
       formData.append('file', fileToUpload);
 
       // Send the request
-      const response = await axios.post(`${apiUrl}/api/upload-pdf`, formData, {
+      const response = await axios.post(`${apiUrl}/api/upload-pdf?include_full_text=false`, formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
         },
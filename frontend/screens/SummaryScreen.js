@@ -40,18 +40,32 @@ export default function SummaryScreen({ route, navigation }) {
   //   checkAiStatus();
   // }, []);
 
+  // Refer to the server-side copy of the document when there is one instead of re-sending its text
+  const documentPayload = () => {
+    if (data.document_id) {
+      return { document_id: data.document_id };
+    }
+    // Use text_preview for YouTube sources or full_text for other sources
+    const textToUse = data.source === 'youtube' ? 
+      (data.text_preview || '').slice(0, 500) + '...' : 
+      data.full_text;
+    return { text: textToUse };
+  };
+
+  const errorMessage = (err, fallback) => {
+    if (err.response && err.response.data && err.response.data.document_expired) {
+      return 'This document has expired on the server. Please submit it again.';
+    }
+    return fallback;
+  };
+
   const generateQuiz = async () => {
     setLoading(true);
     setError('');
     
     try {
-      // Use text_preview for YouTube sources or full_text for other sources
-      const textToUse = data.source === 'youtube' ? 
-        (data.text_preview || '').slice(0, 500) + '...' : 
-        data.full_text;
-      
       const response = await axios.post(`${apiUrl}/api/generate-quiz`, {
-        text: textToUse,
+        ...documentPayload(),
         quiz_type: 'all',
         num_questions: numberOfItems,
         source: data.source || 'text'
@@ -64,7 +78,7 @@ export default function SummaryScreen({ route, navigation }) {
       });
     } catch (err) {
       console.error('Error generating quiz:', err);
-      setError('Failed to generate quiz. Please try again.');
+      setError(errorMessage(err, 'Failed to generate quiz. Please try again.'));
       setSnackbarVisible(true);
     } finally {
       setLoading(false);
@@ -77,13 +91,8 @@ export default function SummaryScreen({ route, navigation }) {
     setError('');
     
     try {
-      // Use text_preview for YouTube sources or full_text for other sources
-      const textToUse = data.source === 'youtube' ? 
-        (data.text_preview || '').slice(0, 500) + '...' : 
-        data.full_text;
-      
       const response = await axios.post(`${apiUrl}/api/generate-flashcards`, {
-        text: textToUse,
+        ...documentPayload(),
         num_cards: numberOfItems,
         source: data.source || 'text'
       });
@@ -95,7 +104,7 @@ export default function SummaryScreen({ route, navigation }) {
       });
     } catch (err) {
       console.error('Error generating flashcards:', err);
-      setError('Failed to generate flashcards. Please try again.');
+      setError(errorMessage(err, 'Failed to generate flashcards. Please try again.'));
       setSnackbarVisible(true);
     } finally {
       setLoading(false);
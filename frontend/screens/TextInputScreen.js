@@ -38,7 +38,9 @@ export default function TextInputScreen({ navigation }) {
       
       // Send text to backend for processing
       const response = await axios.post(`${apiUrl}/api/process-text`, {
-        text: text
+        text: text,
+        // Follow-up requests refer to the stored text by document_id
+        include_full_text: false
       });
 
       console.log('Response received:', response.status);
@@ -13,7 +13,6 @@ import {
   Snackbar
 } from 'react-native-paper';
 import { Audio } from 'expo-av';
-import * as FileSystem from 'expo-file-system';
 import { LinearGradient } from 'expo-linear-gradient';
 import axios from 'axios';
 import { useApi } from '../contexts/ApiContext';
@@ -261,6 +260,23 @@ export default function VoiceNoteScreen({ navigation }) {
     }
   };
   
+  // Upload the recording file itself as multipart form data rather than as a base64 JSON string
+  const uploadRecording = (fileUri, previewOnly) => {
+    const formData = new FormData();
+    formData.append('audio', {
+      uri: fileUri,
+      name: fileUri.split('/').pop() || 'recording.m4a',
+      type: 'audio/m4a',
+    });
+    formData.append('preview_only', previewOnly ? 'true' : 'false');
+    
+    return axios.post(`${apiUrl}/api/process-voice`, formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    });
+  };
+
   // Get a transcription preview of the recording
   const getTranscriptionPreview = async (uri) => {
     if (!uri) return;
@@ -278,16 +294,8 @@ export default function VoiceNoteScreen({ navigation }) {
         return;
       }
       
-      // Read the file as base64
-      const base64Audio = await FileSystem.readAsStringAsync(uri, {
-        encoding: FileSystem.EncodingType.Base64,
-      });
-      
       // Send a request to the server to get the transcription only
-      const response = await axios.post(`${apiUrl}/api/process-voice`, {
-        audio_data: base64Audio,
-        preview_only: true // Tell the server we just want the transcription
-      });
+      const response = await uploadRecording(uri, true);
       
       // Check if there's a warning about ffmpeg
       if (response.data && response.data.ffmpeg_missing) {
@@ -361,15 +369,8 @@ export default function VoiceNoteScreen({ navigation }) {
         return;
       }
       
-      // Read the file as base64
-      const base64Audio = await FileSystem.readAsStringAsync(recordingPath, {
-        encoding: FileSystem.EncodingType.Base64,
-      });
-      
       // Make API request to process the recording
-      const response = await axios.post(`${apiUrl}/api/process-voice`, {
-        audio_data: base64Audio
-      });
+      const response = await uploadRecording(recordingPath, false);
       
       // Check if there's a warning about ffmpeg
       if (response.data && response.data.ffmpeg_missing) {
@@ -59,7 +59,8 @@ export default function YouTubeScreen({ navigation }) {
       
       // Send video URL to backend for processing
       const response = await axios.post(`${apiUrl}/api/process-youtube`, {
-        video_url: videoUrl
+        video_url: videoUrl,
+        include_full_text: false
       });
 
       console.log('Response received:', response.status);